@@ -1,11 +1,16 @@
+import asyncio
+import copy
 import json
 import logging
 import os
+import threading
 import time
 import warnings
 from typing import Any, Dict, List, Optional, Union, cast
 import weave
 
+import httpx
+
 with warnings.catch_warnings():
     warnings.simplefilter("ignore", UserWarning)
     import litellm
@@ -18,7 +23,52 @@ from crewai.utilities.exceptions.context_window_exceeding_exception import (
 )
 from crewai import LLM
 
+from api.services.llm_cache import llm_cache
+from api.services.provider_router import ProviderTarget, provider_router, routed_prompt_budget
+from api.services.rate_limiter import rate_limiter
+from config.model_registry import model_registry
+from utils.cancellation import CancellationToken, OperationCancelledError, check_cancelled, current_cancellation_token
 from utils.logging import logger
+from utils.loop_bridge import loop_bridge
+from utils.token_budget import estimate_messages_tokens, fit_messages, prompt_budget
+
+_async_http_client: Optional[httpx.AsyncClient] = None
+
+_env_callbacks_lock = threading.Lock()
+_env_callbacks_configured = False
+
+
+def shared_async_http_client() -> httpx.AsyncClient:
+    """
+    Returns the async HTTP connection pool used by every litellm.acompletion call of the worker.
+    """
+    global _async_http_client
+    if _async_http_client is None or _async_http_client.is_closed:
+        _async_http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "200")),
+                max_keepalive_connections=int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "50")),
+            ),
+            timeout=httpx.Timeout(600.0, connect=10.0),
+        )
+        litellm.aclient_session = _async_http_client
+    return _async_http_client
+
+
+async def close_async_http_client() -> None:
+    global _async_http_client
+    if _async_http_client is not None:
+        await _async_http_client.aclose()
+        _async_http_client = None
+        litellm.aclient_session = None
+
+
+def _chunk_delta(chunk: Any) -> Optional[str]:
+    # The trailing usage chunk has no choices
+    if not chunk.choices:
+        return None
+    return chunk.choices[0].delta.content
+
 
 class CustomLLM(LLM):
     def __init__(
@@ -43,6 +93,9 @@ class CustomLLM(LLM):
         api_key: Optional[str] = None,
         callbacks: List[Any] = [],
         extra_headers: Optional[Dict[str, str]] = None,
+        cancellation_token: Optional[CancellationToken] = None,
+        model_key: Optional[str] = None,
+        provider: Optional[str] = None,
     ):
         self.model = model
         self.timeout = timeout
@@ -61,9 +114,21 @@ class CustomLLM(LLM):
         self.base_url = base_url
         self.api_version = api_version
         self.api_key = api_key
-        self.callbacks = callbacks
+        # Invoked with the usage of every call of this instance, never registered with litellm
+        self.callbacks = list(callbacks)
         self.context_window_size = 0
         self.extra_headers = extra_headers
+        # Falls back to the token of the current request context when unset
+        self.cancellation_token = cancellation_token
+        # Conversation logger whose agent-thought channel receives the token deltas
+        self.token_stream_logger = None
+        # With the registry's model key and the user's provider, calls are hedged
+        # and fail over to the other providers serving the same model
+        self.model_key = model_key
+        self.provider = provider
+        self.provider_targets: List[ProviderTarget] = (
+            provider_router.targets(model_key, provider, api_key) if model_key and provider else []
+        )
         
         litellm.drop_params = True
 
@@ -75,9 +140,26 @@ class CustomLLM(LLM):
         else:
             self.stop = stop
 
-        self.set_callbacks(callbacks)
-        self.set_env_callbacks()
-        
+        self._configure_env_callbacks()
+
+    def with_token_stream(self, conversation_logger: Any) -> "CustomLLM":
+        """
+        Returns a copy of this LLM that streams its responses and publishes the
+        token deltas through the given RedisConversationLogger.
+        """
+        llm = copy.copy(self)
+        llm.token_stream_logger = conversation_logger
+        return llm
+
+    def with_callbacks(self, *callbacks: Any) -> "CustomLLM":
+        """
+        Returns a copy of this LLM that also reports the usage of its calls to
+        the given callbacks, e.g. an agent's RedisConversationLogger.
+        """
+        llm = copy.copy(self)
+        llm.callbacks = [*self.callbacks, *callbacks]
+        return llm
+
     @weave.op()
     def call(
         self,
@@ -90,7 +172,7 @@ class CustomLLM(LLM):
         High-level llm call method that:
           1) Accepts either a string or a list of messages
           2) Converts string input to the required message format
-          3) Calls litellm.completion
+          3) Calls litellm.completion, or litellm.acompletion on the application loop
           4) Handles function/tool calls if any
           5) Returns the final text response or tool result
 
@@ -119,107 +201,349 @@ class CustomLLM(LLM):
         if isinstance(messages, str):
             messages = [{"role": "user", "content": messages}]
 
-        with suppress_warnings():
-            if callbacks and len(callbacks) > 0:
-                self.set_callbacks(callbacks)
+        cancellation_token = self.cancellation_token or current_cancellation_token.get()
+        check_cancelled(cancellation_token)
+
+        # Scoped to this call; concurrent crews never see each other's callbacks
+        callbacks = [*self.callbacks, *(callbacks or [])]
 
+        with suppress_warnings():
             try:
-                # --- 1) Prepare the parameters for the completion call
-                params = {
-                    "model": self.model,
-                    "messages": messages,
-                    "timeout": self.timeout,
-                    "temperature": self.temperature,
-                    "top_p": self.top_p,
-                    "n": self.n,
-                    "stop": self.stop,
-                    "max_tokens": self.max_tokens or self.max_completion_tokens,
-                    "presence_penalty": self.presence_penalty,
-                    "frequency_penalty": self.frequency_penalty,
-                    "logit_bias": self.logit_bias,
-                    "response_format": self.response_format,
-                    "seed": self.seed,
-                    "logprobs": self.logprobs,
-                    "top_logprobs": self.top_logprobs,
-                    "api_base": self.base_url,
-                    "api_version": self.api_version,
-                    "api_key": self.api_key,
-                    "stream": False,
-                    "tools": tools,
-                    "extra_headers": self.extra_headers,
-                }
-
-                # Remove None values from params
-                params = {k: v for k, v in params.items() if v is not None}
-
-                # --- 2) Make the completion call
+                params = self._completion_params(messages, tools)
+                cache_key = self._cache_key(params)
+                cached = llm_cache.get(cache_key) if cache_key is not None else None
+                if cached is not None:
+                    # Cached tokens are not billed, so usage callbacks are skipped
+                    response = self._replay_cached(cached)
+                    return self._handle_response(response, params, available_functions, cancellation_token)
+
                 start_time = time.time()
-                response = litellm.completion(**params)
-                duration = time.time() - start_time
-                if duration > 10:
-                    logger.warning(f"CrewAI LLM {self.model} took {duration:.2f} seconds to complete task")
+                if loop_bridge.available():
+                    # Crew threads only wait; the request shares the loop's connection pool
+                    response = loop_bridge.run(
+                        self._acompletion, params, cancellation_token, cancellation_token=cancellation_token
+                    )
+                elif self.token_stream_logger is not None:
+                    response = self._stream_completion(params, cancellation_token)
+                elif cancellation_token is not None:
+                    # Release this thread as soon as the request is cancelled
+                    response = cancellation_token.run_cancellable(self._completion, params)
                 else:
-                    logger.info(f"CrewAI LLM {self.model} took {duration:.2f} seconds to complete task")
-
-                response_message = cast(Choices, cast(ModelResponse, response).choices)[
-                    0
-                ].message
-                text_response = response_message.content or ""
-                tool_calls = getattr(response_message, "tool_calls", [])
-
-                # --- 3) Handle callbacks with usage info
-                if callbacks and len(callbacks) > 0:
-                    for callback in callbacks:
-                        if hasattr(callback, "log_success_event"):
-                            usage_info = getattr(response, "usage", None)
-                            if usage_info:
-                                callback.log_success_event(
-                                    kwargs=params,
-                                    response_obj={"usage": usage_info},
-                                    start_time=0,
-                                    end_time=0,
-                                )
-
-                # --- 4) If no tool calls, return the text response
-                if not tool_calls or not available_functions:
-                    return text_response
-
-                # --- 5) Handle the tool call
-                tool_call = tool_calls[0]
-                function_name = tool_call.function.name
-
-                if function_name in available_functions:
-                    try:
-                        function_args = json.loads(tool_call.function.arguments)
-                    except json.JSONDecodeError as e:
-                        logging.warning(f"Failed to parse function arguments: {e}")
-                        return text_response
-
-                    fn = available_functions[function_name]
-                    try:
-                        # Call the actual tool function
-                        result = fn(**function_args)
-                        return result
-
-                    except Exception as e:
-                        logging.error(
-                            f"Error executing function '{function_name}': {e}"
-                        )
-                        return text_response
+                    response = self._completion(params)
+                end_time = time.time()
+                self._log_duration(end_time - start_time)
+                if cache_key is not None:
+                    llm_cache.set(cache_key, response.model_dump(), getattr(response, "usage", None))
+                else:
+                    llm_cache.record_billed(getattr(response, "usage", None))
+
+                self._report_usage(callbacks, params, response, start_time, end_time)
+                return self._handle_response(response, params, available_functions, cancellation_token)
+
+            except OperationCancelledError:
+                logger.info(f"CrewAI LLM {self.model} call cancelled")
+                raise
+            except Exception as e:
+                self._log_failure(e)
+                raise
+
+    @weave.op()
+    async def acall(
+        self,
+        messages: Union[str, List[Dict[str, str]]],
+        tools: Optional[List[dict]] = None,
+        callbacks: Optional[List[Any]] = None,
+        available_functions: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """
+        Async counterpart of call, awaiting litellm.acompletion on the running loop.
+
+        Requests share one async HTTP connection pool, so a worker can keep
+        hundreds of calls in flight without a thread per call. Tool functions
+        are synchronous and run on a worker thread.
+        """
+        if isinstance(messages, str):
+            messages = [{"role": "user", "content": messages}]
+
+        cancellation_token = self.cancellation_token or current_cancellation_token.get()
+        check_cancelled(cancellation_token)
 
+        callbacks = [*self.callbacks, *(callbacks or [])]
+
+        with suppress_warnings():
+            try:
+                params = self._completion_params(messages, tools)
+                cache_key = self._cache_key(params)
+                cached = await llm_cache.aget(cache_key) if cache_key is not None else None
+                if cached is not None:
+                    # Cached tokens are not billed, so usage callbacks are skipped
+                    response = await asyncio.to_thread(self._replay_cached, cached)
                 else:
-                    logging.warning(
-                        f"Tool call requested unknown function '{function_name}'"
+                    start_time = time.time()
+                    response = await self._acompletion(params, cancellation_token)
+                    end_time = time.time()
+                    self._log_duration(end_time - start_time)
+                    if cache_key is not None:
+                        await llm_cache.aset(cache_key, response.model_dump(), getattr(response, "usage", None))
+                    else:
+                        llm_cache.record_billed(getattr(response, "usage", None))
+                    if callbacks:
+                        # Callbacks may publish to Redis
+                        await asyncio.to_thread(self._report_usage, callbacks, params, response, start_time, end_time)
+
+                if available_functions:
+                    return await asyncio.to_thread(
+                        self._handle_response, response, params, available_functions, cancellation_token
                     )
-                    return text_response
+                return self._handle_response(response, params, available_functions, cancellation_token)
 
+            except OperationCancelledError:
+                logger.info(f"CrewAI LLM {self.model} call cancelled")
+                raise
             except Exception as e:
-                if not LLMContextLengthExceededException(
-                    str(e)
-                )._is_context_limit_error(str(e)):
-                    logging.error(f"LiteLLM call failed: {str(e)}")
+                self._log_failure(e)
                 raise
 
+    def _prompt_budget(self) -> Optional[int]:
+        """Prompt tokens that leave room for the completion, or None for models unknown to the registry."""
+        max_output_tokens = self.max_tokens or self.max_completion_tokens
+        if self.provider_targets:
+            return routed_prompt_budget(self.provider_targets, max_output_tokens)
+        found = model_registry.find_model(self.model)
+        if found is None:
+            return None
+        provider, model_key = found
+        return prompt_budget(
+            model_registry.get_context_window(model_key=model_key, provider=provider),
+            max_output_tokens or model_registry.get_max_output_tokens(model_key=model_key, provider=provider),
+        )
+
+    def _fit_messages(self, messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        # Trimming here saves the round-trip a context-length rejection would cost
+        budget = self._prompt_budget()
+        if budget is None:
+            return messages
+        fitted = fit_messages(messages, budget)
+        if fitted != messages:
+            logger.warning(
+                f"CrewAI LLM {self.model} prompt of ~{estimate_messages_tokens(messages)} tokens "
+                f"trimmed to ~{estimate_messages_tokens(fitted)} for its context window"
+            )
+        return fitted
+
+    def _completion_params(self, messages: List[Dict[str, str]], tools: Optional[List[dict]]) -> Dict[str, Any]:
+        params = {
+            "model": self.model,
+            "messages": self._fit_messages(messages),
+            "timeout": self.timeout,
+            "temperature": self.temperature,
+            "top_p": self.top_p,
+            "n": self.n,
+            "stop": self.stop,
+            "max_tokens": self.max_tokens or self.max_completion_tokens,
+            "presence_penalty": self.presence_penalty,
+            "frequency_penalty": self.frequency_penalty,
+            "logit_bias": self.logit_bias,
+            "response_format": self.response_format,
+            "seed": self.seed,
+            "logprobs": self.logprobs,
+            "top_logprobs": self.top_logprobs,
+            "api_base": self.base_url,
+            "api_version": self.api_version,
+            "api_key": self.api_key,
+            "stream": self.token_stream_logger is not None,
+            "stream_options": {"include_usage": True} if self.token_stream_logger is not None else None,
+            "tools": tools,
+            "extra_headers": self.extra_headers,
+        }
+
+        # Remove None values from params
+        return {k: v for k, v in params.items() if v is not None}
+
+    def _cache_key(self, params: Dict[str, Any]) -> Optional[str]:
+        """Content address of a deterministic request, or None if it must not be cached."""
+        if not llm_cache.cacheable(self.temperature, self.n):
+            return None
+        # Credentials, transport and streaming settings do not change the response
+        ignored = ("model", "messages", "tools", "api_key", "timeout", "stream", "stream_options", "extra_headers")
+        return llm_cache.key(
+            self.model,
+            params["messages"],
+            params.get("tools"),
+            **{k: v for k, v in params.items() if k not in ignored},
+        )
+
+    def _replay_cached(self, cached: Dict[str, Any]) -> ModelResponse:
+        response = ModelResponse(**cached)
+        if self.token_stream_logger is not None:
+            # The client still sees the agent's output, in a single delta
+            token_stream = self.token_stream_logger.open_token_stream()
+            token_stream.add(response.choices[0].message.content)
+            token_stream.flush(final=True)
+        return response
+
+    def _target_params(self, params: Dict[str, Any], target: ProviderTarget) -> Dict[str, Any]:
+        return {
+            **params,
+            "model": f"{target.crewai_prefix}/{target.model}",
+            "api_base": target.url,
+            "api_key": target.api_key,
+        }
+
+    def _rate_limit_service(self) -> str:
+        return self.provider or self.model.split("/", 1)[0]
+
+    def _completion(self, params: Dict[str, Any]) -> Any:
+        if not self.provider_targets:
+            with rate_limiter.slot_sync(self._rate_limit_service(), self.api_key):
+                return litellm.completion(**params)
+        return provider_router.run_sync(
+            self.provider_targets, lambda target: litellm.completion(**self._target_params(params, target))
+        )
+
+    def _acompletion_once(self, params: Dict[str, Any]) -> Any:
+        if params["stream"]:
+            return self._astream_completion(params)
+        return litellm.acompletion(**params)
+
+    async def _routed_acompletion(self, params: Dict[str, Any]) -> Any:
+        if not self.provider_targets:
+            async with rate_limiter.slot(self._rate_limit_service(), self.api_key):
+                return await self._acompletion_once(params)
+        # A hedged stream would publish every token twice, so streams only fail over
+        return await provider_router.run(
+            self.provider_targets,
+            lambda target: self._acompletion_once(self._target_params(params, target)),
+            hedge=not params["stream"],
+        )
+
+    async def _acompletion(self, params: Dict[str, Any], cancellation_token: Optional[CancellationToken]) -> Any:
+        shared_async_http_client()
+        request = asyncio.ensure_future(self._routed_acompletion(params))
+        cancel_request = None
+        if cancellation_token is not None:
+            loop = asyncio.get_running_loop()
+            cancel_request = lambda: loop.call_soon_threadsafe(request.cancel)
+            cancellation_token.add_callback(cancel_request)
+        try:
+            return await request
+        except asyncio.CancelledError:
+            if cancellation_token is not None and cancellation_token.is_cancelled:
+                raise OperationCancelledError(f"Operation cancelled: {cancellation_token.reason}")
+            raise
+        finally:
+            if cancel_request is not None:
+                cancellation_token.remove_callback(cancel_request)
+
+    def _stream_completion(self, params: Dict[str, Any], cancellation_token: Optional[CancellationToken]) -> Any:
+        token_stream = self.token_stream_logger.open_token_stream()
+        chunks = []
+        try:
+            with rate_limiter.slot_sync(self._rate_limit_service(), self.api_key):
+                for chunk in litellm.completion(**params):
+                    check_cancelled(cancellation_token)
+                    chunks.append(chunk)
+                    if token_stream.add(_chunk_delta(chunk)):
+                        token_stream.flush()
+        finally:
+            token_stream.flush(final=True)
+        return litellm.stream_chunk_builder(chunks, messages=params["messages"])
+
+    async def _astream_completion(self, params: Dict[str, Any]) -> Any:
+        token_stream = self.token_stream_logger.open_token_stream()
+        chunks = []
+        try:
+            async for chunk in await litellm.acompletion(**params):
+                chunks.append(chunk)
+                if token_stream.add(_chunk_delta(chunk)):
+                    # Redis publishes are blocking; keep them off the loop
+                    await asyncio.to_thread(token_stream.flush)
+        finally:
+            await asyncio.to_thread(token_stream.flush, True)
+        return litellm.stream_chunk_builder(chunks, messages=params["messages"])
+
+    def _report_usage(
+        self,
+        callbacks: List[Any],
+        params: Dict[str, Any],
+        response: Any,
+        start_time: float,
+        end_time: float,
+    ) -> None:
+        usage_info = getattr(response, "usage", None)
+        if not usage_info:
+            return
+        for callback in callbacks:
+            if hasattr(callback, "log_success_event"):
+                try:
+                    callback.log_success_event(
+                        kwargs=params,
+                        response_obj={"usage": usage_info},
+                        start_time=start_time,
+                        end_time=end_time,
+                    )
+                except Exception as e:
+                    logging.error(f"Usage callback {type(callback).__name__} failed: {e}")
+
+    def _handle_response(
+        self,
+        response: Any,
+        params: Dict[str, Any],
+        available_functions: Optional[Dict[str, Any]],
+        cancellation_token: Optional[CancellationToken],
+    ) -> str:
+        response_message = cast(Choices, cast(ModelResponse, response).choices)[
+            0
+        ].message
+        text_response = response_message.content or ""
+        tool_calls = getattr(response_message, "tool_calls", [])
+
+        # --- If no tool calls, return the text response
+        if not tool_calls or not available_functions:
+            return text_response
+
+        # --- Handle the tool call
+        tool_call = tool_calls[0]
+        function_name = tool_call.function.name
+
+        if function_name in available_functions:
+            try:
+                function_args = json.loads(tool_call.function.arguments)
+            except json.JSONDecodeError as e:
+                logging.warning(f"Failed to parse function arguments: {e}")
+                return text_response
+
+            fn = available_functions[function_name]
+            check_cancelled(cancellation_token)
+            try:
+                # Call the actual tool function
+                result = fn(**function_args)
+                return result
+
+            except Exception as e:
+                logging.error(
+                    f"Error executing function '{function_name}': {e}"
+                )
+                return text_response
+
+        else:
+            logging.warning(
+                f"Tool call requested unknown function '{function_name}'"
+            )
+            return text_response
+
+    def _log_duration(self, duration: float) -> None:
+        if duration > 10:
+            logger.warning(f"CrewAI LLM {self.model} took {duration:.2f} seconds to complete task")
+        else:
+            logger.info(f"CrewAI LLM {self.model} took {duration:.2f} seconds to complete task")
+
+    def _log_failure(self, e: Exception) -> None:
+        if not LLMContextLengthExceededException(
+            str(e)
+        )._is_context_limit_error(str(e)):
+            logging.error(f"LiteLLM call failed: {str(e)}")
+
     def supports_function_calling(self) -> bool:
         try:
             params = get_supported_openai_params(model=self.model)
@@ -244,6 +568,20 @@ class CustomLLM(LLM):
         if self.context_window_size != 0:
             return self.context_window_size
 
+        # CrewAI's table does not know the SambaNova and Fireworks model names
+        if self.provider_targets:
+            self.context_window_size = int(
+                min(target.context_window for target in self.provider_targets) * CONTEXT_WINDOW_USAGE_RATIO
+            )
+            return self.context_window_size
+        found = model_registry.find_model(self.model)
+        if found is not None:
+            provider, model_key = found
+            self.context_window_size = int(
+                model_registry.get_context_window(model_key=model_key, provider=provider) * CONTEXT_WINDOW_USAGE_RATIO
+            )
+            return self.context_window_size
+
         self.context_window_size = int(
             DEFAULT_CONTEXT_WINDOW_SIZE * CONTEXT_WINDOW_USAGE_RATIO
         )
@@ -254,20 +592,21 @@ class CustomLLM(LLM):
 
     def set_callbacks(self, callbacks: List[Any]):
         """
-        Attempt to keep a single set of callbacks in litellm by removing old
-        duplicates and adding new ones.
-        """
-        with suppress_warnings():
-            callback_types = [type(callback) for callback in callbacks]
-            for callback in litellm.success_callback[:]:
-                if type(callback) in callback_types:
-                    litellm.success_callback.remove(callback)
+        Replace the usage callbacks of this instance.
 
-            for callback in litellm._async_success_callback[:]:
-                if type(callback) in callback_types:
-                    litellm._async_success_callback.remove(callback)
-
-            litellm.callbacks = callbacks
+        Unlike the base class, litellm's process-wide callback lists are left
+        alone: crews run concurrently in threads and would otherwise receive
+        each other's usage. Prefer passing callbacks to call or with_callbacks.
+        """
+        self.callbacks = list(callbacks)
+
+    def _configure_env_callbacks(self):
+        # The environment callbacks are process-wide, so they are set once rather than per instance
+        global _env_callbacks_configured
+        with _env_callbacks_lock:
+            if not _env_callbacks_configured:
+                self.set_env_callbacks()
+                _env_callbacks_configured = True
 
     def set_env_callbacks(self):
         """
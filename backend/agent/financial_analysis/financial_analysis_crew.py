@@ -2,13 +2,19 @@ import os
 import sys
 import uuid
 import json
-from typing import Dict, Any, List, Optional, Tuple, Union
+import contextvars
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, List, Optional, Tuple, Union
 import numpy as np
 from api.services.redis_service import SecureRedisService
 import yfinance as yf
 import weave
 
 from agent.crewai_llm import CustomLLM
+from utils.cancellation import CancellationToken, check_cancelled
+from utils.logging import logger
 from services.structured_output_parser import CustomConverter
 
 # Ensure our parent directories are in sys.path
@@ -28,10 +34,12 @@ if os.getenv("LANGTRACE_API_KEY"):
 
 # crewai imports
 from crewai import Agent, Task, Crew, LLM, Process
-from utils.agent_thought import RedisConversationLogger
+from crewai.agents.parser import AgentFinish
+from crewai.crews.crew_output import CrewOutput
+from utils.agent_thought import RedisConversationLogger, bind_agent_loggers
 from crewai.tools import tool
 #from crewai_tools import SerperDevTool
-from tools.competitor_analysis_tool import competitor_analysis_tool
+from tools.competitor_analysis_tool import competitor_analysis_tool, enhanced_competitor_tool
 from tools.fundamental_analysis_tool import fundamental_analysis_tool
 from tools.technical_analysis_tool import yf_tech_analysis
 from tools.risk_assessment_tool import risk_assessment_tool
@@ -182,6 +190,12 @@ class FinancialAnalysisResult(BaseModel):
     news: News
     comprehensive_summary: str = ""
 
+class FinancialSummary(BaseModel):
+    """The parts of FinancialAnalysisResult only an LLM can write, used by the direct mode."""
+    company_name: str = ""
+    news: News = Field(default_factory=News)
+    comprehensive_summary: str = ""
+
 ########################### The Main Crew Class ###########################
 load_dotenv()
 
@@ -196,6 +210,13 @@ class FinancialAnalysisCrew:
       6) News
       7) Aggregator => merges all into final JSON, at least 700 words in summary.
     Using partial concurrency to speed up tasks that do not depend on each other.
+
+    In the "direct" execution mode (FINANCIAL_ANALYSIS_MODE, the default) the
+    deterministic yfinance tools of steps 1-5 run concurrently in Python instead
+    of through LLM agents, alongside the news and document steps. The aggregator
+    then only writes the news section and summary; the tool data is validated
+    into the result models without an LLM echoing it. The "agents" mode runs
+    every step as a crew agent.
     """
     @weave.op
     def __init__(
@@ -208,8 +229,14 @@ class FinancialAnalysisCrew:
         docs_included: bool = False,
         redis_client: SecureRedisService = None,
         message_id: str = None,
-        verbose: bool = True
+        verbose: bool = True,
+        cancellation_token: Optional[CancellationToken] = None,
+        execution_mode: Optional[str] = None,
     ):
+        self.execution_mode = execution_mode or os.getenv("FINANCIAL_ANALYSIS_MODE", "direct")
+        if self.execution_mode not in ("direct", "agents"):
+            raise ValueError(f"Unknown financial analysis execution mode: {self.execution_mode}")
+        self.cancellation_token = cancellation_token
         model_info = model_registry.get_model_info(model_key="llama-3.1-8b", provider=provider)
         self.llm = CustomLLM(
             model=model_info["crewai_prefix"] + "/" + model_info["model"],
@@ -217,6 +244,9 @@ class FinancialAnalysisCrew:
             max_tokens=8192,
             api_key=llm_api_key,
             base_url=model_info["url"],
+            cancellation_token=cancellation_token,
+            model_key="llama-3.1-8b",
+            provider=provider,
         )
         aggregator_model_info = model_registry.get_model_info(model_key="llama-3.3-70b", provider=provider)
         self.aggregator_llm = CustomLLM(
@@ -225,6 +255,9 @@ class FinancialAnalysisCrew:
             max_tokens=8192,
             api_key=llm_api_key,
             base_url=aggregator_model_info["url"],
+            cancellation_token=cancellation_token,
+            model_key="llama-3.3-70b",
+            provider=provider,
         )
         self.serper_key = serper_key
         self.user_id = user_id
@@ -403,6 +436,17 @@ class FinancialAnalysisCrew:
             redis_client=self.redis_client,
             message_id=self.message_id
             )
+        bind_agent_loggers(
+            self.enhanced_competitor_agent,
+            self.competitor_analysis_agent,
+            self.fundamental_agent,
+            self.technical_agent,
+            self.risk_agent,
+            self.news_agent,
+            self.aggregator_agent,
+        )
+        if self.docs_included:
+            bind_agent_loggers(self.document_summarizer_agent)
     @weave.op
     def _init_tasks(self):
         # 1) competitor tasks => sequential
@@ -477,6 +521,19 @@ class FinancialAnalysisCrew:
             output_pydantic=FinancialAnalysisResult,
             converter_cls=CustomConverter
         )
+
+        # Direct mode: the data comes from the tools, the aggregator only writes
+        self.summary_task = Task(
+            description=(
+                "Write the news section and the comprehensive summary of the financial analysis of {ticker} ({company_name}). Comprehensive Summary should be ~700 words referencing the competitor, fundamental, technical and risk data below, the news and any document summary. For the news section, you must include the title, the link and the summary of the news. You MUST focus on recent news and events that may affect the stock price or metrics of {ticker} not just financial data. Name entities that are mentioned in the news.\n\n"
+                "Market data:\n{market_data}\n\nNews:\n{news}\n\nDocument summary:\n{document_summary}"
+            ),
+            agent=self.aggregator_agent,
+            expected_output="Valid JSON with company_name, news (news_items with title and link, news_summary) and comprehensive_summary",
+            max_iterations=1,
+            output_pydantic=FinancialSummary,
+            converter_cls=CustomConverter
+        )
     @weave.op    
     def execute_financial_analysis(self, inputs: Dict[str,Any]) -> Tuple[str, Dict[str,Any]]:
         """
@@ -485,6 +542,9 @@ class FinancialAnalysisCrew:
         3) Aggregator => merges
         Return final JSON as string (pydantic).
         """
+        if self.execution_mode == "direct":
+            return self._execute_direct(inputs)
+
         # Parallel after competitor tasks => speeds up
         crew = Crew(
             agents=[
@@ -516,6 +576,113 @@ class FinancialAnalysisCrew:
         final = crew.kickoff(inputs=inputs)
         return final.pydantic.model_dump_json(), dict(final.token_usage)
 
+    @weave.op
+    def _execute_direct(self, inputs: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+        """
+        1) Competitor chain + Fundamentals + Technical + Risk tools, News and Documents crews => parallel
+        2) Summary crew => news section and comprehensive summary
+        3) Final result assembled from the validated tool data
+        """
+        ticker = inputs["ticker"]
+        usage: Counter = Counter()
+        usage_lock = threading.Lock()
+
+        def kickoff(agent: Agent, task: Task, crew_inputs: Dict[str, Any]) -> CrewOutput:
+            output = Crew(agents=[agent], tasks=[task], verbose=self.verbose).kickoff(inputs=crew_inputs)
+            with usage_lock:
+                usage.update({k: v for k, v in dict(output.token_usage).items() if isinstance(v, (int, float))})
+            return output
+
+        with ThreadPoolExecutor(max_workers=6, thread_name_prefix="financial-data") as executor:
+            def submit(fn: Callable[..., Any], *args: Any):
+                # Tools check the request's cancellation token through the context
+                return executor.submit(contextvars.copy_context().run, fn, *args)
+
+            competitor_future = submit(self._competitor_data, ticker, inputs.get("company_name", ""))
+            fundamental_future = submit(self._run_tool, self.fundamental_agent, fundamental_analysis_tool, ticker=ticker)
+            technical_future = submit(self._run_tool, self.technical_agent, yf_tech_analysis, ticker=ticker, period="3mo")
+            risk_future = submit(self._run_tool, self.risk_agent, risk_assessment_tool, ticker=ticker, period="1y")
+            news_future = submit(kickoff, self.news_agent, self.news_task, inputs)
+            document_future = (
+                submit(kickoff, self.document_summarizer_agent, self.document_summarizer_task, inputs)
+                if self.docs_included else None
+            )
+
+            competitor = competitor_future.result()
+            fundamental = self._validate(FundamentalData, fundamental_future.result())
+            technical = self._validate(TechnicalData, technical_future.result())
+            risk = self._validate(RiskData, risk_future.result())
+            news = news_future.result().raw
+            document_summary = document_future.result().raw if document_future is not None else "No documents provided."
+
+        check_cancelled(self.cancellation_token)
+        market_data = {
+            "competitor": competitor.model_dump(),
+            # The dividend history only feeds the front end
+            "fundamental": fundamental.model_dump(exclude={"dividend_history"}),
+            "technical": technical.model_dump(exclude={"chart_data"}),
+            "risk": risk.model_dump(),
+        }
+        summary_output = kickoff(
+            self.aggregator_agent,
+            self.summary_task,
+            {
+                **inputs,
+                "company_name": inputs.get("company_name") or fundamental.company_name,
+                "market_data": json.dumps(market_data),
+                "news": news,
+                "document_summary": document_summary,
+            },
+        )
+        summary = summary_output.pydantic or FinancialSummary(comprehensive_summary=summary_output.raw)
+
+        result = FinancialAnalysisResult(
+            ticker=ticker,
+            company_name=fundamental.company_name or summary.company_name or inputs.get("company_name", ""),
+            competitor=competitor,
+            fundamental=fundamental,
+            risk=risk,
+            stock_price_data=[WeeklyPriceData(**row.model_dump()) for row in technical.stock_price_data],
+            news=summary.news,
+            comprehensive_summary=summary.comprehensive_summary,
+        )
+        return result.model_dump_json(), dict(usage)
+
+    def _run_tool(self, agent: Agent, crew_tool: Any, **kwargs: Any) -> Dict[str, Any]:
+        """Call a data tool directly and publish its output as the step of the agent that used to call it."""
+        check_cancelled(self.cancellation_token)
+        try:
+            result = crew_tool.func(**kwargs)
+        except Exception as e:
+            logger.error(f"Financial analysis tool {crew_tool.name} failed for {kwargs}: {str(e)}")
+            result = {"error": str(e)}
+        if agent.step_callback is not None:
+            text = json.dumps(result, default=str)
+            agent.step_callback(AgentFinish(thought="", output=text, text=text))
+        return result
+
+    def _competitor_data(self, ticker: str, company_name: str) -> CompetitorBlock:
+        found = self._run_tool(
+            self.enhanced_competitor_agent, enhanced_competitor_tool, company_name=company_name, ticker=ticker
+        )
+        tickers = found.get("competitor_tickers") or []
+        if not tickers:
+            return CompetitorBlock()
+        return self._validate(
+            CompetitorBlock, self._run_tool(self.competitor_analysis_agent, competitor_analysis_tool, tickers=tickers)
+        )
+
+    @staticmethod
+    def _validate(model: Any, data: Dict[str, Any]) -> Any:
+        """Validate tool output into its model, falling back to an empty one if the tool failed."""
+        try:
+            return model.model_validate(data)
+        except Exception as e:
+            logger.error(f"Invalid {model.__name__} from financial analysis tool: {str(e)}")
+        if model is RiskData:
+            return RiskData(beta=0.0, sharpe_ratio="", value_at_risk_95="", max_drawdown="", volatility="")
+        return model()
+
 ########## EXAMPLE MAIN ##############
 
 def main():
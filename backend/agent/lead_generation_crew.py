@@ -4,6 +4,7 @@ import uuid
 
 from api.services.redis_service import SecureRedisService
 from agent.crewai_llm import CustomLLM
+from utils.cancellation import CancellationToken
 
 parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 if parent_dir not in sys.path:
@@ -23,9 +24,9 @@ if os.getenv("WANDB_API_KEY"):
 from crewai import Agent, Task, Crew, LLM, Process
 from tools.company_intelligence_tool import CompanyIntelligenceTool
 from tools.market_research_tool import MarketResearchTool
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Optional, Tuple
 from pydantic import BaseModel
-from utils.agent_thought import RedisConversationLogger
+from utils.agent_thought import RedisConversationLogger, bind_agent_loggers
 from config.model_registry import model_registry
 
 class Outreach(BaseModel):
@@ -84,6 +85,7 @@ class ResearchCrew:
         message_id: str = "",
         redis_client: SecureRedisService = None,
         verbose: bool = True,
+        cancellation_token: Optional[CancellationToken] = None,
     ):
 
         model_info = model_registry.get_model_info(model_key="llama-3.3-70b", provider=provider)
@@ -92,7 +94,10 @@ class ResearchCrew:
             temperature=0.00,
             max_tokens=8192,
             api_key=llm_api_key,
-            base_url=model_info["url"]
+            base_url=model_info["url"],
+            cancellation_token=cancellation_token,
+            model_key="llama-3.3-70b",
+            provider=provider,
         )
         self.exa_key = exa_key
         self.user_id = user_id
@@ -187,6 +192,12 @@ class ResearchCrew:
             message_id=self.message_id,
             redis_client=self.redis_client
         )
+        bind_agent_loggers(
+            self.aggregator_agent,
+            self.data_extraction_agent,
+            self.market_trends_agent,
+            self.outreach_agent,
+        )
 
     def _initialize_tasks(self) -> None:
         """
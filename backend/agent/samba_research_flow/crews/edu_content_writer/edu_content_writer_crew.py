@@ -12,7 +12,7 @@ from crewai import Agent, Crew, Process, Task, LLM
 from crewai.project import CrewBase, agent, crew, task
 from agent.crewai_llm import CustomLLM
 from config.model_registry import model_registry
-from utils.agent_thought import RedisConversationLogger
+from utils.agent_thought import RedisConversationLogger, bind_agent_loggers
 import weave
 
 @CrewBase
@@ -61,6 +61,8 @@ class EduContentWriterCrew:
             temperature=0.0,
             max_tokens=8192,
             api_key=self.llm_api_key,
+            model_key="llama-3.3-70b",
+            provider=provider,
         )
         self.user_id = user_id
         self.run_id = run_id
@@ -102,6 +104,7 @@ class EduContentWriterCrew:
             workflow_name="Research",
             llm_name=content_writer.llm.model,
         )
+        bind_agent_loggers(content_writer)
         return content_writer
 
     @agent
@@ -124,6 +127,7 @@ class EduContentWriterCrew:
             workflow_name="Research",
             llm_name=editor.llm.model,
         )
+        bind_agent_loggers(editor)
         return editor
 
     @agent
@@ -146,6 +150,7 @@ class EduContentWriterCrew:
             workflow_name="Research",
             llm_name=quality_reviewer.llm.model,
         )
+        bind_agent_loggers(quality_reviewer)
         return quality_reviewer
     @task
     def writing_task(self) -> Task:
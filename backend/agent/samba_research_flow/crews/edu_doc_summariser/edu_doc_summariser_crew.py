@@ -8,7 +8,7 @@ from crewai.project import CrewBase, agent, crew, task
 from pydantic import BaseModel
 from agent.crewai_llm import CustomLLM
 from config.model_registry import model_registry
-from utils.agent_thought import RedisConversationLogger
+from utils.agent_thought import RedisConversationLogger, bind_agent_loggers
 import weave
 
 current_dir = os.getcwd()
@@ -55,6 +55,8 @@ class EduDocSummariserCrew:
             temperature=0.00,
             max_tokens=8192,
             api_key=self.llm_api_key,
+            model_key="llama-3.3-70b",
+            provider=provider,
         )
         self.user_id = user_id
         self.run_id = run_id
@@ -81,6 +83,7 @@ class EduDocSummariserCrew:
             workflow_name="Research",
             llm_name=summariser.llm.model,
         )
+        bind_agent_loggers(summariser)
         return summariser
 
     @task
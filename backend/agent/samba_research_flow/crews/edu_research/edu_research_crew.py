@@ -16,7 +16,7 @@ import weave
 from pydantic import BaseModel
 from agent.crewai_llm import CustomLLM
 from config.model_registry import model_registry
-from utils.agent_thought import RedisConversationLogger
+from utils.agent_thought import RedisConversationLogger, bind_agent_loggers
 
 current_dir = os.getcwd()
 repo_dir = os.path.abspath(os.path.join(current_dir, "../.."))
@@ -95,6 +95,8 @@ class EduResearchCrew:
             temperature=0.00,
             max_tokens=8192,
             api_key=self.llm_api_key,
+            model_key="llama-3.3-70b",
+            provider=provider,
         )
         self.user_id = user_id
         self.run_id = run_id
@@ -126,6 +128,7 @@ class EduResearchCrew:
             workflow_name="Research",
             llm_name=researcher.llm.model,
         )
+        bind_agent_loggers(researcher)
         return researcher
 
     
@@ -150,6 +153,7 @@ class EduResearchCrew:
             workflow_name="Research",
             llm_name=planner.llm.model,
         )
+        bind_agent_loggers(planner)
         return planner
 
     @task
@@ -1,6 +1,8 @@
+import asyncio
 from datetime import datetime
 import functools
 import json
+import os
 import time
 from autogen_agentchat.agents import AssistantAgent, UserProxyAgent
 
@@ -11,6 +13,8 @@ from autogen_core import (
     message_handler,
     type_subscription,
 )
+from autogen_core.model_context import ChatCompletionContext
+from autogen_core.models import LLMMessage
 import weave
 from autogen_ext.models.openai import OpenAIChatCompletionClient
 from autogen_agentchat.messages import TextMessage
@@ -30,14 +34,35 @@ from api.data_types import (
 from exa_py import Exa
 from tavily import AsyncTavilyClient
 
+from api.services.rate_limiter import rate_limiter
+from api.services.workload_scheduler import SchedulerSaturatedError, WorkloadClass, workload_scheduler
 from config.model_registry import model_registry
+from services.market_data_service import market_data
+from utils.cancellation import OperationCancelledError, cancellation_registry, current_cancellation_token
 from utils.logging import logger
+from utils.token_budget import estimate_tokens, fit_messages, prompt_budget
 
 from typing import Any, Dict, List, Literal, Optional
 import aiohttp
 
 tavily_async_client = AsyncTavilyClient()
 
+ASSISTANT_SYSTEM_MESSAGE = "You are a helpful AI assistant. You have access to real-time stock data and news information and you should use the company ticker when searching for stock data. Use the tools provided to assist the user with their request regarding current affairs. Use the provided documents to answer questions if the user asks about them."
+
+# Allowance for the JSON schemas of the assistant's tools
+TOOL_SCHEMA_TOKENS = 1024
+
+
+class TokenBudgetChatCompletionContext(ChatCompletionContext):
+    """Chat context that returns the most recent messages fitting a prompt token budget."""
+
+    def __init__(self, budget: int, initial_messages: Optional[List[LLMMessage]] = None) -> None:
+        super().__init__(initial_messages)
+        self._budget = budget
+
+    async def get_messages(self) -> List[LLMMessage]:
+        return fit_messages(self._messages, self._budget)
+
 
 async def get_current_time() -> str:
     """Get the current time."""
@@ -48,12 +73,13 @@ async def tavily_search(search_query: str) -> List[Dict[str, Any]]:
     Performs a web search using the Tavily API.
     """
     logger.info(f"Using Tavily to search for {search_query}")
-    response = await tavily_async_client.search(
-            search_query,
-            max_results=5,
-            include_raw_content=False,
-            topic="general"
-        )
+    async with rate_limiter.slot("tavily", os.getenv("TAVILY_API_KEY")):
+        response = await tavily_async_client.search(
+                search_query,
+                max_results=5,
+                include_raw_content=False,
+                topic="general"
+            )
     
     search_results = []
     for result in response["results"]:
@@ -66,6 +92,9 @@ async def tavily_search(search_query: str) -> List[Dict[str, Any]]:
 @weave.op
 async def yahoo_finance_search(symbol: str) -> Dict[str, Any]:
     """Get current stock information for a given symbol."""
+    return await market_data.aquote(symbol, functools.partial(_fetch_yahoo_quote, symbol))
+
+async def _fetch_yahoo_quote(symbol: str) -> Dict[str, Any]:
     try:
         logger.info(f"Using Yahoo Finance to search for {symbol}")
         url = f"https://query1.finance.yahoo.com/v8/finance/chart/{symbol}"
@@ -104,10 +133,12 @@ def exa_news_search(
     try:
         exa = Exa(api_key=api_key)
         if answer:
-            exa_response = exa.answer(query)
+            with rate_limiter.slot_sync("exa", api_key):
+                exa_response = exa.answer(query)
             return [{"answer": exa_response.answer}]
         else:
-            exa_response = exa.search_and_contents(query, num_results=5, text=True)
+            with rate_limiter.slot_sync("exa", api_key):
+                exa_response = exa.search_and_contents(query, num_results=5, text=True)
             results = []
             for article in exa_response.results:
                 results.append(
@@ -160,12 +191,18 @@ class AssistantAgentWrapper(RoutedAgent):
 
         try:
             # Get model configuration
+            model_key = "llama-3.1-70b" if provider == "fireworks" else "llama-3.3-70b"
             model_info = model_registry.get_model_info(
-                model_key="llama-3.1-70b" if provider == "fireworks" else "llama-3.3-70b", 
+                model_key=model_key, 
                 provider=provider
             )
             if not model_info:
                 raise ValueError(f"No model configuration found for provider {provider}")
+            # The system message and tool schemas are sent besides the context
+            budget = prompt_budget(
+                model_registry.get_context_window(model_key=model_key, provider=provider),
+                model_registry.get_max_output_tokens(model_key=model_key, provider=provider),
+            ) - estimate_tokens(ASSISTANT_SYSTEM_MESSAGE) - TOOL_SCHEMA_TOKENS
 
             self._current_provider = provider
             self._assistant_instance = AssistantAgent(
@@ -188,7 +225,8 @@ class AssistantAgentWrapper(RoutedAgent):
                     yahoo_finance_search,
                     functools.partial(exa_news_search, self.api_keys.exa_key),
                 ],
-                system_message="You are a helpful AI assistant. You have access to real-time stock data and news information and you should use the company ticker when searching for stock data. Use the tools provided to assist the user with their request regarding current affairs. Use the provided documents to answer questions if the user asks about them.",
+                system_message=ASSISTANT_SYSTEM_MESSAGE,
+                model_context=TokenBudgetChatCompletionContext(budget),
                 reflect_on_tool_use=True,
             )
             return self._assistant_instance
@@ -201,6 +239,10 @@ class AssistantAgentWrapper(RoutedAgent):
     async def handle_text_message(
         self, message: AgentRequest, ctx: MessageContext
     ) -> None:
+        cancellation_token = cancellation_registry.create(ctx.topic_id.source, message.message_id)
+        current_cancellation_token.set(cancellation_token)
+        # Cancelling the autogen token aborts the in-flight model and tool calls
+        cancellation_token.add_callback(ctx.cancellation_token.cancel)
         try:
             logger.info(
                 logger.format_message(
@@ -216,9 +258,13 @@ class AssistantAgentWrapper(RoutedAgent):
             user_messages.append(TextMessage(content=message.parameters.query, source="user"))
 
             start_time = time.time()
-            response = await self.get_assistant(message.provider).on_messages(
-                user_messages, ctx.cancellation_token
-            )
+            user_id, conversation_id = ctx.topic_id.source.split(":")
+            async with workload_scheduler.slot(
+                WorkloadClass.INTERACTIVE, user_id, conversation_id, message.message_id
+            ):
+                response = await self.get_assistant(message.provider).on_messages(
+                    user_messages, ctx.cancellation_token
+                )
             logger.info(
                 logger.format_message(
                     ctx.topic_id.source, "Generated response successfully"
@@ -252,8 +298,6 @@ class AssistantAgentWrapper(RoutedAgent):
             end_time = time.time()
             processing_time = end_time - start_time
 
-            user_id, conversation_id = ctx.topic_id.source.split(":")
-
             assistant_metadata = {
                 "duration": processing_time,
                 "llm_name": self.get_assistant(message.provider)._model_client._resolved_model,
@@ -297,6 +341,32 @@ class AssistantAgentWrapper(RoutedAgent):
                 structured_response,
                 DefaultTopicId(type="user_proxy", source=ctx.topic_id.source),
             )
+        except (OperationCancelledError, asyncio.CancelledError):
+            if not cancellation_token.is_cancelled:
+                raise
+            logger.info(
+                logger.format_message(
+                    ctx.topic_id.source, "Assistant request cancelled"
+                )
+            )
+            await self.reset_model_usage(self.get_assistant(message.provider))
+        except SchedulerSaturatedError as e:
+            logger.info(
+                logger.format_message(
+                    ctx.topic_id.source, "Assistant request rejected, scheduler saturated"
+                )
+            )
+            response = AgentStructuredResponse(
+                agent_type=AgentEnum.Error,
+                data=ErrorResponse(error=f"We are handling a lot of assistant requests right now, please try again in {e.retry_after:.0f} seconds."),
+                message=f"Error processing assistant request: {str(e)}",
+                metadata={"retry_after": e.retry_after},
+                message_id=message.message_id
+            )
+            await self.publish_message(
+                response,
+                DefaultTopicId(type="user_proxy", source=ctx.topic_id.source),
+            )
         except Exception as e:
             logger.error(
                 logger.format_message(
@@ -314,6 +384,8 @@ class AssistantAgentWrapper(RoutedAgent):
                 response,
                 DefaultTopicId(type="user_proxy", source=ctx.topic_id.source),
             )
+        finally:
+            cancellation_registry.release(ctx.topic_id.source, message.message_id)
 
     async def reset_model_usage(self, assistant: AssistantAgent) -> None:
         """Reset the model usage statistics for the assistant.
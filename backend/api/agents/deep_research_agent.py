@@ -1,9 +1,11 @@
 ########## deep_research_agent.py (NEW CODE) ##########
 import asyncio
 import json
-from typing import Any, Union
+from typing import Any, Optional, Union
 import uuid
 from api.services.redis_service import SecureRedisService
+from api.services.session_store import estimate_size, session_store
+from api.services.workload_scheduler import SchedulerSaturatedError, WorkloadClass, workload_scheduler
 import weave
 
 from autogen_core import MessageContext
@@ -30,9 +32,23 @@ from api.data_types import (
 from api.agents.open_deep_research.configuration import SearchAPI
 from api.agents.open_deep_research.utils import APIKeyRotator
 from config.model_registry import model_registry
+from utils.cancellation import OperationCancelledError, cancellation_registry, current_cancellation_token
 from utils.logging import logger
 from api.agents.open_deep_research.graph import LLMTimeoutError, create_publish_callback, get_graph
 
+DEEP_RESEARCH_NAMESPACE = "deep_research"
+
+
+def _session_size(session: dict) -> int:
+    # Checkpoints dominate; the thread config only references shared objects
+    memory = session["memory"]
+    return estimate_size(getattr(memory, "storage", {})) + estimate_size(getattr(memory, "writes", {}))
+
+
+# Checkpoints cannot be rebuilt, so sessions are pinned while a run or its plan feedback is pending
+session_store.register_namespace(
+    DEEP_RESEARCH_NAMESPACE, sizer=_session_size, evictable=lambda session: not session["pinned"]
+)
 
 @type_subscription(topic_type="deep_research")
 class DeepResearchAgent(RoutedAgent):
@@ -51,14 +67,19 @@ class DeepResearchAgent(RoutedAgent):
                 None, f"Initializing DeepResearchAgent with ID: {self.id}"
             )
         )
-        # memory saver per user session
-        self.memory_stores = {}
-        self._session_threads = {}
 
-    def _get_or_create_memory(self, session_id: str) -> MemorySaver:
-        if session_id not in self.memory_stores:
-            self.memory_stores[session_id] = MemorySaver()
-        return self.memory_stores[session_id]
+    def _get_or_create_session(self, session_id: str) -> dict:
+        # Memory saver and thread config per user session, kept in the bounded session store
+        session = session_store.get(DEEP_RESEARCH_NAMESPACE, session_id)
+        if session is None:
+            session = {"memory": MemorySaver(), "thread_config": None, "pinned": False}
+            session_store.set(DEEP_RESEARCH_NAMESPACE, session_id, session)
+        return session
+
+    def _get_thread_config(self, session_id: str) -> Optional[dict]:
+        session = session_store.get(DEEP_RESEARCH_NAMESPACE, session_id)
+        return session["thread_config"] if session is not None else None
+
  
     def _get_or_create_thread_config(
         self,
@@ -66,10 +87,11 @@ class DeepResearchAgent(RoutedAgent):
         llm_provider: str,
         message_id: str
     ) -> dict:
-        if session_id not in self._session_threads:
+        session = self._get_or_create_session(session_id)
+        if session["thread_config"] is None:
             user_id, conversation_id = session_id.split(":")
             thread_id = str(uuid.uuid4())
-            self._session_threads[session_id] = {
+            session["thread_config"] = {
                 "configurable": {
                     "thread_id": thread_id,
                     "search_api": SearchAPI.TAVILY,
@@ -93,14 +115,13 @@ class DeepResearchAgent(RoutedAgent):
                     ),
                 }
             }
-        return self._session_threads[session_id]
+        return session["thread_config"]
 
     def _update_token_usage(self, session_id: str):
         def update(usage: dict):
-            if session_id in self._session_threads:
-                token_usage = self._session_threads[session_id]["configurable"][
-                    "token_usage"
-                ]
+            thread_config = self._get_thread_config(session_id)
+            if thread_config is not None:
+                token_usage = thread_config["configurable"]["token_usage"]
                 token_usage["total_tokens"] += usage.get("total_tokens", 0)
                 token_usage["prompt_tokens"] += usage.get("prompt_tokens", 0)
                 token_usage["completion_tokens"] += usage.get("completion_tokens", 0)
@@ -120,8 +141,9 @@ class DeepResearchAgent(RoutedAgent):
         user_text = message.query.strip()
 
         # Reset token usage for new requests
-        if session_id in self._session_threads:
-            self._session_threads[session_id]["configurable"]["token_usage"] = {
+        previous_thread_config = self._get_thread_config(session_id)
+        if previous_thread_config is not None:
+            previous_thread_config["configurable"]["token_usage"] = {
                 "total_tokens": 0,
                 "prompt_tokens": 0,
                 "completion_tokens": 0,
@@ -142,54 +164,70 @@ class DeepResearchAgent(RoutedAgent):
             else:
                 graph_input = {"topic": message.parameters.deep_research_topic}
 
-        memory = self._get_or_create_memory(session_id)
+        session = self._get_or_create_session(session_id)
+        memory = session["memory"]
         builder = get_graph(
             getattr(
                 self.api_keys, model_registry.get_api_key_env(provider=message.provider)
             ),
             provider=message.provider,
+            api_keys=self.api_keys,
         )
 
         graph = builder.compile(checkpointer=memory)
         thread_config = self._get_or_create_thread_config(session_id, message.provider, message.message_id)
 
+        cancellation_token = cancellation_registry.create(session_id, message.message_id)
+        current_cancellation_token.set(cancellation_token)
+        thread_config["configurable"]["cancellation_token"] = cancellation_token
+        # Cancelling the handler task aborts in-flight async nodes such as web search;
+        # sync nodes stop at their next LLM wait
+        handler_task = asyncio.current_task()
+        loop = asyncio.get_running_loop()
+        cancellation_token.add_callback(lambda: loop.call_soon_threadsafe(handler_task.cancel))
+
+        session["pinned"] = True
+        awaiting_feedback = False
         try:
-            async for event in graph.astream(
-                graph_input, thread_config, stream_mode="updates"
+            user_id, conversation_id = session_id.split(":")
+            async with workload_scheduler.slot(
+                WorkloadClass.DEEP_RESEARCH, user_id, conversation_id, message.message_id
             ):
-                logger.info(
-                    logger.format_message(
-                        session_id, f"DeepResearchFlow Event: {event}"
-                    )
-                )
-                # if there's an interrupt, we ask user for feedback
-                if "__interrupt__" in event:
-                    interrupt_data = event["__interrupt__"]
-                    if isinstance(interrupt_data, tuple) and interrupt_data:
-                        interrupt_msg = interrupt_data[0].value
-                        user_question_str = (
-                            "Please <b>provide feedback</b> on the following plan or <b>type 'true' to approve it</b>.\n\n"
-                            f"{interrupt_msg}\n\n"
-                        )
-                        token_usage = self._session_threads[session_id]["configurable"][
-                            "token_usage"
-                        ]
-                        response = AgentStructuredResponse(
-                            agent_type=AgentEnum.UserProxy,
-                            data=DeepResearchUserQuestion(
-                                deep_research_question=user_question_str
-                            ),
-                            message=user_question_str,
-                            metadata=token_usage,
-                            message_id=message.message_id
-                        )
-                        await self.publish_message(
-                            response,
-                            DefaultTopicId(
-                                type="user_proxy", source=ctx.topic_id.source
-                            ),
+                async for event in graph.astream(
+                    graph_input, thread_config, stream_mode="updates"
+                ):
+                    logger.info(
+                        logger.format_message(
+                            session_id, f"DeepResearchFlow Event: {event}"
                         )
-                    return
+                    )
+                    # if there's an interrupt, we ask user for feedback
+                    if "__interrupt__" in event:
+                        interrupt_data = event["__interrupt__"]
+                        if isinstance(interrupt_data, tuple) and interrupt_data:
+                            interrupt_msg = interrupt_data[0].value
+                            user_question_str = (
+                                "Please <b>provide feedback</b> on the following plan or <b>type 'true' to approve it</b>.\n\n"
+                                f"{interrupt_msg}\n\n"
+                            )
+                            token_usage = thread_config["configurable"]["token_usage"]
+                            response = AgentStructuredResponse(
+                                agent_type=AgentEnum.UserProxy,
+                                data=DeepResearchUserQuestion(
+                                    deep_research_question=user_question_str
+                                ),
+                                message=user_question_str,
+                                metadata=token_usage,
+                                message_id=message.message_id
+                            )
+                            await self.publish_message(
+                                response,
+                                DefaultTopicId(
+                                    type="user_proxy", source=ctx.topic_id.source
+                                ),
+                            )
+                        awaiting_feedback = True
+                        return
 
             # If we get here => the flow completed
             final_state = graph.get_state(thread_config, subgraphs=True)
@@ -206,9 +244,7 @@ class DeepResearchAgent(RoutedAgent):
                 }
 
             # Add token usage to the report
-            token_usage = self._session_threads[session_id]["configurable"][
-                "token_usage"
-            ]
+            token_usage = thread_config["configurable"]["token_usage"]
             structured_report = DeepResearchReport.model_validate(dr_report)
             response = AgentStructuredResponse(
                 agent_type=AgentEnum.DeepResearch,
@@ -223,6 +259,31 @@ class DeepResearchAgent(RoutedAgent):
                 DefaultTopicId(type="user_proxy", source=ctx.topic_id.source),
             )
 
+        except (OperationCancelledError, asyncio.CancelledError):
+            if not cancellation_token.is_cancelled:
+                raise
+            if handler_task.cancelling():
+                handler_task.uncancel()
+            logger.info(
+                logger.format_message(session_id, "Deep research request cancelled")
+            )
+        except SchedulerSaturatedError as e:
+            logger.info(
+                logger.format_message(
+                    session_id, "Deep research request rejected, scheduler saturated"
+                )
+            )
+            response = AgentStructuredResponse(
+                agent_type=AgentEnum.Error,
+                data=ErrorResponse(error=f"We are handling a lot of deep research requests right now, please try again in {e.retry_after:.0f} seconds."),
+                message=f"Error processing deep research request: {str(e)}",
+                metadata={"retry_after": e.retry_after},
+                message_id=message.message_id
+            )
+            await self.publish_message(
+                response,
+                DefaultTopicId(type="user_proxy", source=ctx.topic_id.source),
+            )
         except LLMTimeoutError as e:
             logger.error(logger.format_message(session_id, f"DeepResearch flow error timeout"))
             response = AgentStructuredResponse(
@@ -255,3 +316,8 @@ class DeepResearchAgent(RoutedAgent):
                 response,
                 DefaultTopicId(type="user_proxy", source=ctx.topic_id.source),
             )
+        finally:
+            cancellation_registry.release(session_id, message.message_id)
+            session["pinned"] = awaiting_feedback
+            # The checkpointer grew during the run
+            session_store.resize(DEEP_RESEARCH_NAMESPACE, session_id)
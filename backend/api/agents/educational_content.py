@@ -13,6 +13,8 @@ from autogen_core import (
 from agent.samba_research_flow.crews.edu_research.edu_research_crew import EducationalPlan
 from agent.samba_research_flow.samba_research_flow import SambaResearchFlow
 from config.model_registry import model_registry
+from api.services.single_flight import single_flight
+from api.services.workload_scheduler import SchedulerSaturatedError, WorkloadClass, workload_scheduler
 
 from api.data_types import (
     AgentEnum,
@@ -22,6 +24,7 @@ from api.data_types import (
     APIKeys,
     ErrorResponse,
 )
+from utils.cancellation import CancellationToken, OperationCancelledError, cancellation_registry, current_cancellation_token
 from utils.logging import logger
 import weave
 
@@ -34,6 +37,9 @@ class EducationalContentAgent(RoutedAgent):
 
     @message_handler
     async def handle_educational_content_request(self, message: AgentRequest, ctx: MessageContext) -> None:
+        # The flow's crews pick the token up from the context propagated into the worker thread
+        cancellation_token = cancellation_registry.create(ctx.topic_id.source, message.message_id)
+        current_cancellation_token.set(cancellation_token)
         try:
             user_id, conversation_id = ctx.topic_id.source.split(":")
             logger.info(logger.format_message(
@@ -41,15 +47,6 @@ class EducationalContentAgent(RoutedAgent):
                 f"Processing educational content request for topic: '{message.parameters.topic}'"
             ))
             
-            edu_flow = SambaResearchFlow(
-                    llm_api_key=getattr(self.api_keys, model_registry.get_api_key_env(provider=message.provider)),
-                    provider=message.provider,
-                    serper_key=self.api_keys.serper_key,
-                    user_id=user_id,
-                    run_id=conversation_id,
-                    docs_included=True if message.docs else False,
-                    verbose=False
-                )
             edu_inputs = {
                 "topic": message.parameters.topic,
                 "audience_level": message.parameters.audience_level if message.parameters.audience_level else "",
@@ -61,23 +58,55 @@ class EducationalContentAgent(RoutedAgent):
                 ctx.topic_id.source,
                 f"Starting educational content flow with inputs: {edu_inputs}"
             ))
-            edu_flow.input_variables = edu_inputs
-            result = await asyncio.to_thread(edu_flow.kickoff, edu_inputs)
 
-            usage_stats = [edu_flow.research_usage] + edu_flow.content_usage + ([edu_flow.summariser_usage] if edu_flow.summariser_usage else [])
+            async def run_flow(token: CancellationToken):
+                edu_flow = SambaResearchFlow(
+                    llm_api_key=getattr(self.api_keys, model_registry.get_api_key_env(provider=message.provider)),
+                    provider=message.provider,
+                    serper_key=self.api_keys.serper_key,
+                    user_id=user_id,
+                    run_id=conversation_id,
+                    docs_included=True if message.docs else False,
+                    verbose=False
+                )
+                edu_flow.input_variables = edu_inputs
+                result = await workload_scheduler.run(
+                    WorkloadClass.CREW,
+                    user_id,
+                    edu_flow.kickoff,
+                    edu_inputs,
+                    conversation_id=conversation_id,
+                    message_id=message.message_id,
+                )
+
+                usage_stats = [edu_flow.research_usage] + edu_flow.content_usage + ([edu_flow.summariser_usage] if edu_flow.summariser_usage else [])
 
-            # Sum up usage statistics
-            total_usage = {
-                'total_tokens': 0,
-                'prompt_tokens': 0, 
-                'cached_prompt_tokens': 0,
-                'completion_tokens': 0,
-                'successful_requests': 0
-            }
-            
-            for usage in usage_stats:
-                for key in total_usage:
-                    total_usage[key] += usage.get(key, 0)
+                # Sum up usage statistics
+                total_usage = {
+                    'total_tokens': 0,
+                    'prompt_tokens': 0, 
+                    'cached_prompt_tokens': 0,
+                    'completion_tokens': 0,
+                    'successful_requests': 0
+                }
+
+                for usage in usage_stats:
+                    for key in total_usage:
+                        total_usage[key] += usage.get(key, 0)
+                return result, total_usage
+
+            # Share the flow with identical requests unless it depends on user documents
+            if message.docs:
+                result, total_usage = await run_flow(cancellation_token)
+            else:
+                result, total_usage = await single_flight.run(
+                    single_flight.make_key(self.id.type, edu_inputs, message.provider),
+                    run_flow,
+                    user_id,
+                    conversation_id,
+                    message.message_id,
+                    cancellation_token=cancellation_token,
+                )
 
             logger.info(logger.format_message(
                 ctx.topic_id.source,
@@ -101,6 +130,27 @@ class EducationalContentAgent(RoutedAgent):
                 response,
                 DefaultTopicId(type="user_proxy", source=ctx.topic_id.source),
             )
+        except OperationCancelledError:
+            logger.info(logger.format_message(
+                ctx.topic_id.source,
+                "Educational content request cancelled"
+            ))
+        except SchedulerSaturatedError as e:
+            logger.info(logger.format_message(
+                ctx.topic_id.source,
+                f"Educational content request rejected, scheduler saturated"
+            ))
+            response = AgentStructuredResponse(
+                agent_type=AgentEnum.Error,
+                data=ErrorResponse(error=f"We are handling a lot of research content requests right now, please try again in {e.retry_after:.0f} seconds."),
+                message=f"Error processing research content request: {str(e)}",
+                metadata={"retry_after": e.retry_after},
+                message_id=message.message_id
+            )
+            await self.publish_message(
+                response,
+                DefaultTopicId(type="user_proxy", source=ctx.topic_id.source),
+            )
         except Exception as e:
             logger.error(logger.format_message(
                 ctx.topic_id.source,
@@ -116,3 +166,5 @@ class EducationalContentAgent(RoutedAgent):
                 response,
                 DefaultTopicId(type="user_proxy", source=ctx.topic_id.source),
             )
+        finally:
+            cancellation_registry.release(ctx.topic_id.source, message.message_id)
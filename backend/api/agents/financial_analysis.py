@@ -16,7 +16,10 @@ from agent.financial_analysis.financial_analysis_crew import (
     FinancialAnalysisCrew,
     FinancialAnalysisResult,
 )
+from api.services.agent_prewarmer import agent_prewarmer
 from api.services.redis_service import SecureRedisService
+from api.services.single_flight import single_flight
+from api.services.workload_scheduler import SchedulerSaturatedError, WorkloadClass, workload_scheduler
 from config.model_registry import model_registry
 from services.financial_user_prompt_extractor_service import FinancialPromptExtractor
 
@@ -27,9 +30,22 @@ from ..data_types import (
     APIKeys,
     ErrorResponse,
 )
+from utils.cancellation import CancellationToken, OperationCancelledError, cancellation_registry, current_cancellation_token
 from utils.logging import logger
 import weave
 
+async def prewarm_ticker_extraction(fields: Dict[str, Any], provider: str, api_keys: APIKeys) -> Tuple[str, str]:
+    """Extracts the ticker and company name while the planner streams the remaining parameters."""
+    api_key = getattr(api_keys, model_registry.get_api_key_env(provider=provider))
+    fextractor = FinancialPromptExtractor(api_key, provider)
+    return await asyncio.to_thread(fextractor.extract_info, fields["parameters.query_text"])
+
+
+agent_prewarmer.register(
+    AgentEnum.FinancialAnalysis.value, prewarm_ticker_extraction, requires=("parameters.query_text",)
+)
+
+
 @type_subscription(topic_type="financial_analysis")
 class FinancialAnalysisAgent(RoutedAgent):
     def __init__(
@@ -46,10 +62,17 @@ class FinancialAnalysisAgent(RoutedAgent):
         self, crew: FinancialAnalysisCrew, parameters: Dict[str, Any], provider: str
     ) -> Tuple[str, Dict[str,Any]]:
         logger.info(logger.format_message(None, f"Extracting financial information from query: '{parameters.get('query_text', '')[:100]}...'"))
-        api_key = getattr(self.api_keys, model_registry.get_api_key_env(provider=provider))
-        fextractor = FinancialPromptExtractor(api_key, provider)
         query_text = parameters.get("query_text", "")
-        extracted_ticker, extracted_company = fextractor.extract_info(query_text)
+        # The router may have started the extraction while the planner was streaming
+        prewarmed = await agent_prewarmer.consume(
+            AgentEnum.FinancialAnalysis.value, crew.message_id, {"parameters.query_text": query_text}
+        )
+        if prewarmed is not None:
+            extracted_ticker, extracted_company = prewarmed
+        else:
+            api_key = getattr(self.api_keys, model_registry.get_api_key_env(provider=provider))
+            fextractor = FinancialPromptExtractor(api_key, provider)
+            extracted_ticker, extracted_company = fextractor.extract_info(query_text)
 
         if not extracted_ticker:
             extracted_ticker = parameters.get("ticker", "")
@@ -68,12 +91,21 @@ class FinancialAnalysisAgent(RoutedAgent):
             inputs["docs"] = parameters["docs"]
             logger.info(logger.format_message(None, "Including additional document analysis in financial analysis"))
 
-        # Run the synchronous function in a thread pool
-        raw_result, usage_stats = await asyncio.to_thread(crew.execute_financial_analysis, inputs)
+        # Run the synchronous crew once the scheduler grants a crew slot
+        raw_result, usage_stats = await workload_scheduler.run(
+            WorkloadClass.CREW,
+            crew.user_id,
+            crew.execute_financial_analysis,
+            inputs,
+            conversation_id=crew.run_id,
+            message_id=crew.message_id,
+        )
         return raw_result, usage_stats
 
     @message_handler
     async def handle_financial_analysis_request(self, message: AgentRequest, ctx: MessageContext) -> None:
+        cancellation_token = cancellation_registry.create(ctx.topic_id.source, message.message_id)
+        current_cancellation_token.set(cancellation_token)
         try:
             user_id, conversation_id = ctx.topic_id.source.split(":")
             logger.info(logger.format_message(
@@ -96,27 +128,37 @@ class FinancialAnalysisAgent(RoutedAgent):
                 )
                 return
 
-            # Initialize crew
-            crew = FinancialAnalysisCrew(
-                llm_api_key=getattr(self.api_keys, model_registry.get_api_key_env(provider=message.provider)),
-                provider=message.provider,
-                serper_key=self.api_keys.serper_key,
-                user_id=user_id,
-                run_id=conversation_id,
-                docs_included=True if message.docs else False,
-                verbose=False,
-                message_id=message.message_id, 
-                redis_client=self.redis_client
-            )
-
             parameters = message.parameters.model_dump()
             if message.docs:
                 parameters["docs"] = "\n\n".join(message.docs)
 
-            # Execute analysis
-            raw_result, usage_stats = await self.execute_financial(
-                crew, parameters, message.provider
-            )
+            async def run_analysis(token: CancellationToken) -> Tuple[str, Dict[str, Any]]:
+                crew = FinancialAnalysisCrew(
+                    llm_api_key=getattr(self.api_keys, model_registry.get_api_key_env(provider=message.provider)),
+                    provider=message.provider,
+                    serper_key=self.api_keys.serper_key,
+                    user_id=user_id,
+                    run_id=conversation_id,
+                    docs_included=True if message.docs else False,
+                    verbose=False,
+                    message_id=message.message_id,
+                    redis_client=self.redis_client,
+                    cancellation_token=token,
+                )
+                return await self.execute_financial(crew, parameters, message.provider)
+
+            # Execute analysis, sharing it with identical requests unless it depends on user documents
+            if message.docs:
+                raw_result, usage_stats = await run_analysis(cancellation_token)
+            else:
+                raw_result, usage_stats = await single_flight.run(
+                    single_flight.make_key(self.id.type, {"ticker": message.parameters.ticker}, message.provider),
+                    run_analysis,
+                    user_id,
+                    conversation_id,
+                    message.message_id,
+                    cancellation_token=cancellation_token,
+                )
 
             financial_analysis_result = FinancialAnalysisResult.model_validate(
                 json.loads(raw_result)
@@ -143,6 +185,27 @@ class FinancialAnalysisAgent(RoutedAgent):
                 DefaultTopicId(type="user_proxy", source=ctx.topic_id.source),
             )
 
+        except OperationCancelledError:
+            logger.info(logger.format_message(
+                ctx.topic_id.source,
+                "Financial analysis request cancelled"
+            ))
+        except SchedulerSaturatedError as e:
+            logger.info(logger.format_message(
+                ctx.topic_id.source,
+                f"Financial analysis request rejected, scheduler saturated"
+            ))
+            response = AgentStructuredResponse(
+                agent_type=AgentEnum.Error,
+                data=ErrorResponse(error=f"We are handling a lot of financial analysis requests right now, please try again in {e.retry_after:.0f} seconds."),
+                message=f"Error processing financial analysis request: {str(e)}",
+                metadata={"retry_after": e.retry_after},
+                message_id=message.message_id
+            )
+            await self.publish_message(
+                response,
+                DefaultTopicId(type="user_proxy", source=ctx.topic_id.source),
+            )
         except Exception as e:
             logger.error(logger.format_message(
                 ctx.topic_id.source,
@@ -158,3 +221,5 @@ class FinancialAnalysisAgent(RoutedAgent):
                 response,
                 DefaultTopicId(type="user_proxy", source=ctx.topic_id.source),
             )
+        finally:
+            cancellation_registry.release(ctx.topic_id.source, message.message_id)
@@ -45,6 +45,7 @@ class Configuration:
     user_id: Optional[str] = None  # User ID
     conversation_id: Optional[str] = None  # Conversation ID    
     provider: Optional[str] = None  # Provider
+    cancellation_token: Optional[Any] = None  # CancellationToken of the current request
     
 
     @classmethod
@@ -69,5 +70,7 @@ class Configuration:
             values["conversation_id"] = configurable["conversation_id"]
         if configurable and "provider" in configurable:
             values["provider"] = configurable["provider"]
+        if configurable and "cancellation_token" in configurable:
+            values["cancellation_token"] = configurable["cancellation_token"]
 
         return cls(**{k: v for k, v in values.items() if v})
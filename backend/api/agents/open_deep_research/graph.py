@@ -21,7 +21,7 @@ from langgraph.graph import START, END, StateGraph
 from langgraph.types import interrupt, Command
 from api.services.redis_service import SecureRedisService
 
-from config.model_registry import model_registry
+from api.services.provider_router import ProviderTarget, RoutedChatModel, provider_router
 
 import weave
 
@@ -55,6 +55,7 @@ from api.data_types import (
     DeepCitation
 )
 
+from utils.cancellation import check_cancelled
 from utils.logging import logger
 
 class UsageCallback(BaseCallbackHandler):
@@ -305,6 +306,7 @@ async def generate_report_plan(writer_model, planner_model, state: ReportState,
 
     query_list = [q.search_query for q in results.queries]
     logger.info(logger.format_message(session_id, f"Generated {len(query_list)} search queries"))
+    check_cancelled(configurable.cancellation_token)
 
     logger.info(logger.format_message(session_id, f"Using search API: {configurable.search_api}"))
     if configurable.search_api == SearchAPI.TAVILY:
@@ -415,6 +417,7 @@ async def search_web(state: SectionState, config: RunnableConfig):
     
     query_list = [q.search_query for q in sq]
     logger.info(logger.format_message(session_id, f"Executing web search with {len(query_list)} queries"))
+    check_cancelled(configurable.cancellation_token)
 
     logger.info(logger.format_message(session_id, f"Using search API: {configurable.search_api}"))
     if configurable.search_api == SearchAPI.TAVILY:
@@ -464,6 +467,8 @@ def invoke_llm_with_tracking(
         LLMTimeoutError: If the LLM request exceeds the timeout duration
     """
     start_time = time.time()
+    cancellation_token = configurable.cancellation_token
+    check_cancelled(cancellation_token)
     
     # Create an event to signal completion
     completion_event = threading.Event()
@@ -484,6 +489,10 @@ def invoke_llm_with_tracking(
     thread = threading.Thread(target=invoke_llm_thread)
     thread.daemon = True  # Allow the thread to be terminated when the main thread exits
     thread.start()
+
+    # Wake up immediately if the request is cancelled while waiting
+    if cancellation_token is not None:
+        cancellation_token.add_callback(completion_event.set)
     
     # Wait for completion or timeout
     if not completion_event.wait(timeout=timeout_seconds):
@@ -491,6 +500,9 @@ def invoke_llm_with_tracking(
         logger.error(logger.format_message(session_id, error_msg))
         # Thread will continue running but we'll ignore its result
         raise LLMTimeoutError(error_msg)
+
+    # A cancellation wakes the wait early; the abandoned thread's result is ignored
+    check_cancelled(cancellation_token)
     
     # Check if there was an exception
     if exception_container:
@@ -770,30 +782,36 @@ def summarize_documents(summary_model, state: ReportState, config: RunnableConfi
                 if s.research
     ])
 
-def get_graph(api_key: str, provider: str):
+# Completion limit of the report models; prompts are trimmed to leave room for it
+MAX_OUTPUT_TOKENS = 8192
+
+
+def _chat_model(target: ProviderTarget):
+    """Create the LangChain chat model for one provider target."""
+    if target.provider == "fireworks":
+        return ChatFireworks(base_url=target.url, model=target.model, temperature=0, max_tokens=MAX_OUTPUT_TOKENS, api_key=target.api_key)
+    elif target.provider == "sambanova":
+        return ChatSambaNovaCloud(sambanova_url=target.long_url, model=target.model, temperature=0, max_tokens=MAX_OUTPUT_TOKENS, sambanova_api_key=target.api_key)
+    else:
+        raise ValueError(f"Unsupported provider: {target.provider}")
+
+
+def get_graph(api_key: str, provider: str, api_keys: Optional[Any] = None):
     """
     Create and configure the graph for deep research.
     
     Args:
         api_key: The API key for the LLM provider
         provider: The LLM provider to use (fireworks or sambanova)
-        documents: Optional list of documents to process
+        api_keys: Optional APIKeys of the user, whose other provider keys enable failover
     """
     model_name = "llama-3.3-70b"
-    planner_model_config: str = model_registry.get_model_info(model_key=model_name, provider=provider)
-    writer_model_config: str = model_registry.get_model_info(model_key=model_name, provider=provider)
-    summary_model_config: str = model_registry.get_model_info(model_key=model_name, provider=provider)
-
-    if provider == "fireworks":    
-        writer_model = ChatFireworks(base_url=writer_model_config["url"], model=writer_model_config["model"], temperature=0, max_tokens=8192, api_key=api_key)
-        planner_model = ChatFireworks(base_url=planner_model_config["url"], model=planner_model_config["model"], temperature=0, max_tokens=8192, api_key=api_key)
-        summary_model = ChatFireworks(base_url=summary_model_config["url"], model=summary_model_config["model"], temperature=0, max_tokens=8192, api_key=api_key)
-    elif provider == "sambanova":
-        writer_model = ChatSambaNovaCloud(sambanova_url=writer_model_config["long_url"], model=writer_model_config["model"], temperature=0, max_tokens=8192, sambanova_api_key=api_key)
-        planner_model = ChatSambaNovaCloud(sambanova_url=planner_model_config["long_url"], model=planner_model_config["model"], temperature=0, max_tokens=8192, sambanova_api_key=api_key)
-        summary_model = ChatSambaNovaCloud(sambanova_url=summary_model_config["long_url"], model=summary_model_config["model"], temperature=0, max_tokens=8192, sambanova_api_key=api_key)
-    else:
-        raise ValueError(f"Unsupported provider: {provider}")
+    # The user's provider is the primary; calls hedge and fail over to the other providers
+    targets = provider_router.targets(model_name, provider, api_key, api_keys)
+
+    writer_model = RoutedChatModel([(target, _chat_model(target)) for target in targets], max_output_tokens=MAX_OUTPUT_TOKENS)
+    planner_model = RoutedChatModel([(target, _chat_model(target)) for target in targets], max_output_tokens=MAX_OUTPUT_TOKENS)
+    summary_model = RoutedChatModel([(target, _chat_model(target)) for target in targets], max_output_tokens=MAX_OUTPUT_TOKENS)
 
     section_builder = StateGraph(SectionState, output=SectionOutputState)
     section_builder.add_node("generate_queries", functools.partial(generate_queries, writer_model))
@@ -17,6 +17,7 @@ import weave
 tavily_client = TavilyClient()
 tavily_async_client = AsyncTavilyClient()
 
+from api.services.rate_limiter import rate_limiter
 from utils.logging import logger
 
 # API key rotation mechanism
@@ -141,11 +142,8 @@ async def tavily_search_async(search_queries: List[str], key_rotator: APIKeyRota
         # Get the next API key in the rotation
         api_key = key_rotator.get_next_key()
         
-        # Create a new client with the rotated key
-        client = AsyncTavilyClient(api_key=api_key)
-        
-        # Add the search task with simple retry for 502 errors
-        search_tasks.append(_tavily_search_with_retry(query, client, key_rotator))
+        # Add the search task with simple retry for 429 and 502 errors
+        search_tasks.append(_tavily_search_with_retry(query, api_key, key_rotator))
     
     # Execute all search tasks concurrently
     search_docs = await asyncio.gather(*search_tasks, return_exceptions=True)
@@ -174,17 +172,20 @@ async def tavily_search_async(search_queries: List[str], key_rotator: APIKeyRota
     
     return processed_results
 
-async def _tavily_search_with_retry(query: str, client: AsyncTavilyClient, key_rotator: APIKeyRotator, max_retries: int = 2):
-    """Simple helper function to retry Tavily search on 502 errors"""
+async def _tavily_search_with_retry(query: str, api_key: str, key_rotator: APIKeyRotator, max_retries: int = 2):
+    """Simple helper function to retry Tavily search on 429 and 502 errors with the next API key"""
+    client = AsyncTavilyClient(api_key=api_key)
     for attempt in range(max_retries + 1):
         try:
             start_time = time.time()
-            result = await client.search(
-                query,
-                max_results=5,
-                include_raw_content=True,
-                topic="general"
-            )
+            # Queues behind the key's rate limit; a 429 backs the key off for every worker
+            async with rate_limiter.slot("tavily", api_key):
+                result = await client.search(
+                    query,
+                    max_results=5,
+                    include_raw_content=True,
+                    topic="general"
+                )
             elapsed_time = time.time() - start_time
             if elapsed_time > 10:
                 logger.warning(f"Deep Research - Tavily search took {elapsed_time:.2f} seconds for query: {query}")
@@ -196,9 +197,10 @@ async def _tavily_search_with_retry(query: str, client: AsyncTavilyClient, key_r
         except httpx.HTTPStatusError as e:
             # This will specifically catch HTTP status errors like 502
             status_code = e.response.status_code
-            if status_code == 502 and attempt < max_retries:
-                logger.warning(f"Tavily 502 Bad Gateway error (attempt {attempt+1}/{max_retries+1}): {e}")
-                await asyncio.sleep(attempt + 1)
+            if status_code in (429, 502) and attempt < max_retries:
+                logger.warning(f"Tavily {status_code} error (attempt {attempt+1}/{max_retries+1}): {e}")
+                if status_code == 502:
+                    await asyncio.sleep(attempt + 1)
                 # Try with a different API key
                 api_key = key_rotator.get_next_key()
                 client = AsyncTavilyClient(api_key=api_key)
@@ -217,10 +219,11 @@ def perplexity_search(search_queries, key_rotator: APIKeyRotator):
     """
     Search the web using the Perplexity API.
     """
+    api_key = key_rotator.get_next_key()
     headers = {
         "accept": "application/json",
         "content-type": "application/json",
-        "Authorization": f"Bearer {key_rotator.get_next_key()}"
+        "Authorization": f"Bearer {api_key}"
     }
 
     search_docs = []
@@ -239,12 +242,16 @@ def perplexity_search(search_queries, key_rotator: APIKeyRotator):
             ]
         }
 
-        response = requests.post(
-            "https://api.perplexity.ai/chat/completions",
-            headers=headers,
-            json=payload
-        )
-        response.raise_for_status()
+        def post():
+            response = requests.post(
+                "https://api.perplexity.ai/chat/completions",
+                headers=headers,
+                json=payload
+            )
+            response.raise_for_status()
+            return response
+
+        response = rate_limiter.call("perplexity", api_key, post)
 
         data = response.json()
         content = data["choices"][0]["message"]["content"]
@@ -1,10 +1,12 @@
 import asyncio
 from datetime import datetime
+import hashlib
 import json
-from collections import deque
+from collections import Counter, deque
 import re
 import os
 import time
+from typing import Tuple
 
 from autogen_core import MessageContext
 from autogen_core import (
@@ -20,7 +22,7 @@ import redis
 
 from api.websocket_interface import WebSocketInterface
 from config.model_registry import model_registry
-from services.query_router_service import QueryRouterServiceChat, QueryType
+from services.query_router_service import CHAT_ROUTER_PROMPT_TEMPLATE, QueryRouterServiceChat, QueryType
 
 from api.data_types import (
     APIKeys,
@@ -33,11 +35,25 @@ from api.data_types import (
     AgentEnum,
 )
 from api.registry import AgentRegistry
+from api.services.agent_prewarmer import agent_prewarmer
+from api.services.conversation_summary import conversation_summary_service
+from api.services.llm_cache import CachedChatCompletionClient
+from api.services.provider_router import RoutedChatCompletionClient, provider_router
+from api.services.route_cache import route_cache
 from api.session_state import SessionStateManager
 from utils.logging import logger
 
 agent_registry = AgentRegistry()
 
+# Route with the last known summary while a fresh one is computed
+SPECULATIVE_ROUTING = os.getenv("ROUTER_SPECULATIVE", "true").lower() == "true"
+
+
+def route_version(agent_type: str) -> str:
+    """Version of the routing inputs for an agent type, used to invalidate cached routes."""
+    payload = CHAT_ROUTER_PROMPT_TEMPLATE + json.dumps(agent_registry.agents.get(agent_type), sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
 
 @type_subscription(topic_type="router")
 class SemanticRouterAgent(RoutedAgent):
@@ -50,8 +66,11 @@ class SemanticRouterAgent(RoutedAgent):
         agent_registry (AgentRegistry): The registry containing agent information.
         session_manager (SessionStateManager): Manages the session state for each user.
         connection_manager (WebSocketConnectionManager): Manages WebSocket connections.
+        speculation_stats (Counter): Outcomes and timings of speculative routing, shared by all sessions.
     """
 
+    speculation_stats: Counter = Counter()
+
     def __init__(
         self,
         name: str,
@@ -80,37 +99,50 @@ class SemanticRouterAgent(RoutedAgent):
         )
 
         self._structure_extraction_model_name = "llama-3.3-70b"
-        self._structure_extraction_model = lambda provider: OpenAIChatCompletionClient(
+        self._structure_extraction_model = lambda provider: CachedChatCompletionClient(
+            self._routed_model_client(self._structure_extraction_model_name, provider),
             model=model_registry.get_model_info(provider=provider, model_key=self._structure_extraction_model_name)["model"],
-            base_url=model_registry.get_model_info(provider=provider, model_key=self._structure_extraction_model_name)["url"],
-            api_key=getattr(api_keys, model_registry.get_api_key_env(provider=provider)),
             temperature=0.0,
-            model_info={
-                "json_output": False,
-                "function_calling": True,
-                "family": "unknown",
-                "vision": False,
-            },
         )
 
         self._context_summary_model_name = "llama-3.3-70b"
-        self._context_summary_model = lambda provider: OpenAIChatCompletionClient(
+        self._context_summary_model = lambda provider: CachedChatCompletionClient(
+            self._routed_model_client(self._context_summary_model_name, provider),
             model=model_registry.get_model_info(provider=provider, model_key=self._context_summary_model_name)["model"],
-            base_url=model_registry.get_model_info(provider=provider, model_key=self._context_summary_model_name)["url"],
-            api_key=getattr(api_keys, model_registry.get_api_key_env(provider=provider)),
             temperature=0.0,
-            model_info={
-                "json_output": False,
-                "function_calling": True,
-                "family": "unknown",
-                "vision": False,
-            },
         )
 
         self._session_manager = session_manager
         self.websocket_manager = websocket_manager
         self.redis_client = redis_client
 
+    def _routed_model_client(self, model_key: str, provider: str) -> RoutedChatCompletionClient:
+        """
+        Builds a temperature-0 client per provider serving the model, routed with
+        hedging and failover; the user's provider is the primary.
+        """
+        targets = provider_router.targets(
+            model_key, provider, getattr(self.api_keys, model_registry.get_api_key_env(provider=provider)), self.api_keys
+        )
+        return RoutedChatCompletionClient([
+            (
+                target,
+                OpenAIChatCompletionClient(
+                    model=target.model,
+                    base_url=target.url,
+                    api_key=target.api_key,
+                    temperature=0.0,
+                    model_info={
+                        "json_output": False,
+                        "function_calling": True,
+                        "family": "unknown",
+                        "vision": False,
+                    },
+                ),
+            )
+            for target in targets
+        ])
+
     @message_handler
     async def route_message(self, message: EndUserMessage, ctx: MessageContext) -> None:
         """
@@ -159,6 +191,127 @@ class SemanticRouterAgent(RoutedAgent):
 
         return request
     
+    def _summariser(self, provider: str):
+        """Returns a coroutine function that summarises messages with the provider's summary model."""
+        async def summarise(messages) -> str:
+            model_response = await self._context_summary_model(provider).create(messages)
+            return model_response.content
+        return summarise
+
+    async def _summarise_history(self, message: EndUserMessage, history, ctx: MessageContext) -> str:
+        """
+        Summarises the whole conversation history in one model call.
+
+        Args:
+            message (EndUserMessage): The incoming user message.
+            history: The router history of the conversation.
+            ctx (MessageContext): Context information for the message.
+
+        Returns:
+            str: The conversation summary.
+        """
+        start_time = time.time()
+        model_response = await self._context_summary_model(message.provider).create(
+            [SystemMessage(content=f"""You are a helpful assistant that summarises conversations for other processes to use as a context. 
+                           Follow the instructions below to create the summary:
+                           - Mention the user has uploaded {len(message.docs) if message.docs else 0} documents, do not mention the content of the documents.
+                           - Include the topics and entities discussed in the conversation.
+                           - Include the main points discussed in the conversation.
+                           - Include the summary of the questions asked by the user.
+                           - Include the summary of the responses provided by the assistant.
+                           - Include the overall summary of the conversation.
+                           """, source="system")]
+            + list(history)
+            + [UserMessage(content="Summarize the messages so far in a few sentences including your responses. Focus on including the topis", source="user")]
+        )
+        context_summary = model_response.content
+        end_time = time.time()
+        context_summary_time = end_time - start_time
+        context_summary_log_message = f"Context summary took {context_summary_time:.2f} seconds"
+        if context_summary_time > 10:
+            logger.warning(logger.format_message(
+                ctx.topic_id.source,
+                context_summary_log_message
+            ))
+        else:
+            logger.info(logger.format_message(
+                ctx.topic_id.source,
+                context_summary_log_message
+            ))
+        return context_summary
+
+    async def _fresh_summary(self, message: EndUserMessage, history, ctx: MessageContext) -> str:
+        """
+        Returns the up to date conversation summary, waiting for a running update.
+        """
+        user_id, conversation_id = ctx.topic_id.source.split(":")
+        context_summary = await conversation_summary_service.get_summary(user_id, conversation_id)
+        if context_summary is None:
+            # Conversations without a rolling summary yet are summarised once from history
+            context_summary = await self._summarise_history(message, history, ctx)
+            await conversation_summary_service.store(user_id, conversation_id, context_summary)
+        return context_summary
+
+    async def _route_speculatively(
+        self,
+        router: QueryRouterServiceChat,
+        message: EndUserMessage,
+        history,
+        num_docs: int,
+        last_summary: str,
+        ctx: MessageContext,
+    ) -> Tuple[QueryType, str]:
+        """
+        Routes with the last known summary while the fresh summary is computed.
+
+        The speculative route is only committed when the fresh summary equals
+        the one it was routed with, i.e. the decision had the same inputs.
+        Otherwise the query is routed again with the fresh summary.
+
+        Returns:
+            Tuple[QueryType, str]: The route and the fresh context summary.
+        """
+        async def timed(coro):
+            start = time.time()
+            result = await coro
+            return result, time.time() - start
+
+        start_time = time.time()
+        speculation = asyncio.create_task(
+            timed(router.route_query(message.content, last_summary, num_docs, speculative=True))
+        )
+        # A discarded speculation's error is irrelevant to the request
+        speculation.add_done_callback(lambda task: task.cancelled() or task.exception())
+        try:
+            context_summary, summary_time = await timed(self._fresh_summary(message, history, ctx))
+            if context_summary == last_summary:
+                route_result, route_time = await speculation
+                await router.commit_route(message.content, route_result, context_summary)
+                outcome = "committed"
+            else:
+                speculation.cancel()
+                route_result, route_time = await timed(
+                    router.route_query(message.content, context_summary, num_docs)
+                )
+                outcome = "rerouted"
+        finally:
+            speculation.cancel()
+
+        wall_time = time.time() - start_time
+        # Time saved against summarising first and routing afterwards
+        saved_time = summary_time + route_time - wall_time
+        stats = SemanticRouterAgent.speculation_stats
+        stats[outcome] += 1
+        stats["summary_seconds"] += summary_time
+        stats["route_seconds"] += route_time
+        stats["saved_seconds"] += saved_time
+        logger.info(logger.format_message(
+            ctx.topic_id.source,
+            f"Speculative route {outcome}: summary {summary_time:.2f}s, route {route_time:.2f}s, "
+            f"total {wall_time:.2f}s, saved {saved_time:.2f}s"
+        ))
+        return route_result, context_summary
+
     async def route_message_with_query_router(
         self, message: EndUserMessage, ctx: MessageContext
     ) -> None:
@@ -178,7 +331,10 @@ class SemanticRouterAgent(RoutedAgent):
             ))
 
             user_id, conversation_id = ctx.topic_id.source.split(":")
-            history = self._session_manager.get_history(conversation_id)
+            history = self._session_manager.get_history(user_id, conversation_id)
+            conversation_summary_service.record_user_turn(
+                user_id, conversation_id, message.content, self._summariser(message.provider)
+            )
 
             last_content = {}
             if len(history) > 0:
@@ -213,47 +369,52 @@ class SemanticRouterAgent(RoutedAgent):
                 redis_client=self.redis_client,
                 user_id=user_id,
                 conversation_id=conversation_id,
-                message_id=message.message_id
+                message_id=message.message_id,
+                # Let the target agent start preparing while its parameters stream in
+                on_field=lambda path, value: agent_prewarmer.observe(
+                    message.message_id, path, value, message.provider, self.api_keys
+                ),
             )
 
-            history = self._session_manager.get_history(conversation_id)
-
+            history = self._session_manager.get_history(user_id, conversation_id)
+            num_docs = len(message.docs) if message.docs else 0
 
-            if len(history) > 0:
-                start_time = time.time()
-                model_response = await self._context_summary_model(message.provider).create(
-                    [SystemMessage(content=f"""You are a helpful assistant that summarises conversations for other processes to use as a context. 
-                                   Follow the instructions below to create the summary:
-                                   - Mention the user has uploaded {len(message.docs) if message.docs else 0} documents, do not mention the content of the documents.
-                                   - Include the topics and entities discussed in the conversation.
-                                   - Include the main points discussed in the conversation.
-                                   - Include the summary of the questions asked by the user.
-                                   - Include the summary of the responses provided by the assistant.
-                                   - Include the overall summary of the conversation.
-                                   """, source="system")]
-                    + list(history)
-                    + [UserMessage(content="Summarize the messages so far in a few sentences including your responses. Focus on including the topis", source="user")]
+            fingerprint = route_cache.fingerprint(history, num_docs)
+            route_result = route_cache.get(message.content, fingerprint, route_version)
+            if route_result is not None:
+                logger.info(logger.format_message(
+                    ctx.topic_id.source,
+                    f"Route cache hit for {route_result.type}"
+                ))
+                await router.publish_planner_response(
+                    route_result.model_dump(),
+                    {"llm_name": "route-cache", "llm_provider": "local", "task": "planning", "duration": 0.0},
                 )
-                context_summary = model_response.content
-                end_time = time.time()
-                context_summary_time = end_time - start_time
-                context_summary_log_message = f"Context summary took {context_summary_time:.2f} seconds"
-                if context_summary_time > 10:
-                    logger.warning(logger.format_message(
-                        ctx.topic_id.source,
-                        context_summary_log_message
-                    ))
+            elif len(history) > 0:
+                last_summary = await conversation_summary_service.get_summary(user_id, conversation_id, wait_timeout=0)
+                summary_is_current = (
+                    last_summary is not None
+                    and not conversation_summary_service.has_pending_update(user_id, conversation_id)
+                )
+                if summary_is_current:
+                    context_summary = last_summary
+                elif SPECULATIVE_ROUTING and last_summary:
+                    # Without a previous summary there is nothing to speculate with
+                    route_result, context_summary = await self._route_speculatively(
+                        router, message, history, num_docs, last_summary, ctx
+                    )
+                    route_cache.put(message.content, fingerprint, route_result, route_version(route_result.type))
                 else:
-                    logger.info(logger.format_message(
-                        ctx.topic_id.source,
-                        context_summary_log_message
-                    ))
+                    context_summary = await self._fresh_summary(message, history, ctx)
             else:
                 context_summary = ""
 
-            route_result: QueryType = await router.route_query(message.content, context_summary, len(message.docs) if message.docs else 0)
+            if route_result is None:
+                route_result = await router.route_query(message.content, context_summary, num_docs)
+                route_cache.put(message.content, fingerprint, route_result, route_version(route_result.type))
 
             self._session_manager.add_to_history(
+                    user_id,
                     conversation_id,
                     UserMessage(content=message.content, source="user")
             )
@@ -355,7 +516,7 @@ class SemanticRouterAgent(RoutedAgent):
 
         # TODO: remove this when fixed route
         user_id, conversation_id = ctx.topic_id.source.split(":")
-        history = self._session_manager.get_history(conversation_id)
+        history = self._session_manager.get_history(user_id, conversation_id)
 
         last_content = {}
         if len(history) > 0:
@@ -394,6 +555,7 @@ class SemanticRouterAgent(RoutedAgent):
             )
 
             self._session_manager.add_to_history(
+                user_id,
                 conversation_id,
                 UserMessage(content=message.content, source="user")
             )
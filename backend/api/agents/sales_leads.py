@@ -6,8 +6,11 @@ from api.data_types import AgentEnum, AgentRequest, AgentStructuredResponse, Err
 from agent.lead_generation_crew import OutreachList, ResearchCrew
 from config.model_registry import model_registry
 from services.user_prompt_extractor_service import UserPromptExtractor
+from utils.cancellation import CancellationToken, OperationCancelledError, cancellation_registry, current_cancellation_token
 from utils.logging import logger
 from api.services.redis_service import SecureRedisService
+from api.services.single_flight import single_flight
+from api.services.workload_scheduler import SchedulerSaturatedError, WorkloadClass, workload_scheduler
 
 @type_subscription(topic_type="sales_leads")
 class SalesLeadsAgent(RoutedAgent):
@@ -21,6 +24,8 @@ class SalesLeadsAgent(RoutedAgent):
     async def handle_sales_leads_request(
         self, message: AgentRequest, ctx: MessageContext
     ) -> None:
+        cancellation_token = cancellation_registry.create(ctx.topic_id.source, message.message_id)
+        current_cancellation_token.set(cancellation_token)
         try:
             user_id, conversation_id = ctx.topic_id.source.split(":")   
             logger.info(logger.format_message(
@@ -28,23 +33,41 @@ class SalesLeadsAgent(RoutedAgent):
                 "Processing sales leads request"
             ))
             
-            crew = ResearchCrew(
-                llm_api_key=getattr(self.api_keys, model_registry.get_api_key_env(provider=message.provider)),
-                exa_key=self.api_keys.exa_key,
-                user_id=user_id,
-                run_id=conversation_id,
-                verbose=False,
-                provider=message.provider,
-                message_id=message.message_id,
-                redis_client=self.redis_client
-            )
             parameters_dict = {k: v if v is not None else "" for k, v in message.parameters.model_dump().items()}
             logger.info(logger.format_message(
                 ctx.topic_id.source,
                 f"Starting lead research with parameters: {parameters_dict}"
             ))
 
-            raw_result, usage_stats = await asyncio.to_thread(crew.execute_research, parameters_dict)
+            async def run_research(token: CancellationToken):
+                crew = ResearchCrew(
+                    llm_api_key=getattr(self.api_keys, model_registry.get_api_key_env(provider=message.provider)),
+                    exa_key=self.api_keys.exa_key,
+                    user_id=user_id,
+                    run_id=conversation_id,
+                    verbose=False,
+                    provider=message.provider,
+                    message_id=message.message_id,
+                    redis_client=self.redis_client,
+                    cancellation_token=token,
+                )
+                return await workload_scheduler.run(
+                    WorkloadClass.CREW,
+                    user_id,
+                    crew.execute_research,
+                    parameters_dict,
+                    conversation_id=conversation_id,
+                    message_id=message.message_id,
+                )
+
+            raw_result, usage_stats = await single_flight.run(
+                single_flight.make_key(self.id.type, parameters_dict, message.provider),
+                run_research,
+                user_id,
+                conversation_id,
+                message.message_id,
+                cancellation_token=cancellation_token,
+            )
             logger.info(logger.format_message(
                 ctx.topic_id.source,
                 "Successfully generated sales leads"
@@ -67,6 +90,27 @@ class SalesLeadsAgent(RoutedAgent):
                 response,
                 DefaultTopicId(type="user_proxy", source=ctx.topic_id.source),
             )
+        except OperationCancelledError:
+            logger.info(logger.format_message(
+                ctx.topic_id.source,
+                "Sales leads request cancelled"
+            ))
+        except SchedulerSaturatedError as e:
+            logger.info(logger.format_message(
+                ctx.topic_id.source,
+                f"Sales leads request rejected, scheduler saturated"
+            ))
+            response = AgentStructuredResponse(
+                agent_type=AgentEnum.Error,
+                data=ErrorResponse(error=f"We are handling a lot of sales leads requests right now, please try again in {e.retry_after:.0f} seconds."),
+                message=f"Error processing sales leads request: {str(e)}",
+                metadata={"retry_after": e.retry_after},
+                message_id=message.message_id
+            )
+            await self.publish_message(
+                response,
+                DefaultTopicId(type="user_proxy", source=ctx.topic_id.source),
+            )
         except Exception as e:
             logger.error(logger.format_message(
                 ctx.topic_id.source,
@@ -81,4 +125,6 @@ class SalesLeadsAgent(RoutedAgent):
             await self.publish_message(
                 response,
                 DefaultTopicId(type="user_proxy", source=ctx.topic_id.source),
-            )
\ No newline at end of file
+            )
+        finally:
+            cancellation_registry.release(ctx.topic_id.source, message.message_id)
@@ -14,6 +14,8 @@ from autogen_core import (
 from autogen_core.models import AssistantMessage
 import redis
 
+from api.services.conversation_summary import conversation_summary_service
+from api.services.session_store import session_store
 from api.session_state import SessionStateManager
 from api.websocket_interface import WebSocketInterface
 
@@ -23,6 +25,9 @@ from ..data_types import (
 )
 from utils.logging import logger
 
+# Start time of the message each session is processing
+MESSAGE_TIMINGS_NAMESPACE = "message_timings"
+
 
 # User Proxy Agent
 class UserProxyAgent(RoutedAgent):
@@ -36,7 +41,6 @@ class UserProxyAgent(RoutedAgent):
         self.session_manager = session_manager
         self.websocket_manager = websocket_manager
         self.redis_client = redis_client
-        self.message_timings = {}  # Store message processing times
 
     def _calculate_token_savings(self, data: dict) -> float:
         """
@@ -81,7 +85,7 @@ class UserProxyAgent(RoutedAgent):
             user_id, conversation_id = source_parts
 
             # Calculate processing time
-            start_time = self.message_timings.get(ctx.topic_id.source)
+            start_time = session_store.get(MESSAGE_TIMINGS_NAMESPACE, ctx.topic_id.source)
             if start_time is None:
                 logger.error(f"No start time found for message {ctx.topic_id.source}. Processing time calculation skipped.")
                 processing_time = None
@@ -120,6 +124,13 @@ class UserProxyAgent(RoutedAgent):
                     json.dumps(message_data),
                     user_id
                 )),
+                asyncio.create_task(asyncio.to_thread(
+                    self.session_manager.record_turn,
+                    self.redis_client,
+                    user_id,
+                    conversation_id,
+                    message_data
+                )),
                 asyncio.create_task(self.websocket_manager.send_message(user_id, conversation_id, message_data))
             ]
 
@@ -137,16 +148,20 @@ class UserProxyAgent(RoutedAgent):
 
             # Update conversation history
             self.session_manager.add_to_history(
+                user_id,
                 conversation_id,
                 AssistantMessage(
                     content=message.data.model_dump_json(), 
                     source=ctx.sender.type if ctx.sender else "assistant"
                 ),
             )
+            # Fold the response into the rolling summary the router reads
+            conversation_summary_service.complete_turn(
+                user_id, conversation_id, message.data.model_dump_json()
+            )
 
             # Clear timing data after completion
-            if ctx.topic_id.source in self.message_timings:
-                del self.message_timings[ctx.topic_id.source]
+            session_store.pop(MESSAGE_TIMINGS_NAMESPACE, ctx.topic_id.source)
 
         except Exception as e:
             logger.error(logger.format_message(
@@ -167,7 +182,7 @@ class UserProxyAgent(RoutedAgent):
         """
         
         # Start timing for this conversation
-        self.message_timings[ctx.topic_id.source] = time.time()
+        session_store.set(MESSAGE_TIMINGS_NAMESPACE, ctx.topic_id.source, time.time())
 
         logger.info(logger.format_message(
             ctx.topic_id.source,
@@ -0,0 +1,278 @@
+"""
+Worker pool executing queued crew jobs.
+
+Each worker slot claims a job from the Redis queue and runs the crew in a
+dedicated child process, so crew CPU never competes with the API tier and a
+cancelled job can be stopped immediately. Run with:
+
+    python -m api.job_worker
+"""
+import json
+import multiprocessing
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+from typing import Any, Dict
+
+import redis
+from dotenv import load_dotenv
+
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from api.services.job_queue import JobQueue, JobStatus, TERMINAL_JOB_STATUSES
+from api.services.redis_service import SecureRedisService
+from utils.logging import logger
+
+POLL_INTERVAL_SECONDS = 1.0
+ORPHAN_RECOVERY_INTERVAL_SECONDS = 60
+
+
+def run_crew_job(
+    query_type: str,
+    parameters: Dict[str, Any],
+    api_keys: Dict[str, str],
+    user_id: str,
+    run_id: str,
+) -> Any:
+    """
+    Execute a crew synchronously and return its JSON-serialisable result.
+
+    Mirrors the crews behind POST /execute/{query_type}. Agent thoughts are
+    published to agent_thoughts:{user_id}:{run_id} by the crews themselves.
+    """
+    sambanova_key = api_keys.get("sambanova_key", "")
+
+    if query_type == "sales_leads":
+        from agent.lead_generation_crew import ResearchCrew
+        from services.user_prompt_extractor_service import UserPromptExtractor
+
+        crew = ResearchCrew(
+            llm_api_key=sambanova_key,
+            exa_key=api_keys.get("exa_key", ""),
+            user_id=user_id,
+            run_id=run_id,
+            provider="sambanova",
+            verbose=False,
+        )
+        combined_text = " ".join([
+            parameters.get("industry", ""),
+            parameters.get("company_stage", ""),
+            parameters.get("geography", ""),
+            parameters.get("funding_stage", ""),
+            parameters.get("product", ""),
+        ]).strip()
+        extracted_info = UserPromptExtractor(sambanova_key).extract_lead_info(combined_text)
+        raw_result, _ = crew.execute_research(extracted_info)
+        return {"results": json.loads(raw_result).get("outreach_list", [])}
+
+    if query_type in ("educational_content", "deep_research"):
+        from agent.samba_research_flow.samba_research_flow import SambaResearchFlow
+
+        docs = parameters.get("docs")
+        edu_flow = SambaResearchFlow(
+            llm_api_key=sambanova_key,
+            serper_key=api_keys.get("serper_key", ""),
+            user_id=user_id,
+            run_id=run_id,
+            provider="sambanova",
+            docs_included=docs is not None,
+            verbose=False,
+        )
+        edu_inputs = {
+            "topic": parameters["topic"] if query_type == "educational_content" else parameters["deep_research_topic"],
+            "audience_level": parameters.get("audience_level", "intermediate"),
+            "additional_context": ", ".join(parameters.get("focus_areas", [])),
+        }
+        if docs is not None:
+            edu_inputs["docs"] = docs
+        edu_flow.input_variables = edu_inputs
+        result = edu_flow.kickoff()
+        return json.loads(result) if isinstance(result, str) else result
+
+    if query_type == "financial_analysis":
+        from agent.financial_analysis.financial_analysis_crew import FinancialAnalysisCrew
+        from services.financial_user_prompt_extractor_service import FinancialPromptExtractor
+
+        docs = parameters.get("docs")
+        crew = FinancialAnalysisCrew(
+            llm_api_key=sambanova_key,
+            serper_key=api_keys.get("serper_key", ""),
+            user_id=user_id,
+            run_id=run_id,
+            provider="sambanova",
+            docs_included=docs is not None,
+            verbose=False,
+        )
+        extracted_ticker, extracted_company = FinancialPromptExtractor(sambanova_key, "sambanova").extract_info(
+            parameters.get("query_text", "")
+        )
+        inputs = {
+            "ticker": extracted_ticker or parameters.get("ticker", "") or "AAPL",
+            "company_name": extracted_company or parameters.get("company_name", "") or "Apple Inc",
+        }
+        if docs is not None:
+            inputs["docs"] = docs
+        raw_result, _ = crew.execute_financial_analysis(inputs)
+        return json.loads(raw_result)
+
+    raise ValueError(f"Unknown query type: {query_type}")
+
+
+def _execute_in_child(query_type, parameters, api_keys, user_id, run_id, results) -> None:
+    """Child process entry point, reports ("ok", result) or ("error", message)."""
+    try:
+        results.put(("ok", run_crew_job(query_type, parameters, api_keys, user_id, run_id)))
+    except Exception as e:
+        results.put(("error", f"{type(e).__name__}: {str(e)}"))
+
+
+class JobWorkerPool:
+    """
+    Runs up to `concurrency` jobs at once, one child process per job.
+    """
+
+    def __init__(self, job_queue: JobQueue, concurrency: int):
+        self.job_queue = job_queue
+        self.concurrency = concurrency
+        self._stop = threading.Event()
+        self._mp = multiprocessing.get_context("spawn")
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def serve_forever(self) -> None:
+        logger.info(logger.format_message(None, f"Starting job worker pool with {self.concurrency} slots"))
+        self.job_queue.recover_orphans()
+
+        slots = [
+            threading.Thread(target=self._slot_loop, name=f"job-slot-{i}", daemon=True)
+            for i in range(self.concurrency)
+        ]
+        for slot in slots:
+            slot.start()
+
+        while not self._stop.wait(ORPHAN_RECOVERY_INTERVAL_SECONDS):
+            try:
+                self.job_queue.recover_orphans()
+            except Exception as e:
+                logger.error(f"Error recovering orphaned jobs: {str(e)}", exc_info=True)
+
+        for slot in slots:
+            slot.join()
+        logger.info(logger.format_message(None, "Job worker pool stopped"))
+
+    def _slot_loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                entry = self.job_queue.claim(timeout=5)
+            except Exception as e:
+                logger.error(f"Error claiming job: {str(e)}", exc_info=True)
+                time.sleep(POLL_INTERVAL_SECONDS)
+                continue
+            if entry is None:
+                continue
+
+            try:
+                self._process(entry)
+            except Exception as e:
+                logger.error(f"Error processing job {entry['job_id']}: {str(e)}", exc_info=True)
+            finally:
+                self.job_queue.ack(entry)
+
+    def _process(self, entry: Dict[str, str]) -> None:
+        job_id, user_id = entry["job_id"], entry["user_id"]
+        meta = self.job_queue.get_job(job_id, user_id)
+        if meta is None or meta["status"] in TERMINAL_JOB_STATUSES:
+            return
+        if self.job_queue.is_cancel_requested(job_id):
+            self.job_queue.update(job_id, user_id, status=JobStatus.CANCELLED.value, progress="Cancelled")
+            return
+
+        payload = self.job_queue.get_payload(job_id, user_id)
+        if payload is None:
+            self.job_queue.update(job_id, user_id, status=JobStatus.FAILED.value, error="Job payload expired")
+            return
+
+        attempts = meta["attempts"] + 1
+        self.job_queue.update(
+            job_id, user_id,
+            status=JobStatus.RUNNING.value,
+            attempts=attempts,
+            progress=f"Running {meta['query_type']} (attempt {attempts} of {meta['max_attempts']})",
+        )
+        logger.info(logger.format_message(f"{user_id}:{meta['run_id']}", f"Running job {job_id} attempt {attempts}"))
+
+        results = self._mp.Queue()
+        process = self._mp.Process(
+            target=_execute_in_child,
+            args=(meta["query_type"], payload["parameters"], payload["api_keys"], user_id, meta["run_id"], results),
+            daemon=True,
+        )
+        process.start()
+
+        outcome = None
+        while outcome is None:
+            self.job_queue.heartbeat(job_id)
+            if self.job_queue.is_cancel_requested(job_id):
+                process.terminate()
+                process.join(5)
+                self.job_queue.update(job_id, user_id, status=JobStatus.CANCELLED.value, progress="Cancelled")
+                logger.info(logger.format_message(f"{user_id}:{meta['run_id']}", f"Cancelled job {job_id}"))
+                return
+            try:
+                outcome = results.get(timeout=POLL_INTERVAL_SECONDS)
+            except queue.Empty:
+                if not process.is_alive():
+                    try:
+                        outcome = results.get(timeout=POLL_INTERVAL_SECONDS)
+                    except queue.Empty:
+                        outcome = ("error", f"Crew process exited with code {process.exitcode}")
+        process.join(5)
+
+        status, value = outcome
+        if status == "ok":
+            self.job_queue.store_result(job_id, user_id, value)
+            self.job_queue.update(job_id, user_id, status=JobStatus.SUCCEEDED.value, progress="Completed")
+        elif attempts < meta["max_attempts"]:
+            self.job_queue.update(job_id, user_id, status=JobStatus.QUEUED.value, progress="Retrying", error=value)
+            self.job_queue.requeue(job_id, user_id)
+        else:
+            self.job_queue.update(job_id, user_id, status=JobStatus.FAILED.value, progress="Failed", error=value)
+        logger.info(logger.format_message(f"{user_id}:{meta['run_id']}", f"Job {job_id} finished with {status}"))
+
+
+def main() -> None:
+    # The worker must share REDIS_MASTER_SALT with the API to decrypt job payloads
+    load_dotenv()
+    redis_host = os.getenv("REDIS_HOST", "localhost")
+    redis_port = int(os.getenv("REDIS_PORT", "6379"))
+    concurrency = int(os.getenv("JOB_WORKER_CONCURRENCY", "2"))
+
+    pool = redis.ConnectionPool(
+        host=redis_host,
+        port=redis_port,
+        db=0,
+        decode_responses=True,
+        max_connections=concurrency * 4 + 4,
+        socket_connect_timeout=5,
+        health_check_interval=30,
+    )
+    redis_client = SecureRedisService(connection_pool=pool, decode_responses=True)
+    worker_pool = JobWorkerPool(JobQueue(redis_client), concurrency)
+
+    signal.signal(signal.SIGTERM, lambda *_: worker_pool.stop())
+    signal.signal(signal.SIGINT, lambda *_: worker_pool.stop())
+    try:
+        worker_pool.serve_forever()
+    finally:
+        redis_client.close()
+        pool.disconnect()
+
+
+if __name__ == "__main__":
+    main()
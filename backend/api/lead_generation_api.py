@@ -16,9 +16,12 @@ from fastapi.websockets import WebSocketState, WebSocketDisconnect
 from api.agents.user_proxy import UserProxyAgent
 from api.websocket_manager import WebSocketConnectionManager
 
-from api.utils import load_documents
+from api.utils import build_warm_runtime, load_documents, session_state_manager
 from api.data_types import APIKeys
+from api.session_state import SessionStateManager
+from utils.cancellation import cancellation_registry
 from utils.logging import logger
+from utils.loop_bridge import loop_bridge
 import os
 import sys
 import weave
@@ -38,9 +41,11 @@ if parent_dir not in sys.path:
 from agent.convo_newsletter_crew import crew_chat
 
 # Original Services
+from services.intent_classifier import intent_classifier
 from services.query_router_service import QueryRouterService
 from services.user_prompt_extractor_service import UserPromptExtractor
 from agent.lead_generation_crew import ResearchCrew
+from agent.crewai_llm import close_async_http_client
 from agent.samba_research_flow.samba_research_flow import SambaResearchFlow
 
 # For financial analysis
@@ -48,7 +53,19 @@ from services.financial_user_prompt_extractor_service import FinancialPromptExtr
 from agent.financial_analysis.financial_analysis_crew import FinancialAnalysisCrew
 # For document processing
 from services.document_processing_service import DocumentProcessingService
+from services.market_data_service import market_data
 from api.services.redis_service import SecureRedisService
+from api.services.llm_cache import LLM_CACHE_BYPASS_HEADER, llm_cache, llm_cache_bypass
+from api.services.provider_router import provider_router
+from api.services.rate_limiter import rate_limiter
+from api.services.route_cache import route_cache
+from api.services.runtime_pool import RuntimePool
+from api.services.session_store import session_store
+from api.services.agent_prewarmer import agent_prewarmer
+from api.services.conversation_summary import conversation_summary_service
+from api.services.single_flight import single_flight
+from api.services.workload_scheduler import SchedulerSaturatedError, WorkloadClass, workload_scheduler
+from api.services.job_queue import JobQueue, TERMINAL_JOB_STATUSES
 
 class QueryRequest(BaseModel):
     query: str
@@ -77,6 +94,8 @@ async def lifespan(app: FastAPI):
     redis_host = os.getenv("REDIS_HOST", "localhost")
     redis_port = int(os.getenv("REDIS_PORT", "6379"))
     app.state.context_length_summariser = 100_000
+    # Crew threads await their LLM requests on this loop
+    loop_bridge.set_loop(asyncio.get_running_loop())
     
     # Create a Redis connection pool
     pool = redis.ConnectionPool(
@@ -102,9 +121,24 @@ async def lifespan(app: FastAPI):
     )
     UserProxyAgent.connection_manager = app.state.manager
     SemanticRouterAgent.connection_manager = app.state.manager
+    workload_scheduler.set_notifier(app.state.manager.send_message)
+    single_flight.set_redis_client(app.state.redis_client)
+    conversation_summary_service.set_redis_client(app.state.redis_client)
+    llm_cache.set_redis_client(app.state.redis_client)
+    rate_limiter.set_redis_client(app.state.redis_client)
+    app.state.job_queue = JobQueue(app.state.redis_client)
+    app.state.runtime_pool = RuntimePool(
+        lambda: build_warm_runtime(app.state.redis_client, app.state.manager)
+    )
+    app.state.manager.runtime_pool = app.state.runtime_pool
+    app.state.runtime_pool.start()
 
     yield  # This separates the startup and shutdown logic
 
+    await app.state.runtime_pool.close()
+    loop_bridge.set_loop(None)
+    await close_async_http_client()
+
     # Close Redis connection pool
     app.state.redis_client.close()
     pool.disconnect()
@@ -165,11 +199,19 @@ class LeadGenerationAPI:
                 "x-exa-key",
                 "x-serper-key",
                 "x-user-id",
-                "x-run-id"
+                "x-run-id",
+                LLM_CACHE_BYPASS_HEADER
             ],
-            expose_headers=["content-type", "content-length"]
+            expose_headers=["content-type", "content-length", "retry-after"]
         )
 
+        @self.app.middleware("http")
+        async def llm_cache_bypass_middleware(request: Request, call_next):
+            # Context variables set here are inherited by the endpoint and the crew threads it starts
+            if request.headers.get(LLM_CACHE_BYPASS_HEADER, "").lower() == "bypass":
+                llm_cache_bypass.set(True)
+            return await call_next(request)
+
     def setup_routes(self):
         @self.app.get("/health")
         async def health_check():
@@ -187,6 +229,47 @@ class LeadGenerationAPI:
                     content={"status": "unhealthy", "message": str(e)}
                 )
 
+        @self.app.get("/router/stats")
+        async def router_stats():
+            """Fast-path intent classifier, route cache, speculative routing and prewarm statistics."""
+            return JSONResponse(
+                status_code=200,
+                content={
+                    **intent_classifier.stats(),
+                    "route_cache": route_cache.stats(),
+                    "speculative_routing": dict(SemanticRouterAgent.speculation_stats),
+                    "agent_prewarm": agent_prewarmer.stats(),
+                },
+            )
+
+        @self.app.get("/llm/cache/stats")
+        async def llm_cache_stats():
+            """LLM response cache hits, misses and cached versus billed tokens."""
+            return JSONResponse(status_code=200, content=llm_cache.stats())
+
+        @self.app.get("/llm/providers/stats")
+        async def llm_provider_stats():
+            """Per-provider latency percentiles, error rates, hedges and failovers."""
+            return JSONResponse(status_code=200, content=provider_router.stats())
+
+        @self.app.get("/rate_limits/stats")
+        async def rate_limit_stats():
+            """Per-key concurrency limits, 429 backoffs and queueing delay of LLM and search calls."""
+            return JSONResponse(status_code=200, content=rate_limiter.stats())
+
+        @self.app.get("/market_data/stats")
+        async def market_data_stats():
+            """Market data cache hits, disk hits, coalesced requests and Yahoo Finance fetches."""
+            return JSONResponse(status_code=200, content=market_data.stats())
+
+        @self.app.get("/sessions/stats")
+        async def session_stats():
+            """Usage of the in-memory session state store and the warm agent runtime pool."""
+            return JSONResponse(status_code=200, content={
+                **session_store.stats(),
+                "runtime_pool": self.app.state.runtime_pool.stats(),
+            })
+
         # WebSocket endpoint to handle user messages
         @self.app.websocket("/chat")
         async def websocket_endpoint(
@@ -345,8 +428,9 @@ class LeadGenerationAPI:
                     if "docs" in parameters and parameters["docs"] is not None:
                         edu_inputs["docs"] = parameters["docs"]
                     edu_flow.input_variables = edu_inputs
-                    loop = asyncio.get_running_loop()
-                    result = await loop.run_in_executor(None, edu_flow.kickoff)
+                    result = await workload_scheduler.run(
+                        WorkloadClass.CREW, user_id or "anonymous", edu_flow.kickoff
+                    )
 
                     if isinstance(result, str):
                         sections_with_content = json.loads(result)
@@ -379,6 +463,13 @@ class LeadGenerationAPI:
                         content={"error": f"Unknown query type: {query_type}"}
                     )
 
+            except SchedulerSaturatedError as e:
+                print(f"[/execute/{query_type}] Rejected, scheduler saturated: {str(e)}")
+                return JSONResponse(
+                    status_code=429,
+                    content={"error": str(e), "retry_after": round(e.retry_after)},
+                    headers={"Retry-After": str(round(e.retry_after))}
+                )
             except Exception as e:
                 print(f"[/execute/{query_type}] Error executing query: {str(e)}")
                 return JSONResponse(status_code=500, content={"error": str(e)})
@@ -440,6 +531,166 @@ class LeadGenerationAPI:
                 print(f"[stream_logs] Error setting up SSE: {e}")
                 return JSONResponse(status_code=500, content={"error": str(e)})
 
+        @self.app.post("/jobs/{query_type}")
+        async def enqueue_job(
+            request: Request,
+            query_type: str,
+            parameters: Dict[str, Any]
+        ):
+            """
+            Enqueue a crew execution for the job workers and return its job id.
+            """
+            sambanova_key = request.headers.get("x-sambanova-key")
+            serper_key = request.headers.get("x-serper-key")
+            exa_key = request.headers.get("x-exa-key")
+
+            user_id = request.headers.get("x-user-id", "")
+            run_id = request.headers.get("x-run-id", "")
+
+            if not user_id:
+                return JSONResponse(status_code=401, content={"error": "Missing x-user-id header"})
+            if not sambanova_key:
+                return JSONResponse(status_code=401, content={"error": "Missing required SambaNova API key"})
+            if query_type == "sales_leads" and not exa_key:
+                return JSONResponse(
+                    status_code=401,
+                    content={"error": "Missing required Exa API key for sales leads"}
+                )
+            if query_type in ("educational_content", "deep_research") and not serper_key:
+                return JSONResponse(
+                    status_code=401,
+                    content={"error": "Missing required Serper API key for educational content"}
+                )
+            if query_type == "financial_analysis" and (not exa_key or not serper_key):
+                return JSONResponse(
+                    status_code=401,
+                    content={"error": "Missing required Exa or Serper API keys for financial analysis"}
+                )
+            if query_type not in ("sales_leads", "educational_content", "deep_research", "financial_analysis"):
+                return JSONResponse(status_code=400, content={"error": f"Unknown query type: {query_type}"})
+
+            try:
+                if "document_ids" in parameters:
+                    parameters["docs"] = await asyncio.to_thread(
+                        load_documents,
+                        user_id,
+                        parameters.pop("document_ids"),
+                        self.app.state.redis_client,
+                        self.app.state.context_length_summariser,
+                    )
+
+                job_id = await asyncio.to_thread(
+                    self.app.state.job_queue.enqueue,
+                    user_id,
+                    query_type,
+                    parameters,
+                    {"sambanova_key": sambanova_key, "serper_key": serper_key or "", "exa_key": exa_key or ""},
+                    run_id,
+                )
+                return JSONResponse(
+                    status_code=202,
+                    content={"job_id": job_id, "status": "queued", "run_id": run_id or job_id}
+                )
+            except Exception as e:
+                print(f"[/jobs/{query_type}] Error enqueuing job: {str(e)}")
+                return JSONResponse(status_code=500, content={"error": str(e)})
+
+        @self.app.get("/jobs/{job_id}")
+        async def get_job(request: Request, job_id: str):
+            user_id = request.headers.get("x-user-id", "")
+            job = await asyncio.to_thread(self.app.state.job_queue.get_job, job_id, user_id)
+            if job is None:
+                return JSONResponse(status_code=404, content={"error": "Job not found"})
+            return JSONResponse(content=job)
+
+        @self.app.get("/jobs/{job_id}/result")
+        async def get_job_result(request: Request, job_id: str):
+            user_id = request.headers.get("x-user-id", "")
+            job = await asyncio.to_thread(self.app.state.job_queue.get_job, job_id, user_id)
+            if job is None:
+                return JSONResponse(status_code=404, content={"error": "Job not found"})
+            if job["status"] != "succeeded":
+                return JSONResponse(
+                    status_code=409,
+                    content={"error": f"Job is {job['status']}", "status": job["status"]}
+                )
+            result = await asyncio.to_thread(self.app.state.job_queue.get_result, job_id, user_id)
+            return JSONResponse(content=result)
+
+        @self.app.get("/jobs/{job_id}/stream")
+        async def stream_job(request: Request, job_id: str, user_id: str):
+            """
+            SSE endpoint streaming job status changes and the crew's agent thoughts.
+            """
+            job_queue = self.app.state.job_queue
+            job = await asyncio.to_thread(job_queue.get_job, job_id, user_id)
+            if job is None:
+                return JSONResponse(status_code=404, content={"error": "Job not found"})
+
+            pubsub = self.app.state.redis_client.pubsub(ignore_subscribe_messages=True)
+            await asyncio.to_thread(
+                pubsub.subscribe,
+                JobQueue.events_channel(job_id),
+                f"agent_thoughts:{user_id}:{job['run_id']}",
+            )
+            # Re-read once subscribed so a status change in between is not missed
+            job = await asyncio.to_thread(job_queue.get_job, job_id, user_id) or job
+
+            async def event_generator():
+                try:
+                    yield {"event": "status", "data": json.dumps(job)}
+                    status = job["status"]
+                    while status not in TERMINAL_JOB_STATUSES:
+                        if await request.is_disconnected():
+                            break
+
+                        message = await asyncio.to_thread(pubsub.get_message, timeout=1.0)
+                        if message and message["type"] == "message":
+                            if message["channel"] == JobQueue.events_channel(job_id):
+                                event = json.loads(message["data"])
+                                status = event.get("status", status)
+                                yield {"event": "status", "data": message["data"]}
+                            else:
+                                yield {"event": "message", "data": message["data"]}
+                        else:
+                            yield {"event": "ping", "data": json.dumps({"type": "ping"})}
+
+                    if status == "succeeded":
+                        result = await asyncio.to_thread(job_queue.get_result, job_id, user_id)
+                        yield {"event": "result", "data": json.dumps(result)}
+                except Exception as ex:
+                    print(f"[/jobs/{job_id}/stream] Error in SSE generator: {ex}")
+                finally:
+                    pubsub.unsubscribe()
+                    pubsub.close()
+
+            return EventSourceResponse(
+                event_generator(),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache", "Connection": "keep-alive"}
+            )
+
+        @self.app.delete("/jobs/{job_id}")
+        async def cancel_job(request: Request, job_id: str):
+            user_id = request.headers.get("x-user-id", "")
+            status = await asyncio.to_thread(self.app.state.job_queue.cancel, job_id, user_id)
+            if status is None:
+                return JSONResponse(status_code=404, content={"error": "Job not found"})
+            return JSONResponse(content={"job_id": job_id, "status": status})
+
+        @self.app.post("/jobs/{job_id}/retry")
+        async def retry_job(request: Request, job_id: str):
+            user_id = request.headers.get("x-user-id", "")
+            status = await asyncio.to_thread(self.app.state.job_queue.retry, job_id, user_id)
+            if status is None:
+                return JSONResponse(status_code=404, content={"error": "Job not found"})
+            if status != "queued":
+                return JSONResponse(
+                    status_code=409,
+                    content={"error": f"Only failed or cancelled jobs can be retried, job is {status}"}
+                )
+            return JSONResponse(status_code=202, content={"job_id": job_id, "status": status})
+
         @self.app.post("/chat/init")
         async def init_chat(
             chat_name: Optional[str] = None,
@@ -637,6 +888,9 @@ class LeadGenerationAPI:
                         content={"error": "Chat not found or access denied"}
                     )
 
+                # Stop any crew or research still running for this chat
+                cancellation_registry.cancel_session(f"{user_id}:{conversation_id}", "chat deleted")
+
                 # Close any active WebSocket connections for this chat
                 connection = self.app.state.manager.get_connection(user_id, conversation_id)
                 if connection:
@@ -646,9 +900,13 @@ class LeadGenerationAPI:
                 # Delete chat metadata
                 self.app.state.redis_client.delete(meta_key)
 
-                # Delete chat messages
+                # Delete chat messages and the rolling conversation summary
                 message_key = f"messages:{user_id}:{conversation_id}"
                 self.app.state.redis_client.delete(message_key)
+                self.app.state.redis_client.delete(SessionStateManager.turns_key(user_id, conversation_id))
+                self.app.state.redis_client.delete(conversation_summary_service.summary_key(user_id, conversation_id))
+                session_state_manager.clear_session(user_id, conversation_id)
+                conversation_summary_service.discard(user_id, conversation_id)
 
                 # Remove from user's chat list
                 user_chats_key = f"user_chats:{user_id}"
@@ -1079,17 +1337,23 @@ class LeadGenerationAPI:
                 conversation_ids = self.app.state.redis_client.zrange(user_chats_key, 0, -1)
                 
                 for conversation_id in conversation_ids:
+                    cancellation_registry.cancel_session(f"{user_id}:{conversation_id}", "user data deleted")
+
                     # Close any active WebSocket connections
                     connection = self.app.state.manager.get_connection(user_id, conversation_id)
                     if connection:
                         await connection.close(code=4000, reason="User data deleted")
                         self.app.state.manager.remove_connection(user_id, conversation_id)
                     
-                    # Delete chat metadata and messages
+                    # Delete chat metadata, messages and the rolling conversation summary
                     meta_key = f"chat_metadata:{user_id}:{conversation_id}"
                     message_key = f"messages:{user_id}:{conversation_id}"
                     self.app.state.redis_client.delete(meta_key)
                     self.app.state.redis_client.delete(message_key)
+                    self.app.state.redis_client.delete(SessionStateManager.turns_key(user_id, conversation_id))
+                    self.app.state.redis_client.delete(conversation_summary_service.summary_key(user_id, conversation_id))
+                    session_state_manager.clear_session(user_id, conversation_id)
+                    conversation_summary_service.discard(user_id, conversation_id)
                 
                 # Delete the user's chat list
                 self.app.state.redis_client.delete(user_chats_key)
@@ -1135,7 +1399,9 @@ class LeadGenerationAPI:
         ]).strip()
         extracted_info = extractor.extract_lead_info(combined_text)
 
-        raw_result, _ = await asyncio.to_thread(crew.execute_research, extracted_info)
+        raw_result, _ = await workload_scheduler.run(
+            WorkloadClass.CREW, crew.user_id or "anonymous", crew.execute_research, extracted_info
+        )
         return raw_result
 
     async def execute_financial(self, crew: FinancialAnalysisCrew, parameters: Dict[str,Any], provider: str):
@@ -1158,7 +1424,9 @@ class LeadGenerationAPI:
         if "docs" in parameters:
             inputs["docs"] = parameters["docs"]
         
-        raw_result, _ = await asyncio.to_thread(crew.execute_financial_analysis, inputs)
+        raw_result, _ = await workload_scheduler.run(
+            WorkloadClass.CREW, crew.user_id or "anonymous", crew.execute_financial_analysis, inputs
+        )
         return raw_result
 
 def create_app():
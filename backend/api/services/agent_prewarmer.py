@@ -0,0 +1,117 @@
+import asyncio
+import os
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from utils.logging import logger
+
+# Receives the planner fields streamed so far, the provider and the user's API keys
+Warmer = Callable[[Dict[str, Any], str, Any], Awaitable[Any]]
+
+
+@dataclass
+class _Prewarm:
+    fields: Dict[str, Any]
+    task: asyncio.Task
+    expires_at: float
+
+
+@dataclass
+class _Registration:
+    warm: Warmer
+    requires: Tuple[str, ...] = field(default_factory=tuple)
+
+
+class AgentPrewarmer:
+    """
+    Starts an agent's preparation work while the planner is still streaming.
+
+    The query router reports every planner field as soon as it is complete.
+    Once the route type and the fields a warmer requires are known, the warmer
+    of that agent type runs in the background. The agent then consumes the
+    result for its message instead of doing the work itself, provided the
+    fields it would have used are the ones the warmer saw.
+    """
+
+    def __init__(self, ttl_seconds: Optional[float] = None):
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else float(os.getenv("AGENT_PREWARM_TTL", "120"))
+        self._registrations: Dict[str, _Registration] = {}
+        # message_id -> (planner fields streamed so far, time of the last field)
+        self._observed: Dict[str, Tuple[Dict[str, Any], float]] = {}
+        self._prewarms: Dict[Tuple[str, str], _Prewarm] = {}
+        self._stats: Counter = Counter()
+
+    def register(self, agent_type: str, warm: Warmer, requires: Tuple[str, ...] = ()) -> None:
+        """
+        Register the warmer of an agent type.
+
+        Args:
+            agent_type (str): Route type the warmer prepares for.
+            warm: Coroutine function receiving the planner fields, the provider and the API keys.
+            requires: Dotted planner fields that must be complete before warming.
+        """
+        self._registrations[agent_type] = _Registration(warm=warm, requires=tuple(requires))
+
+    def observe(self, message_id: str, path: str, value: Any, provider: str, api_keys: Any) -> None:
+        """Record a completed planner field and start a warmer once it has what it needs."""
+        self._sweep()
+        fields, _ = self._observed.get(message_id, ({}, 0.0))
+        fields[path] = value
+        self._observed[message_id] = (fields, time.monotonic())
+
+        registration = self._registrations.get(fields.get("type"))
+        if registration is None or (fields["type"], message_id) in self._prewarms:
+            return
+        if any(required not in fields for required in registration.requires):
+            return
+
+        warm_fields = dict(fields)
+        task = asyncio.create_task(registration.warm(warm_fields, provider, api_keys))
+        # Unused results are dropped on expiry; their errors must not surface
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._prewarms[(fields["type"], message_id)] = _Prewarm(
+            fields=warm_fields, task=task, expires_at=time.monotonic() + self.ttl_seconds
+        )
+        self._stats["started"] += 1
+        logger.info(logger.format_message(None, f"Prewarming {fields['type']} agent for message {message_id}"))
+
+    async def consume(self, agent_type: str, message_id: str, expected: Dict[str, Any]) -> Optional[Any]:
+        """
+        Return the warm result for a message, or None if the agent must do the work itself.
+
+        Args:
+            agent_type (str): The agent's route type.
+            message_id (str): The message being handled.
+            expected: Planner fields the agent would use, they must match the ones warmed with.
+        """
+        prewarm = self._prewarms.pop((agent_type, message_id), None)
+        self._observed.pop(message_id, None)
+        if prewarm is None:
+            return None
+        if any(prewarm.fields.get(path) != value for path, value in expected.items()):
+            self._stats["mismatched"] += 1
+            return None
+        try:
+            result = await prewarm.task
+        except Exception as e:
+            self._stats["failed"] += 1
+            logger.error(logger.format_message(None, f"Prewarming {agent_type} failed: {str(e)}"))
+            return None
+        self._stats["used"] += 1
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {"pending": len(self._prewarms), **self._stats}
+
+    def _sweep(self) -> None:
+        now = time.monotonic()
+        for key in [k for k, p in self._prewarms.items() if p.expires_at <= now]:
+            del self._prewarms[key]
+            self._stats["expired"] += 1
+        for message_id in [m for m, (_, seen) in self._observed.items() if seen + self.ttl_seconds <= now]:
+            del self._observed[message_id]
+
+
+agent_prewarmer = AgentPrewarmer()
@@ -0,0 +1,154 @@
+import asyncio
+import json
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from autogen_core.models import LLMMessage, SystemMessage, UserMessage
+
+from api.services.redis_service import SecureRedisService
+from utils.logging import logger
+
+Summariser = Callable[[List[LLMMessage]], Awaitable[str]]
+
+SUMMARY_UPDATE_PROMPT = """You are a helpful assistant that maintains a running summary of a conversation for other processes to use as a context.
+Update the previous summary with the latest exchange, following the instructions below:
+- Include the topics and entities discussed in the conversation.
+- Include the main points discussed in the conversation.
+- Include the summary of the questions asked by the user.
+- Include the summary of the responses provided by the assistant.
+- Include the overall summary of the conversation.
+- Keep it to a few sentences, dropping details that no longer matter.
+Return only the updated summary."""
+
+
+class ConversationSummaryService:
+    """
+    Maintains a rolling summary of each conversation for the query router.
+
+    After every completed response the previous summary and the latest turn are
+    folded into a new summary by a background LLM call, so the router can read
+    the context instantly instead of summarising the whole history on the
+    critical path. Summaries are stored encrypted per user in Redis. Updates of
+    a conversation run one after another in turn order.
+    """
+
+    # Agent responses are mostly JSON payloads; their head carries the gist
+    MAX_TURN_CHARS = 4000
+
+    def __init__(self, redis_client: Optional[SecureRedisService] = None):
+        self.redis_client = redis_client
+        # session key -> summariser of the latest turn and its pending user message
+        self._sessions: Dict[str, Dict[str, object]] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def set_redis_client(self, redis_client: SecureRedisService) -> None:
+        self.redis_client = redis_client
+
+    @staticmethod
+    def summary_key(user_id: str, conversation_id: str) -> str:
+        return f"conversation_summary:{user_id}:{conversation_id}"
+
+    def record_user_turn(self, user_id: str, conversation_id: str, content: str, summarise: Summariser) -> None:
+        """
+        Remember the user message of the turn being answered.
+
+        Args:
+            summarise: Coroutine function returning the model's reply to a list
+                of messages, bound to the provider of the turn.
+        """
+        self._sessions[f"{user_id}:{conversation_id}"] = {"user_message": content, "summarise": summarise}
+
+    def complete_turn(self, user_id: str, conversation_id: str, response: str) -> Optional[asyncio.Task]:
+        """
+        Schedule a summary update with the completed response.
+
+        Returns:
+            Optional[asyncio.Task]: The update task, or None if no turn was recorded.
+        """
+        session_key = f"{user_id}:{conversation_id}"
+        session = self._sessions.get(session_key)
+        if session is None or self.redis_client is None:
+            return None
+        user_message = session.pop("user_message", "")
+
+        previous = self._tasks.get(session_key)
+        task = asyncio.create_task(
+            self._update(user_id, conversation_id, user_message, response, session["summarise"], previous)
+        )
+        self._tasks[session_key] = task
+        task.add_done_callback(lambda t: self._tasks.pop(session_key, None) if self._tasks.get(session_key) is t else None)
+        return task
+
+    async def get_summary(self, user_id: str, conversation_id: str, wait_timeout: float = 5.0) -> Optional[str]:
+        """
+        Return the stored summary, waiting up to wait_timeout for a pending update.
+
+        Returns:
+            Optional[str]: The summary, or None if the conversation has none yet.
+        """
+        if self.redis_client is None:
+            return None
+        pending = self._tasks.get(f"{user_id}:{conversation_id}")
+        if pending is not None:
+            # A still-running update beats summarising from scratch
+            await asyncio.wait({pending}, timeout=wait_timeout)
+        stored = await asyncio.to_thread(self.redis_client.get, self.summary_key(user_id, conversation_id), user_id)
+        if not stored:
+            return None
+        return json.loads(stored)["summary"]
+
+    def has_pending_update(self, user_id: str, conversation_id: str) -> bool:
+        """Whether a summary update of the conversation is still running."""
+        return f"{user_id}:{conversation_id}" in self._tasks
+
+    async def store(self, user_id: str, conversation_id: str, summary: str, turns: Optional[int] = None) -> None:
+        """Persist a summary for a conversation."""
+        payload = {"summary": summary, "updated_at": time.time()}
+        if turns is not None:
+            payload["turns"] = turns
+        await asyncio.to_thread(
+            self.redis_client.set, self.summary_key(user_id, conversation_id), json.dumps(payload), user_id
+        )
+
+    def discard(self, user_id: str, conversation_id: str) -> None:
+        """Forget the in-memory state of a conversation; the stored summary is kept."""
+        self._sessions.pop(f"{user_id}:{conversation_id}", None)
+
+    async def _update(
+        self,
+        user_id: str,
+        conversation_id: str,
+        user_message: str,
+        response: str,
+        summarise: Summariser,
+        previous: Optional[asyncio.Task],
+    ) -> None:
+        session_key = f"{user_id}:{conversation_id}"
+        if previous is not None:
+            await asyncio.gather(previous, return_exceptions=True)
+        try:
+            start_time = time.time()
+            stored = await asyncio.to_thread(self.redis_client.get, self.summary_key(user_id, conversation_id), user_id)
+            state = json.loads(stored) if stored else {"summary": "", "turns": 0}
+
+            exchange = ""
+            if user_message:
+                exchange += f"User: {user_message[: self.MAX_TURN_CHARS]}\n"
+            exchange += f"Assistant: {response[: self.MAX_TURN_CHARS]}"
+            summary = await summarise([
+                SystemMessage(content=SUMMARY_UPDATE_PROMPT, source="system"),
+                UserMessage(
+                    content=f"Previous summary:\n{state['summary'] or 'No previous summary.'}\n\nLatest exchange:\n{exchange}",
+                    source="user",
+                ),
+            ])
+            await self.store(user_id, conversation_id, summary, state.get("turns", 0) + 1)
+            logger.info(logger.format_message(
+                session_key,
+                f"Updated conversation summary in {time.time() - start_time:.2f} seconds"
+            ))
+        except Exception as e:
+            logger.error(logger.format_message(session_key, f"Error updating conversation summary: {str(e)}"), exc_info=True)
+
+
+conversation_summary_service = ConversationSummaryService()
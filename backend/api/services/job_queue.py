@@ -0,0 +1,254 @@
+import json
+import os
+import time
+import uuid
+from enum import Enum
+from typing import Any, Dict, Optional
+
+from cryptography.fernet import InvalidToken
+
+from api.services.redis_service import SecureRedisService
+from utils.logging import logger
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+TERMINAL_JOB_STATUSES = {JobStatus.SUCCEEDED.value, JobStatus.FAILED.value, JobStatus.CANCELLED.value}
+
+
+class JobQueue:
+    """
+    Durable Redis-backed queue for long-running crew executions.
+
+    Job metadata, payloads (including API keys) and results are stored encrypted
+    per user, with the owner kept in plain text so that lookups by other users
+    are rejected before decrypting. Queue entries only carry the job and user ids, and are moved to a
+    processing list while a worker owns them so that jobs of a crashed worker
+    can be recovered once its heartbeat expires.
+    """
+
+    QUEUE_KEY = "jobs:queue"
+    PROCESSING_KEY = "jobs:processing"
+    JOB_TTL_SECONDS = 7 * 24 * 60 * 60
+    HEARTBEAT_TTL_SECONDS = 30
+
+    def __init__(self, redis_client: SecureRedisService, max_attempts: Optional[int] = None):
+        self.redis_client = redis_client
+        self.max_attempts = max_attempts or int(os.getenv("JOB_MAX_ATTEMPTS", "2"))
+
+    @staticmethod
+    def job_key(job_id: str) -> str:
+        return f"job:{job_id}"
+
+    @staticmethod
+    def owner_key(job_id: str) -> str:
+        return f"job_owner:{job_id}"
+
+    @staticmethod
+    def payload_key(job_id: str) -> str:
+        return f"job_payload:{job_id}"
+
+    @staticmethod
+    def result_key(job_id: str) -> str:
+        return f"job_result:{job_id}"
+
+    @staticmethod
+    def cancel_key(job_id: str) -> str:
+        return f"job_cancel:{job_id}"
+
+    @staticmethod
+    def heartbeat_key(job_id: str) -> str:
+        return f"job_heartbeat:{job_id}"
+
+    @staticmethod
+    def events_channel(job_id: str) -> str:
+        return f"job_events:{job_id}"
+
+    @staticmethod
+    def user_jobs_key(user_id: str) -> str:
+        return f"user_jobs:{user_id}"
+
+    def enqueue(
+        self,
+        user_id: str,
+        query_type: str,
+        parameters: Dict[str, Any],
+        api_keys: Dict[str, str],
+        run_id: str = "",
+    ) -> str:
+        """
+        Store a job and push it onto the queue.
+
+        Returns:
+            str: The new job id.
+        """
+        job_id = str(uuid.uuid4())
+        now = time.time()
+        meta = {
+            "job_id": job_id,
+            "user_id": user_id,
+            "query_type": query_type,
+            "run_id": run_id or job_id,
+            "status": JobStatus.QUEUED.value,
+            "attempts": 0,
+            "max_attempts": self.max_attempts,
+            "progress": "Queued",
+            "error": "",
+            "created_at": now,
+            "updated_at": now,
+        }
+        payload = {"parameters": parameters, "api_keys": api_keys}
+
+        # The owner is not secret and must be readable without the owner's key
+        super(SecureRedisService, self.redis_client).set(self.owner_key(job_id), user_id, ex=self.JOB_TTL_SECONDS)
+        self.redis_client.hset(self.job_key(job_id), meta, user_id)
+        self.redis_client.set(self.payload_key(job_id), json.dumps(payload), user_id)
+        self.redis_client.expire(self.job_key(job_id), self.JOB_TTL_SECONDS)
+        self.redis_client.expire(self.payload_key(job_id), self.JOB_TTL_SECONDS)
+        self.redis_client.zadd(self.user_jobs_key(user_id), {job_id: now})
+        self._push(job_id, user_id)
+        logger.info(logger.format_message(None, f"Enqueued {query_type} job {job_id}"))
+        return job_id
+
+    def get_job(self, job_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """Return the decrypted job metadata, or None if the job does not belong to the user."""
+        owner = super(SecureRedisService, self.redis_client).get(self.owner_key(job_id))
+        if owner is not None and (owner.decode() if isinstance(owner, bytes) else owner) != user_id:
+            return None
+        try:
+            meta = {
+                k: v.decode() if isinstance(v, bytes) else v
+                for k, v in self.redis_client.hgetall(self.job_key(job_id), user_id).items()
+            }
+        except InvalidToken:
+            # Encrypted with another user's key
+            return None
+        if not meta or meta.get("user_id") != user_id:
+            return None
+        for field in ("attempts", "max_attempts"):
+            meta[field] = int(meta.get(field, 0))
+        for field in ("created_at", "updated_at"):
+            meta[field] = float(meta.get(field, 0))
+        return meta
+
+    def get_payload(self, job_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        payload = self.redis_client.get(self.payload_key(job_id), user_id)
+        return json.loads(payload) if payload else None
+
+    def get_result(self, job_id: str, user_id: str) -> Optional[Any]:
+        result = self.redis_client.get(self.result_key(job_id), user_id)
+        return json.loads(result) if result else None
+
+    def update(self, job_id: str, user_id: str, **fields: Any) -> None:
+        """Update job metadata fields and publish the change on the job channel."""
+        fields["updated_at"] = time.time()
+        self.redis_client.hset(self.job_key(job_id), fields, user_id)
+        event = {"job_id": job_id, **{k: v for k, v in fields.items() if k != "error" or v}}
+        self.redis_client.publish(self.events_channel(job_id), json.dumps(event))
+
+    def store_result(self, job_id: str, user_id: str, result: Any) -> None:
+        self.redis_client.set(self.result_key(job_id), json.dumps(result), user_id)
+        self.redis_client.expire(self.result_key(job_id), self.JOB_TTL_SECONDS)
+
+    def cancel(self, job_id: str, user_id: str) -> Optional[str]:
+        """
+        Cancel a queued or running job.
+
+        Queued jobs are marked cancelled and skipped when a worker claims them;
+        running jobs get a cancel flag that their worker polls.
+
+        Returns:
+            Optional[str]: The resulting job status, or None if the job is unknown.
+        """
+        meta = self.get_job(job_id, user_id)
+        if meta is None:
+            return None
+        if meta["status"] in TERMINAL_JOB_STATUSES:
+            return meta["status"]
+
+        self.redis_client.setex(self.cancel_key(job_id), self.JOB_TTL_SECONDS, "1")
+        if meta["status"] == JobStatus.QUEUED.value:
+            self.update(job_id, user_id, status=JobStatus.CANCELLED.value, progress="Cancelled")
+            return JobStatus.CANCELLED.value
+        return meta["status"]
+
+    def is_cancel_requested(self, job_id: str) -> bool:
+        return bool(self.redis_client.exists(self.cancel_key(job_id)))
+
+    def retry(self, job_id: str, user_id: str) -> Optional[str]:
+        """
+        Re-queue a failed or cancelled job with a fresh attempt budget.
+
+        Returns:
+            Optional[str]: The resulting job status, or None if the job is unknown.
+        """
+        meta = self.get_job(job_id, user_id)
+        if meta is None:
+            return None
+        if meta["status"] not in (JobStatus.FAILED.value, JobStatus.CANCELLED.value):
+            return meta["status"]
+
+        self.redis_client.delete(self.cancel_key(job_id), self.result_key(job_id))
+        self.update(job_id, user_id, status=JobStatus.QUEUED.value, attempts=0, progress="Queued", error="")
+        self._push(job_id, user_id)
+        return JobStatus.QUEUED.value
+
+    def requeue(self, job_id: str, user_id: str) -> None:
+        """Put a job back on the queue for another attempt."""
+        self._push(job_id, user_id)
+
+    def claim(self, timeout: int = 5) -> Optional[Dict[str, str]]:
+        """
+        Block until a job is available and move it to the processing list.
+
+        Returns:
+            Optional[Dict[str, str]]: The queue entry with job_id, user_id and raw item.
+        """
+        item = self.redis_client.brpoplpush(self.QUEUE_KEY, self.PROCESSING_KEY, timeout=timeout)
+        if item is None:
+            return None
+        entry = json.loads(item)
+        entry["raw"] = item
+        self.heartbeat(entry["job_id"])
+        return entry
+
+    def ack(self, entry: Dict[str, str]) -> None:
+        """Remove a claimed entry from the processing list."""
+        # A recovered entry may have been claimed again since; its heartbeat is no longer ours
+        if self.redis_client.lrem(self.PROCESSING_KEY, 1, entry["raw"]):
+            self.redis_client.delete(self.heartbeat_key(entry["job_id"]))
+
+    def heartbeat(self, job_id: str) -> None:
+        self.redis_client.setex(self.heartbeat_key(job_id), self.HEARTBEAT_TTL_SECONDS, "1")
+
+    def recover_orphans(self) -> int:
+        """
+        Re-queue processing entries whose worker stopped sending heartbeats.
+
+        Returns:
+            int: The number of recovered jobs.
+        """
+        recovered = 0
+        # Queue entries are not encrypted, so bypass SecureRedisService.lrange
+        processing = super(SecureRedisService, self.redis_client).lrange(self.PROCESSING_KEY, 0, -1)
+        for item in processing:
+            entry = json.loads(item)
+            if self.redis_client.exists(self.heartbeat_key(entry["job_id"])):
+                continue
+            if self.redis_client.lrem(self.PROCESSING_KEY, 1, item):
+                # A fresh entry, so a late ack of the stale claim cannot remove it
+                self._push(entry["job_id"], entry["user_id"])
+                recovered += 1
+                logger.info(logger.format_message(None, f"Recovered orphaned job {entry['job_id']}"))
+        return recovered
+
+    def _push(self, job_id: str, user_id: str) -> None:
+        # Each push is a distinct entry, so acks only ever remove their own claim
+        entry = {"job_id": job_id, "user_id": user_id, "entry_id": uuid.uuid4().hex}
+        self.redis_client.lpush(self.QUEUE_KEY, json.dumps(entry))
@@ -0,0 +1,238 @@
+import asyncio
+import contextvars
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from autogen_core.models import CreateResult
+
+from api.services.redis_service import SecureRedisService
+from utils.logging import logger
+
+# Requests sending this header with the value "bypass" skip cache lookups
+LLM_CACHE_BYPASS_HEADER = "x-llm-cache"
+
+# Set for the current request when its responses must come from the model
+llm_cache_bypass: contextvars.ContextVar[bool] = contextvars.ContextVar("llm_cache_bypass", default=False)
+
+# Entries are shared between users, so the Redis tier is encrypted with a service scope
+_REDIS_SCOPE = "llm_cache"
+
+
+def _usage_tokens(usage: Any) -> Tuple[int, int]:
+    if usage is None:
+        return 0, 0
+    if isinstance(usage, dict):
+        return usage.get("prompt_tokens") or 0, usage.get("completion_tokens") or 0
+    return getattr(usage, "prompt_tokens", 0) or 0, getattr(usage, "completion_tokens", 0) or 0
+
+
+class LLMResponseCache:
+    """
+    Content-addressed cache of deterministic LLM responses.
+
+    Only temperature-0 calls are cached. The key is a hash of the model, the
+    messages, the tools and the remaining request parameters. Responses are
+    kept in an in-process LRU and, when a Redis client is set, in an encrypted
+    Redis tier shared by all workers. Lookups are skipped when the cache is
+    disabled or bypassed for the current request, but fresh responses are still
+    stored. Token counts of hits are accounted separately from billed tokens.
+    """
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        redis_ttl_seconds: Optional[int] = None,
+        redis_client: Optional[SecureRedisService] = None,
+    ):
+        self.enabled = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv("LLM_CACHE_MAX_ENTRIES", "2000"))
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else float(os.getenv("LLM_CACHE_TTL", "3600"))
+        self.redis_ttl_seconds = (
+            redis_ttl_seconds if redis_ttl_seconds is not None else int(os.getenv("LLM_CACHE_REDIS_TTL", "86400"))
+        )
+        self.redis_client = redis_client
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        # Crew threads and the event loop share the cache
+        self._lock = threading.Lock()
+        self._stats: Counter = Counter()
+
+    def set_redis_client(self, redis_client: Optional[SecureRedisService]) -> None:
+        self.redis_client = redis_client if self.redis_ttl_seconds > 0 else None
+
+    @staticmethod
+    def cacheable(temperature: Optional[float], n: Optional[int] = None) -> bool:
+        """Whether a call with these sampling parameters is deterministic enough to cache."""
+        return temperature == 0 and (n is None or n == 1)
+
+    @staticmethod
+    def key(model: str, messages: Sequence[Any], tools: Optional[List[Any]] = None, **params: Any) -> str:
+        """
+        Content address of a request.
+
+        Args:
+            model (str): Model name.
+            messages: Request messages, as dicts or pydantic models.
+            tools: Tool schemas, if any.
+            **params: Remaining parameters that change the response, None values are ignored.
+        """
+        payload = {
+            "model": model,
+            "messages": [m.model_dump() if hasattr(m, "model_dump") else m for m in messages],
+            "tools": tools,
+            "params": {k: v for k, v in params.items() if v is not None},
+        }
+        encoded = json.dumps(payload, sort_keys=True, default=str, separators=(",", ":"))
+        return hashlib.sha256(encoded.encode()).hexdigest()
+
+    def lookups_bypassed(self) -> bool:
+        return not self.enabled or llm_cache_bypass.get()
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Return the cached response for a key, or None.
+
+        Blocks on the Redis tier; use aget on the event loop.
+        """
+        if self.lookups_bypassed():
+            self._stats["bypassed"] += 1
+            return None
+        entry = self._get_local(key)
+        if entry is None and self.redis_client is not None:
+            entry = self._get_redis(key)
+        return self._hit(entry)
+
+    async def aget(self, key: str) -> Optional[Any]:
+        if self.lookups_bypassed():
+            self._stats["bypassed"] += 1
+            return None
+        entry = self._get_local(key)
+        if entry is None and self.redis_client is not None:
+            entry = await asyncio.to_thread(self._get_redis, key)
+        return self._hit(entry)
+
+    def set(self, key: str, response: Any, usage: Any = None) -> None:
+        """
+        Store a billed response and account its usage.
+
+        Blocks on the Redis tier; use aset on the event loop.
+        """
+        entry = self._store_local(key, response, usage)
+        if entry is not None and self.redis_client is not None:
+            self._set_redis(key, entry)
+
+    async def aset(self, key: str, response: Any, usage: Any = None) -> None:
+        entry = self._store_local(key, response, usage)
+        if entry is not None and self.redis_client is not None:
+            await asyncio.to_thread(self._set_redis, key, entry)
+
+    def record_billed(self, usage: Any) -> None:
+        """Account the usage of a call that was not eligible for caching."""
+        prompt_tokens, completion_tokens = _usage_tokens(usage)
+        self._stats["billed_prompt_tokens"] += prompt_tokens
+        self._stats["billed_completion_tokens"] += completion_tokens
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "redis_tier": self.redis_client is not None,
+            **self._stats,
+        }
+
+    def _hit(self, entry: Optional[Dict[str, Any]]) -> Optional[Any]:
+        if entry is None:
+            self._stats["misses"] += 1
+            return None
+        self._stats["hits"] += 1
+        prompt_tokens, completion_tokens = _usage_tokens(entry.get("usage"))
+        self._stats["cached_prompt_tokens"] += prompt_tokens
+        self._stats["cached_completion_tokens"] += completion_tokens
+        return entry["response"]
+
+    def _get_local(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires_at, entry = item
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def _put_local(self, key: str, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, entry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _store_local(self, key: str, response: Any, usage: Any) -> Optional[Dict[str, Any]]:
+        self.record_billed(usage)
+        if not self.enabled:
+            return None
+        prompt_tokens, completion_tokens = _usage_tokens(usage)
+        entry = {
+            "response": response,
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens},
+        }
+        self._put_local(key, entry)
+        self._stats["stores"] += 1
+        return entry
+
+    def _get_redis(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            stored = self.redis_client.get(f"llm_cache:{key}", _REDIS_SCOPE)
+        except Exception as e:
+            logger.error(f"Error reading LLM cache entry: {str(e)}")
+            return None
+        if not stored:
+            return None
+        entry = json.loads(stored)
+        self._put_local(key, entry)
+        self._stats["redis_hits"] += 1
+        return entry
+
+    def _set_redis(self, key: str, entry: Dict[str, Any]) -> None:
+        try:
+            self.redis_client.set(f"llm_cache:{key}", json.dumps(entry), _REDIS_SCOPE)
+            self.redis_client.expire(f"llm_cache:{key}", self.redis_ttl_seconds)
+        except Exception as e:
+            logger.error(f"Error writing LLM cache entry: {str(e)}")
+
+
+class CachedChatCompletionClient:
+    """
+    Wraps an autogen chat completion client so its create calls go through the LLM cache.
+
+    Only create is cached; the client must be configured with temperature 0.
+    """
+
+    def __init__(self, client: Any, model: str, **key_params: Any):
+        self.client = client
+        self.model = model
+        self.key_params = key_params
+
+    async def create(self, messages: Sequence[Any], **kwargs: Any) -> Any:
+        request_params = {k: v for k, v in kwargs.items() if k != "cancellation_token"}
+        key = llm_cache.key(self.model, messages, **self.key_params, **request_params)
+        cached = await llm_cache.aget(key)
+        if cached is not None:
+            return CreateResult.model_validate({**cached, "cached": True})
+        result = await self.client.create(messages, **kwargs)
+        await llm_cache.aset(key, result.model_dump(), result.usage)
+        return result
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.client, name)
+
+
+llm_cache = LLMResponseCache()
@@ -0,0 +1,375 @@
+import asyncio
+import os
+import time
+from collections import Counter, deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Sequence, Tuple, TypeVar
+
+from api.services.rate_limiter import rate_limiter
+from config.model_registry import model_registry
+from utils.logging import logger
+from utils.loop_bridge import loop_bridge
+from utils.token_budget import fit_messages, prompt_budget
+
+T = TypeVar("T")
+
+# Status codes worth retrying on another provider; other client errors would fail there too
+FAILOVER_STATUS_CODES = frozenset({408, 409, 429, 500, 502, 503, 504, 529})
+
+# Transport errors of litellm, openai, httpx and requests that carry no status code
+_FAILOVER_ERROR_NAMES = frozenset({
+    "APIConnectionError", "APITimeoutError", "Timeout", "ConnectError", "ConnectTimeout",
+    "ReadTimeout", "ReadError", "RemoteProtocolError", "ServiceUnavailableError",
+    "RateLimitError", "InternalServerError", "ConnectionError",
+})
+
+
+def is_failover_error(error: BaseException) -> bool:
+    """Whether an LLM call error is the provider's fault, so another provider may succeed."""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return status in FAILOVER_STATUS_CODES or status >= 500
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    return any(cls.__name__ in _FAILOVER_ERROR_NAMES for cls in type(error).__mro__)
+
+
+@dataclass(frozen=True)
+class ProviderTarget:
+    """One provider's endpoint and credentials for a logical model."""
+
+    provider: str
+    model_key: str
+    model: str
+    url: str
+    long_url: str
+    crewai_prefix: str
+    api_key: str
+    context_window: int
+    max_output_tokens: Optional[int]
+
+    @property
+    def name(self) -> str:
+        return f"{self.provider}:{self.model_key}"
+
+
+def routed_prompt_budget(targets: Sequence[ProviderTarget], max_output_tokens: Optional[int] = None) -> int:
+    """Prompt token budget that fits every target, so failover never meets a smaller window."""
+    return min(
+        prompt_budget(target.context_window, max_output_tokens or target.max_output_tokens) for target in targets
+    )
+
+
+class _ProviderStats:
+    def __init__(self, window: int):
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.outcomes: Deque[bool] = deque(maxlen=window)
+        self.cooldown_until = 0.0
+        self.counts: Counter = Counter()
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def error_rate(self) -> float:
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+
+class ProviderRouter:
+    """
+    Routes LLM calls of a logical model across the providers that serve it.
+
+    The registry maps the same model key to several providers. A call goes to
+    the user's provider first; every other provider with an API key is a
+    secondary. Latencies and errors of each provider are tracked over a rolling
+    window. When the primary has not answered by its p95 latency, the same
+    request is hedged to the next provider and whichever finishes first wins,
+    the other is cancelled. Rate limits, server errors and transport failures
+    fail over to the next provider immediately, and a provider is tried last
+    while it is rate limited or mostly failing.
+    """
+
+    def __init__(
+        self,
+        window: int = 200,
+        min_samples: Optional[int] = None,
+        hedge_percentile: float = 0.95,
+        default_hedge_delay: Optional[float] = None,
+        error_rate_threshold: float = 0.5,
+        cooldown_seconds: Optional[float] = None,
+    ):
+        self.hedging = os.getenv("PROVIDER_HEDGING", "true").lower() == "true"
+        self.failover = os.getenv("PROVIDER_FAILOVER", "true").lower() == "true"
+        self.window = window
+        self.min_samples = min_samples if min_samples is not None else int(os.getenv("PROVIDER_HEDGE_MIN_SAMPLES", "20"))
+        self.hedge_percentile = hedge_percentile
+        # Hedge delay while a provider has too few samples for a percentile
+        self.default_hedge_delay = (
+            default_hedge_delay if default_hedge_delay is not None
+            else float(os.getenv("PROVIDER_HEDGE_DEFAULT_DELAY", "30"))
+        )
+        self.error_rate_threshold = error_rate_threshold
+        self.cooldown_seconds = (
+            cooldown_seconds if cooldown_seconds is not None else float(os.getenv("PROVIDER_COOLDOWN", "30"))
+        )
+        self._stats: Dict[str, _ProviderStats] = {}
+        self._counts: Counter = Counter()
+
+    def targets(self, model_key: str, provider: str, api_key: str, api_keys: Any = None) -> List[ProviderTarget]:
+        """
+        Return the providers to try for a model, best first.
+
+        Args:
+            model_key (str): Logical model key of the registry.
+            provider (str): The user's provider, used as the primary.
+            api_key (str): API key of the primary provider.
+            api_keys: The user's APIKeys, if any; secondaries fall back to the
+                server's keys from the environment, e.g. FIREWORKS_KEY.
+        """
+        targets = [self._target(provider, model_key, api_key)]
+        if self.failover:
+            for other in model_registry.list_providers():
+                if other == provider or model_key not in model_registry.list_available_models(other):
+                    continue
+                key_name = model_registry.get_api_key_env(provider=other)
+                key = getattr(api_keys, key_name, "") or os.getenv(key_name.upper(), "")
+                if key:
+                    targets.append(self._target(other, model_key, key))
+        return self._order(targets)
+
+    async def run(
+        self,
+        targets: Sequence[ProviderTarget],
+        call: Callable[[ProviderTarget], Awaitable[T]],
+        hedge: bool = True,
+    ) -> T:
+        """
+        Run call against the targets with hedging and failover and return the first success.
+
+        Raises:
+            Exception: The error of the last attempt, or the first error that
+                another provider would not fix.
+        """
+        remaining = list(targets)
+        pending: Dict[asyncio.Future, ProviderTarget] = {}
+        error: Optional[BaseException] = None
+        hedged = not (hedge and self.hedging)
+        # Target and start time of the latest attempt, the one a hedge would back up
+        latest: List[Any] = []
+
+        def launch() -> None:
+            target = remaining.pop(0)
+            pending[asyncio.ensure_future(self._timed(target, call))] = target
+            latest[:] = [target, time.monotonic()]
+
+        launch()
+        try:
+            while pending:
+                timeout = None
+                if not hedged and remaining:
+                    target, started_at = latest
+                    timeout = max(0.0, self.hedge_delay(target) - (time.monotonic() - started_at))
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    self._counts["hedged"] += 1
+                    logger.info(f"Hedging {latest[0].name} request to {remaining[0].name}")
+                    launch()
+                    continue
+                for task in done:
+                    target = pending.pop(task)
+                    if task.exception() is None:
+                        if target is not targets[0]:
+                            self._counts["secondary_wins"] += 1
+                        return task.result()
+                    error = task.exception()
+                    if not is_failover_error(error):
+                        raise error
+                    if remaining and not pending:
+                        self._counts["failovers"] += 1
+                        logger.warning(f"Failing over from {target.name} to {remaining[0].name}: {str(error)}")
+                        launch()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+                self._counts["cancelled"] += 1
+
+    def run_sync(self, targets: Sequence[ProviderTarget], call: Callable[[ProviderTarget], T]) -> T:
+        """
+        Blocking counterpart of run: fails over between targets without hedging.
+
+        Callers on worker threads should prefer run through the loop bridge.
+        """
+        for index, target in enumerate(targets):
+            start_time = time.monotonic()
+            try:
+                with rate_limiter.slot_sync(target.provider, target.api_key):
+                    start_time = time.monotonic()
+                    result = call(target)
+            except Exception as e:
+                failover = is_failover_error(e)
+                self._record(target, time.monotonic() - start_time, error=e)
+                if not failover or index == len(targets) - 1:
+                    raise
+                self._counts["failovers"] += 1
+                logger.warning(f"Failing over from {target.name} to {targets[index + 1].name}: {str(e)}")
+                continue
+            self._record(target, time.monotonic() - start_time)
+            return result
+        raise ValueError("No provider targets to call")
+
+    def hedge_delay(self, target: ProviderTarget) -> float:
+        """Seconds to wait on a target before hedging: its latency percentile once known."""
+        stats = self._stats.get(target.name)
+        if stats is None or len(stats.latencies) < self.min_samples:
+            return self.default_hedge_delay
+        return stats.percentile(self.hedge_percentile)
+
+    def stats(self) -> Dict[str, Any]:
+        providers = {}
+        for name, stats in self._stats.items():
+            p50, p95 = stats.percentile(0.5), stats.percentile(0.95)
+            providers[name] = {
+                "samples": len(stats.latencies),
+                "p50_seconds": round(p50, 3) if p50 is not None else None,
+                "p95_seconds": round(p95, 3) if p95 is not None else None,
+                "error_rate": round(stats.error_rate(), 3),
+                "cooling_down": stats.cooldown_until > time.monotonic(),
+                **stats.counts,
+            }
+        return {"hedging": self.hedging, "failover": self.failover, "providers": providers, **self._counts}
+
+    @staticmethod
+    def _target(provider: str, model_key: str, api_key: str) -> ProviderTarget:
+        info = model_registry.get_model_info(model_key=model_key, provider=provider)
+        return ProviderTarget(
+            provider=provider,
+            model_key=model_key,
+            model=info["model"],
+            url=info["url"],
+            long_url=info["long_url"],
+            crewai_prefix=info["crewai_prefix"],
+            api_key=api_key,
+            context_window=model_registry.get_context_window(model_key=model_key, provider=provider),
+            max_output_tokens=model_registry.get_max_output_tokens(model_key=model_key, provider=provider),
+        )
+
+    def _order(self, targets: List[ProviderTarget]) -> List[ProviderTarget]:
+        now = time.monotonic()
+
+        def unhealthy(target: ProviderTarget) -> bool:
+            stats = self._stats.get(target.name)
+            if stats is None:
+                return False
+            if stats.cooldown_until > now:
+                return True
+            return len(stats.outcomes) >= 5 and stats.error_rate() >= self.error_rate_threshold
+
+        # Stable: healthy targets keep the user's preference order
+        return sorted(targets, key=unhealthy)
+
+    async def _timed(self, target: ProviderTarget, call: Callable[[ProviderTarget], Awaitable[T]]) -> T:
+        # Time spent queueing for the key's rate limit is not provider latency
+        async with rate_limiter.slot(target.provider, target.api_key):
+            start_time = time.monotonic()
+            try:
+                result = await call(target)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._record(target, time.monotonic() - start_time, error=e)
+                raise
+        self._record(target, time.monotonic() - start_time)
+        return result
+
+    def _record(self, target: ProviderTarget, latency: float, error: Optional[BaseException] = None) -> None:
+        stats = self._stats.setdefault(target.name, _ProviderStats(self.window))
+        if error is None:
+            stats.outcomes.append(True)
+            stats.latencies.append(latency)
+            stats.counts["succeeded"] += 1
+            return
+        if not is_failover_error(error):
+            # The request was at fault, not the provider
+            stats.counts["rejected"] += 1
+            return
+        # Failed calls return early, their latency would skew the percentiles
+        stats.outcomes.append(False)
+        stats.counts["failed"] += 1
+        status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+        if status == 429:
+            stats.cooldown_until = time.monotonic() + self.cooldown_seconds
+
+
+class RoutedChatCompletionClient:
+    """
+    Autogen chat completion client that sends create calls through the provider router.
+
+    Holds one client per provider target; other attributes are those of the primary client.
+    Prompts are trimmed to the smallest context window of the targets.
+    """
+
+    def __init__(self, clients: Sequence[Tuple[ProviderTarget, Any]]):
+        self.clients = dict(clients)
+        self.targets = [target for target, _ in clients]
+        self.prompt_budget = routed_prompt_budget(self.targets)
+
+    async def create(self, messages: Sequence[Any], **kwargs: Any) -> Any:
+        messages = fit_messages(messages, self.prompt_budget)
+        return await provider_router.run(self.targets, lambda target: self.clients[target].create(messages, **kwargs))
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.clients[self.targets[0]], name)
+
+
+class RoutedChatModel:
+    """
+    LangChain chat model facade that sends invocations through the provider router.
+
+    Supports the subset the deep research graph uses: invoke, ainvoke and
+    with_structured_output. Invocations from worker threads are hedged on the
+    application loop; without a loop they only fail over. Message lists are
+    trimmed to the smallest context window of the targets.
+    """
+
+    def __init__(self, models: Sequence[Tuple[ProviderTarget, Any]], max_output_tokens: Optional[int] = None):
+        self.models = dict(models)
+        self.targets = [target for target, _ in models]
+        self.max_output_tokens = max_output_tokens
+        self.prompt_budget = routed_prompt_budget(self.targets, max_output_tokens)
+
+    @property
+    def model_name(self) -> str:
+        primary = self.models[self.targets[0]]
+        return getattr(primary, "model_name", None) or getattr(primary, "model", "Unknown Model")
+
+    def with_structured_output(self, *args: Any, **kwargs: Any) -> "RoutedChatModel":
+        return RoutedChatModel(
+            [(target, self.models[target].with_structured_output(*args, **kwargs)) for target in self.targets],
+            self.max_output_tokens,
+        )
+
+    def _fit(self, messages: Any) -> Any:
+        return fit_messages(messages, self.prompt_budget) if isinstance(messages, list) else messages
+
+    async def ainvoke(self, messages: Any, config: Any = None, **kwargs: Any) -> Any:
+        messages = self._fit(messages)
+        return await provider_router.run(
+            self.targets, lambda target: self.models[target].ainvoke(messages, config=config, **kwargs)
+        )
+
+    def invoke(self, messages: Any, config: Any = None, **kwargs: Any) -> Any:
+        messages = self._fit(messages)
+        if loop_bridge.available():
+            return loop_bridge.run(self.ainvoke, messages, config, **kwargs)
+        return provider_router.run_sync(
+            self.targets, lambda target: self.models[target].invoke(messages, config=config, **kwargs)
+        )
+
+
+provider_router = ProviderRouter()
@@ -0,0 +1,403 @@
+import asyncio
+import hashlib
+import math
+import os
+import threading
+import time
+from collections import Counter, deque
+from contextlib import asynccontextmanager, contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Iterator, Optional, Tuple, TypeVar
+
+from api.services.redis_service import SecureRedisService
+from utils.logging import logger
+
+T = TypeVar("T")
+
+# Longest backoff after repeated rate limits without a Retry-After header
+_MAX_BACKOFF = 60.0
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_rate_limited(error: BaseException) -> bool:
+    """Whether an error of an LLM or search client is a rate limit response."""
+    if _status_code(error) == 429:
+        return True
+    return any(cls.__name__ == "RateLimitError" for cls in type(error).__mro__)
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Seconds the provider asked us to wait, from the Retry-After headers of the error's response."""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return max(0.0, float(headers["retry-after-ms"]) / 1000)
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _setting(service: str, name: str, default: float) -> float:
+    value = os.getenv(f"RATE_LIMIT_{service.upper()}_{name}") or os.getenv(f"RATE_LIMIT_{name}")
+    try:
+        return float(value) if value else default
+    except ValueError:
+        return default
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+class _Waiter:
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.loop = loop
+        self.event = asyncio.Event() if loop is not None else threading.Event()
+
+    def wake(self) -> None:
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.event.set)
+        else:
+            self.event.set()
+
+
+class _KeyLimiter:
+    """Token bucket and AIMD concurrency limit of one (service, API key)."""
+
+    def __init__(self, service: str, key_id: str):
+        self.service = service
+        self.key_id = key_id
+        self.rps = _setting(service, "RPS", 10.0)
+        self.burst = max(1.0, _setting(service, "BURST", self.rps))
+        self.max_concurrency = max(1.0, _setting(service, "MAX_CONCURRENCY", 32.0))
+        self.limit = min(self.max_concurrency, max(1.0, _setting(service, "CONCURRENCY", 8.0)))
+        self.tokens = self.burst
+        self.refilled_at = time.monotonic()
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.decreased_at = 0.0
+        self.consecutive_throttles = 0
+        self.waiters: Deque[_Waiter] = deque()
+        self.queue_delays: Deque[float] = deque(maxlen=500)
+        self.counts: Counter = Counter()
+        # Crew threads and the event loop share the limiter
+        self.lock = threading.Lock()
+
+    def acquire(self, blocking: bool = True) -> None:
+        waiter = _Waiter()
+        start_time = time.monotonic()
+        with self.lock:
+            self.waiters.append(waiter)
+        try:
+            while True:
+                with self.lock:
+                    granted, wait = self._try_grant(waiter)
+                    if not granted and not blocking:
+                        self._grant(waiter)
+                        granted = True
+                if granted:
+                    break
+                waiter.event.wait(wait)
+                waiter.event.clear()
+        except BaseException:
+            self._abandon(waiter)
+            raise
+        self._record_delay(time.monotonic() - start_time)
+
+    async def acquire_async(self) -> None:
+        waiter = _Waiter(asyncio.get_running_loop())
+        start_time = time.monotonic()
+        with self.lock:
+            self.waiters.append(waiter)
+        try:
+            while True:
+                with self.lock:
+                    granted, wait = self._try_grant(waiter)
+                if granted:
+                    break
+                try:
+                    await asyncio.wait_for(waiter.event.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                waiter.event.clear()
+        except BaseException:
+            self._abandon(waiter)
+            raise
+        self._record_delay(time.monotonic() - start_time)
+
+    def release(self, error: Optional[BaseException] = None) -> Optional[float]:
+        """
+        Free a slot and adapt the limits to the outcome.
+
+        Returns:
+            Optional[float]: The backoff in seconds when the call was rate limited.
+        """
+        with self.lock:
+            self.in_flight -= 1
+            backoff = None
+            if error is None:
+                # Additive increase: about one more slot per window of successful calls
+                self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+                self.consecutive_throttles = 0
+                self.counts["succeeded"] += 1
+            elif is_rate_limited(error):
+                now = time.monotonic()
+                self.counts["throttled"] += 1
+                self.consecutive_throttles += 1
+                # Multiplicative decrease, once per burst of rejections
+                if now - self.decreased_at >= 1.0:
+                    self.limit = max(1.0, self.limit / 2)
+                    self.decreased_at = now
+                backoff = retry_after(error)
+                if backoff is None:
+                    backoff = min(_MAX_BACKOFF, 2.0 ** (self.consecutive_throttles - 1))
+                self.block(backoff)
+            else:
+                self.counts["failed"] += 1
+            self._wake_head()
+            return backoff
+
+    def block(self, seconds: float) -> None:
+        """Hold back new calls for seconds; the lock must be held."""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            delays = sorted(self.queue_delays)
+            return {
+                "service": self.service,
+                "rps": self.rps,
+                "concurrency_limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "queued": len(self.waiters),
+                "blocked_seconds": round(max(0.0, self.blocked_until - time.monotonic()), 2),
+                "queue_delay_avg_seconds": round(sum(delays) / len(delays), 3) if delays else 0.0,
+                "queue_delay_p95_seconds": round(delays[min(len(delays) - 1, int(0.95 * len(delays)))], 3) if delays else 0.0,
+                "queue_delay_max_seconds": round(delays[-1], 3) if delays else 0.0,
+                **self.counts,
+            }
+
+    def _try_grant(self, waiter: _Waiter) -> Tuple[bool, Optional[float]]:
+        # Returns whether the waiter got a slot, else how long to sleep; None sleeps until woken
+        if self.waiters[0] is not waiter:
+            return False, None
+        now = time.monotonic()
+        if now < self.blocked_until:
+            return False, self.blocked_until - now
+        if self.in_flight >= int(self.limit):
+            return False, None
+        self.tokens = min(self.burst, self.tokens + (now - self.refilled_at) * self.rps)
+        self.refilled_at = now
+        if self.tokens < 1:
+            return False, (1 - self.tokens) / self.rps
+        self._grant(waiter)
+        return True, None
+
+    def _grant(self, waiter: _Waiter) -> None:
+        self.waiters.remove(waiter)
+        self.tokens -= 1
+        self.in_flight += 1
+        self.counts["acquired"] += 1
+        self._wake_head()
+
+    def _abandon(self, waiter: _Waiter) -> None:
+        with self.lock:
+            if waiter in self.waiters:
+                self.waiters.remove(waiter)
+                self._wake_head()
+
+    def _wake_head(self) -> None:
+        if self.waiters:
+            self.waiters[0].wake()
+
+    def _record_delay(self, delay: float) -> None:
+        with self.lock:
+            self.queue_delays.append(delay)
+
+
+class RateLimiter:
+    """
+    Bounds the request rate and concurrency per (service, API key).
+
+    Every key gets a token bucket of RATE_LIMIT_<SERVICE>_RPS requests per
+    second and an AIMD concurrency limit: each success raises the limit slowly,
+    a 429 halves it and holds the key back for the Retry-After of the response,
+    or an exponential backoff without one. Waiting callers are served in FIFO
+    order. With a Redis client, the per-second budget and the 429 backoffs are
+    shared by all workers. Callers on the event loop thread that cannot await
+    are never blocked; they are counted but let through.
+    """
+
+    def __init__(self, redis_client: Optional[SecureRedisService] = None):
+        self.enabled = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+        self.retries = int(os.getenv("RATE_LIMIT_RETRIES", "2"))
+        self.redis_client = redis_client
+        self._limiters: Dict[Tuple[str, str], _KeyLimiter] = {}
+        self._lock = threading.Lock()
+
+    def set_redis_client(self, redis_client: Optional[SecureRedisService]) -> None:
+        self.redis_client = redis_client
+
+    @asynccontextmanager
+    async def slot(self, service: str, api_key: Optional[str]) -> AsyncIterator[None]:
+        """Hold a request slot of the key for the duration of the block."""
+        if not self.enabled:
+            yield
+            return
+        limiter = self._limiter(service, api_key)
+        if self.redis_client is not None:
+            while True:
+                wait = await asyncio.to_thread(self._shared_wait, limiter)
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+        await limiter.acquire_async()
+        try:
+            yield
+        except Exception as e:
+            backoff = limiter.release(e)
+            if backoff is not None and self.redis_client is not None:
+                await asyncio.to_thread(self._share_backoff, limiter, backoff)
+            raise
+        except BaseException:
+            limiter.release()
+            raise
+        else:
+            limiter.release()
+
+    @contextmanager
+    def slot_sync(self, service: str, api_key: Optional[str]) -> Iterator[None]:
+        """Blocking counterpart of slot for worker threads."""
+        if not self.enabled:
+            yield
+            return
+        limiter = self._limiter(service, api_key)
+        # Blocking the loop's thread could wait on a slot only the loop can free
+        blocking = not _on_event_loop()
+        if blocking and self.redis_client is not None:
+            while True:
+                wait = self._shared_wait(limiter)
+                if wait <= 0:
+                    break
+                time.sleep(wait)
+        limiter.acquire(blocking=blocking)
+        try:
+            yield
+        except Exception as e:
+            backoff = limiter.release(e)
+            if backoff is not None and self.redis_client is not None:
+                self._share_backoff(limiter, backoff)
+            raise
+        except BaseException:
+            limiter.release()
+            raise
+        else:
+            limiter.release()
+
+    async def acall(
+        self,
+        service: str,
+        api_key: Optional[str],
+        fn: Callable[[], Awaitable[T]],
+        retries: Optional[int] = None,
+    ) -> T:
+        """Await fn() in a slot, retrying rate limited calls once the key's backoff has passed."""
+        retries = self.retries if retries is None else retries
+        for attempt in range(retries + 1):
+            try:
+                async with self.slot(service, api_key):
+                    return await fn()
+            except Exception as e:
+                if not is_rate_limited(e) or attempt == retries:
+                    raise
+                logger.warning(f"{service} rate limited (attempt {attempt + 1}/{retries + 1}), retrying after backoff")
+
+    def call(
+        self,
+        service: str,
+        api_key: Optional[str],
+        fn: Callable[[], T],
+        retries: Optional[int] = None,
+    ) -> T:
+        """Blocking counterpart of acall."""
+        retries = self.retries if retries is None else retries
+        if _on_event_loop():
+            # The backoff cannot be waited out without blocking the loop
+            retries = 0
+        for attempt in range(retries + 1):
+            try:
+                with self.slot_sync(service, api_key):
+                    return fn()
+            except Exception as e:
+                if not is_rate_limited(e) or attempt == retries:
+                    raise
+                logger.warning(f"{service} rate limited (attempt {attempt + 1}/{retries + 1}), retrying after backoff")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            limiters = list(self._limiters.values())
+        return {
+            "enabled": self.enabled,
+            "shared": self.redis_client is not None,
+            "keys": {f"{limiter.service}:{limiter.key_id}": limiter.stats() for limiter in limiters},
+        }
+
+    def _limiter(self, service: str, api_key: Optional[str]) -> _KeyLimiter:
+        # Keys are only kept as a digest, so stats and Redis never see them
+        key_id = hashlib.sha256((api_key or "").encode()).hexdigest()[:12]
+        with self._lock:
+            limiter = self._limiters.get((service, key_id))
+            if limiter is None:
+                limiter = self._limiters[(service, key_id)] = _KeyLimiter(service, key_id)
+            return limiter
+
+    def _shared_wait(self, limiter: _KeyLimiter) -> float:
+        """Seconds until the deployment-wide budget of the key admits another call."""
+        prefix = f"rate_limit:{limiter.service}:{limiter.key_id}"
+        now = time.time()
+        window = int(now)
+        try:
+            pipe = self.redis_client.pipeline()
+            pipe.pttl(f"{prefix}:blocked")
+            pipe.incr(f"{prefix}:{window}")
+            pipe.expire(f"{prefix}:{window}", 2)
+            blocked_ms, count, _ = pipe.execute()
+        except Exception as e:
+            logger.error(f"Error reading shared rate limit of {limiter.service}: {str(e)}")
+            return 0.0
+        if blocked_ms and blocked_ms > 0:
+            return blocked_ms / 1000
+        if count > math.ceil(limiter.rps):
+            limiter.counts["shared_waits"] += 1
+            return window + 1 - now
+        return 0.0
+
+    def _share_backoff(self, limiter: _KeyLimiter, backoff: float) -> None:
+        try:
+            self.redis_client.psetex(
+                f"rate_limit:{limiter.service}:{limiter.key_id}:blocked", max(1, int(backoff * 1000)), 1
+            )
+        except Exception as e:
+            logger.error(f"Error sharing rate limit backoff of {limiter.service}: {str(e)}")
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,212 @@
+import hashlib
+import math
+import os
+import re
+import time
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from services.query_router_service import QueryType
+
+_TOKEN_PATTERN = re.compile(r"[\w&$%]+")
+
+# Words whose presence or absence does not change a routing decision
+_STOPWORDS = frozenset({
+    "a", "an", "the", "is", "are", "was", "were", "be", "of", "on", "in", "for", "to",
+    "me", "please", "can", "could", "you", "would", "i", "my", "what", "whats", "s",
+    "about", "tell", "give", "show", "do", "does", "and", "with", "some", "any",
+})
+
+
+@dataclass
+class _CachedRoute:
+    route_type: str
+    parameters: Dict[str, Any]
+    query: str
+    tokens: Counter
+    neighbour_key: Tuple[str, str]
+    version: str
+    expires_at: float
+
+
+# Weight of filler words relative to content words in the similarity
+_STOPWORD_WEIGHT = 0.25
+
+
+def _tokens(query: str) -> List[str]:
+    return _TOKEN_PATTERN.findall(query.lower().replace("'s", "").replace("'", ""))
+
+
+def _weights(tokens: Counter) -> Dict[str, float]:
+    return {t: count * (_STOPWORD_WEIGHT if t in _STOPWORDS else 1.0) for t, count in tokens.items()}
+
+
+def _cosine(a: Counter, b: Counter) -> float:
+    a_weights, b_weights = _weights(a), _weights(b)
+    dot = sum(weight * b_weights[token] for token, weight in a_weights.items() if token in b_weights)
+    norm = math.sqrt(sum(w * w for w in a_weights.values())) * math.sqrt(sum(w * w for w in b_weights.values()))
+    return dot / norm if norm else 0.0
+
+
+class RouteCache:
+    """
+    In-process cache of query router decisions.
+
+    Entries are keyed on the normalised query and a short fingerprint of the
+    conversation. A lookup first tries the exact key, then the nearest cached
+    query with the same fingerprint and the same content words (so only word
+    order, casing, punctuation or filler words may differ), above a cosine
+    similarity threshold. Each entry records the routing version of its agent
+    type and is ignored once the prompt or that agent's registry entry changes.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: Optional[float] = None,
+        similarity_threshold: Optional[float] = None,
+        max_entries: int = 5000,
+    ):
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else float(os.getenv("ROUTE_CACHE_TTL", "1800"))
+        self.similarity_threshold = (
+            similarity_threshold if similarity_threshold is not None
+            else float(os.getenv("ROUTE_CACHE_SIMILARITY", "0.85"))
+        )
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, _CachedRoute]" = OrderedDict()
+        # (fingerprint, content words) -> exact keys of the entries sharing them
+        self._neighbours: Dict[Tuple[str, str], List[str]] = {}
+        self._stats: Counter = Counter()
+
+    @staticmethod
+    def fingerprint(history: Iterable[Any], num_docs: int = 0, turns: int = 2) -> str:
+        """
+        Fingerprint the conversation context that can change a routing decision.
+
+        Args:
+            history: Router history messages, only the last `turns` are used.
+            num_docs (int): Number of uploaded documents.
+            turns (int): Number of trailing messages to include.
+        """
+        recent = [" ".join(_tokens(str(getattr(m, "content", m)))) for m in list(history)[-turns:]]
+        payload = "\n".join(recent) + f"\ndocs={num_docs > 0}"
+        return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+    def get(self, query: str, fingerprint: str, version_for: Callable[[str], str]) -> Optional[QueryType]:
+        """
+        Return the cached route for a query, with query parameters rewritten to it.
+
+        Args:
+            query (str): The user query.
+            fingerprint (str): Context fingerprint from fingerprint().
+            version_for: Returns the current routing version of an agent type.
+        """
+        tokens = _tokens(query)
+        key = self._key(tokens, fingerprint)
+        entry = self._valid_entry(key, version_for)
+        if entry is not None:
+            self._stats["exact_hits"] += 1
+        else:
+            entry = self._nearest(tokens, fingerprint, version_for)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["similar_hits"] += 1
+
+        # Parameters that carry the raw query must reflect the new wording
+        parameters = {
+            name: query if value == entry.query else value
+            for name, value in entry.parameters.items()
+        }
+        return QueryType(type=entry.route_type, parameters=parameters)
+
+    def put(self, query: str, fingerprint: str, route: QueryType, version: str) -> None:
+        """Cache a routing decision under the version of its agent type."""
+        tokens = _tokens(query)
+        if not tokens:
+            return
+        key = self._key(tokens, fingerprint)
+        neighbour_key = (fingerprint, self._content_key(tokens))
+        self._remove(key)
+        self._entries[key] = _CachedRoute(
+            route_type=route.type,
+            parameters=dict(route.parameters),
+            query=query,
+            tokens=Counter(tokens),
+            neighbour_key=neighbour_key,
+            version=version,
+            expires_at=time.monotonic() + self.ttl_seconds,
+        )
+        self._neighbours.setdefault(neighbour_key, []).append(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def invalidate(self, agent_type: Optional[str] = None) -> int:
+        """
+        Drop cached routes to an agent type, or every route if none is given.
+
+        Returns:
+            int: The number of dropped entries.
+        """
+        keys = [k for k, e in self._entries.items() if agent_type is None or e.route_type == agent_type]
+        for key in keys:
+            self._remove(key)
+        return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._stats["exact_hits"] + self._stats["similar_hits"] + self._stats["misses"]
+        hits = self._stats["exact_hits"] + self._stats["similar_hits"]
+        return {
+            "entries": len(self._entries),
+            "ttl_seconds": self.ttl_seconds,
+            "similarity_threshold": self.similarity_threshold,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            **self._stats,
+        }
+
+    @staticmethod
+    def _key(tokens: List[str], fingerprint: str) -> str:
+        return hashlib.sha256(f"{fingerprint}|{' '.join(tokens)}".encode()).hexdigest()
+
+    @staticmethod
+    def _content_key(tokens: List[str]) -> str:
+        return " ".join(sorted({t for t in tokens if t not in _STOPWORDS}))
+
+    def _valid_entry(self, key: str, version_for: Callable[[str], str]) -> Optional[_CachedRoute]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic() or entry.version != version_for(entry.route_type):
+            self._stats["expired" if entry.expires_at <= time.monotonic() else "invalidated"] += 1
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _nearest(self, tokens: List[str], fingerprint: str, version_for: Callable[[str], str]) -> Optional[_CachedRoute]:
+        content_key = self._content_key(tokens)
+        if not content_key:
+            return None
+        query_tokens = Counter(tokens)
+        best, best_similarity = None, self.similarity_threshold
+        for key in list(self._neighbours.get((fingerprint, content_key), ())):
+            entry = self._valid_entry(key, version_for)
+            if entry is None:
+                continue
+            similarity = _cosine(query_tokens, entry.tokens)
+            if similarity >= best_similarity:
+                best, best_similarity = entry, similarity
+        return best
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        keys = self._neighbours.get(entry.neighbour_key, [])
+        if key in keys:
+            keys.remove(key)
+        if not keys:
+            self._neighbours.pop(entry.neighbour_key, None)
+
+
+route_cache = RouteCache()
@@ -0,0 +1,92 @@
+import asyncio
+import os
+import time
+from collections import Counter, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from utils.logging import logger
+
+# Builds a started runtime that is not yet bound to a conversation, with its binding
+RuntimeFactory = Callable[[], Awaitable[Tuple[Any, Any]]]
+
+
+class RuntimePool:
+    """
+    Keeps a few agent runtimes built and started ahead of the connections that need them.
+
+    Runtimes in the pool are not tied to any conversation. A connection takes
+    one and binds it to its session, and the background task immediately builds
+    a replacement. When the pool is empty the caller builds a runtime itself,
+    so a burst of connections is never slower than without the pool.
+    """
+
+    def __init__(self, factory: RuntimeFactory, size: Optional[int] = None, retry_delay: float = 5.0):
+        self.size = size if size is not None else int(os.getenv("RUNTIME_POOL_SIZE", "4"))
+        self.retry_delay = retry_delay
+        self._factory = factory
+        self._ready: Deque[Tuple[Any, Any]] = deque()
+        self._refill = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._build_seconds = 0.0
+        self._stats: Counter = Counter()
+
+    def start(self) -> None:
+        """Start filling the pool in the background."""
+        if self.size <= 0 or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._fill())
+
+    def acquire(self) -> Optional[Tuple[Any, Any]]:
+        """
+        Take a warm runtime without waiting.
+
+        Returns:
+            Optional[Tuple[Any, Any]]: The runtime and its binding, or None if the pool is empty.
+        """
+        self._refill.set()
+        if not self._ready:
+            self._stats["misses"] += 1
+            return None
+        self._stats["hits"] += 1
+        return self._ready.popleft()
+
+    async def close(self) -> None:
+        """Stop refilling and close the runtimes still waiting in the pool."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        while self._ready:
+            runtime, _ = self._ready.popleft()
+            try:
+                await runtime.close()
+            except Exception as e:
+                logger.error(f"Error closing pooled agent runtime: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        built = self._stats["built"]
+        return {
+            "size": self.size,
+            "ready": len(self._ready),
+            "avg_build_seconds": round(self._build_seconds / built, 3) if built else None,
+            **self._stats,
+        }
+
+    async def _fill(self) -> None:
+        while True:
+            while len(self._ready) < self.size:
+                start_time = time.monotonic()
+                try:
+                    item = await self._factory()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self._stats["failed"] += 1
+                    logger.error(f"Error building pooled agent runtime: {str(e)}", exc_info=True)
+                    await asyncio.sleep(self.retry_delay)
+                    continue
+                self._ready.append(item)
+                self._stats["built"] += 1
+                self._build_seconds += time.monotonic() - start_time
+            self._refill.clear()
+            await self._refill.wait()
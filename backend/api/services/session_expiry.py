@@ -0,0 +1,102 @@
+import heapq
+import itertools
+import time
+from datetime import timedelta
+from typing import Dict, List, Optional, Tuple
+
+
+class SessionExpiryQueue:
+    """
+    Deadline min-heap for idle session expiry.
+
+    Touching a session pushes a fresh deadline in O(log n); the previous heap
+    entry is invalidated lazily instead of being searched for. Expiry only pops
+    entries whose deadline has passed, so the cost of a sweep scales with the
+    number of expired sessions rather than the number of tracked sessions.
+    The heap is rebuilt from the live deadlines whenever stale entries dominate,
+    which keeps memory proportional to the live session count during bursts.
+    """
+
+    def __init__(self, timeout: timedelta, compaction_ratio: float = 2.0, min_compaction_size: int = 64):
+        self.timeout = timeout
+        self._timeout_seconds = timeout.total_seconds()
+        self._compaction_ratio = compaction_ratio
+        self._min_compaction_size = min_compaction_size
+        self._heap: List[Tuple[float, int, str]] = []
+        # session_key -> (deadline, sequence) of the only valid heap entry
+        self._live: Dict[str, Tuple[float, int]] = {}
+        self._sequence = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._live)
+
+    def __contains__(self, session_key: str) -> bool:
+        return session_key in self._live
+
+    def touch(self, session_key: str, now: Optional[float] = None) -> float:
+        """
+        Reschedule a session to expire one timeout from now.
+
+        Args:
+            session_key (str): The user_id:conversation_id session key.
+            now (Optional[float]): Monotonic timestamp, defaults to time.monotonic().
+
+        Returns:
+            float: The new monotonic deadline for the session.
+        """
+        now = time.monotonic() if now is None else now
+        deadline = now + self._timeout_seconds
+        sequence = next(self._sequence)
+        self._live[session_key] = (deadline, sequence)
+        heapq.heappush(self._heap, (deadline, sequence, session_key))
+        self._maybe_compact()
+        return deadline
+
+    def discard(self, session_key: str) -> None:
+        """Stop tracking a session; its heap entries become stale."""
+        self._live.pop(session_key, None)
+        self._maybe_compact()
+
+    def next_deadline(self) -> Optional[float]:
+        """Return the earliest live deadline, or None if nothing is tracked."""
+        self._drop_stale_head()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_expired(self, now: Optional[float] = None) -> List[str]:
+        """
+        Remove and return every session whose deadline has passed.
+
+        Args:
+            now (Optional[float]): Monotonic timestamp, defaults to time.monotonic().
+
+        Returns:
+            List[str]: Expired session keys in deadline order.
+        """
+        now = time.monotonic() if now is None else now
+        expired = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, sequence, session_key = heapq.heappop(self._heap)
+            if self._live.get(session_key) == (deadline, sequence):
+                del self._live[session_key]
+                expired.append(session_key)
+        return expired
+
+    def stats(self) -> Dict[str, int]:
+        """Return the live and total heap sizes."""
+        return {"live_sessions": len(self._live), "heap_entries": len(self._heap)}
+
+    def _drop_stale_head(self) -> None:
+        while self._heap:
+            deadline, sequence, session_key = self._heap[0]
+            if self._live.get(session_key) == (deadline, sequence):
+                return
+            heapq.heappop(self._heap)
+
+    def _maybe_compact(self) -> None:
+        limit = max(self._min_compaction_size, int(len(self._live) * self._compaction_ratio))
+        if len(self._heap) > limit:
+            self._heap = [
+                (deadline, sequence, session_key)
+                for session_key, (deadline, sequence) in self._live.items()
+            ]
+            heapq.heapify(self._heap)
@@ -0,0 +1,233 @@
+import os
+import sys
+import time
+from collections import Counter, OrderedDict, deque
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from utils.logging import logger
+
+_SCALAR_TYPES = (str, bytes, bytearray, int, float, bool, type(None))
+
+
+def estimate_size(value: Any) -> int:
+    """
+    Estimate the memory held by a value, following containers and object attributes.
+
+    Shared objects are counted once. The estimate is meant for relative
+    accounting between entries, not as an exact measurement.
+    """
+    seen = set()
+    stack = [value]
+    size = 0
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        size += sys.getsizeof(item, 0)
+        if isinstance(item, _SCALAR_TYPES):
+            continue
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset, deque)):
+            stack.extend(item)
+        elif hasattr(item, "__dict__") and not callable(item):
+            stack.append(vars(item))
+    return size
+
+
+@dataclass
+class _Namespace:
+    ttl: Optional[float]
+    load: Optional[Callable[[Hashable], Any]]
+    sizer: Callable[[Any], int]
+    evictable: Optional[Callable[[Any], bool]] = None
+
+
+@dataclass
+class _Entry:
+    value: Any
+    size: int
+    expires_at: Optional[float]
+
+
+class SessionStore:
+    """
+    Bounded in-memory store for per-session state of the worker.
+
+    Entries live in namespaces, each with its own idle TTL and optional load
+    hook. The store is capped by entry count and by the estimated bytes of its
+    values. The least recently used entries are evicted first. State that must
+    survive eviction is written through to Redis by its owner, and a miss calls
+    the namespace's load hook to bring it back. Entries that
+    cannot be rebuilt can be kept out of eviction by their namespace's
+    evictable hook; they still expire after their idle TTL.
+    """
+
+    def __init__(
+        self,
+        max_bytes: Optional[int] = None,
+        max_entries: Optional[int] = None,
+        default_ttl: Optional[float] = None,
+        sweep_interval: float = 30.0,
+    ):
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.getenv("SESSION_STORE_MAX_BYTES", str(256 * 1024 * 1024)))
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv("SESSION_STORE_MAX_ENTRIES", "20000"))
+        self.default_ttl = default_ttl if default_ttl is not None else float(os.getenv("SESSION_STORE_TTL", "3600"))
+        self.sweep_interval = sweep_interval
+        self._namespaces: Dict[str, _Namespace] = {}
+        self._entries: "OrderedDict[Tuple[str, Hashable], _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._next_sweep = time.monotonic() + sweep_interval
+        self._stats: Counter = Counter()
+
+    def register_namespace(
+        self,
+        namespace: str,
+        ttl: Optional[float] = None,
+        load: Optional[Callable[[Hashable], Any]] = None,
+        sizer: Callable[[Any], int] = estimate_size,
+        evictable: Optional[Callable[[Any], bool]] = None,
+    ) -> None:
+        """
+        Configure a namespace. Unregistered namespaces use the default TTL and no hooks.
+
+        Args:
+            namespace (str): Name of the namespace.
+            ttl (Optional[float]): Idle seconds before an entry expires, defaults to the store's TTL.
+            load: Called with the key on a miss; a non-None result is stored and returned.
+            sizer: Estimates the bytes held by a value.
+            evictable: Whether a value may be evicted to bound the store, checked
+                at eviction time; all values are evictable by default.
+        """
+        self._namespaces[namespace] = _Namespace(
+            ttl=ttl if ttl is not None else self.default_ttl, load=load, sizer=sizer, evictable=evictable
+        )
+
+    def get(self, namespace: str, key: Hashable, default: Any = None) -> Any:
+        """Return a value, refreshing its recency and TTL, or load it on a miss."""
+        self._maybe_sweep()
+        entry = self._entries.get((namespace, key))
+        if entry is not None and entry.expires_at is not None and entry.expires_at <= time.monotonic():
+            self._evict((namespace, key), "expired")
+            entry = None
+        if entry is not None:
+            self._stats["hits"] += 1
+            self._entries.move_to_end((namespace, key))
+            entry.expires_at = self._expiry(namespace)
+            return entry.value
+
+        self._stats["misses"] += 1
+        load = self._namespace(namespace).load
+        if load is not None:
+            try:
+                value = load(key)
+            except Exception as e:
+                logger.error(f"Error loading session state {namespace}:{key}: {str(e)}")
+                value = None
+            if value is not None:
+                self._stats["loads"] += 1
+                self.set(namespace, key, value)
+                return value
+        return default
+
+    def set(self, namespace: str, key: Hashable, value: Any) -> None:
+        """Store a value and evict entries until the store is within its bounds."""
+        self._maybe_sweep()
+        self._remove((namespace, key))
+        size = self._namespace(namespace).sizer(value)
+        self._entries[(namespace, key)] = _Entry(value=value, size=size, expires_at=self._expiry(namespace))
+        self._bytes += size
+        self._enforce_bounds(keep=(namespace, key))
+
+    def resize(self, namespace: str, key: Hashable) -> None:
+        """Re-estimate the size of a value that was mutated in place."""
+        entry = self._entries.get((namespace, key))
+        if entry is None:
+            return
+        size = self._namespace(namespace).sizer(entry.value)
+        self._bytes += size - entry.size
+        entry.size = size
+        self._enforce_bounds(keep=(namespace, key))
+
+    def pop(self, namespace: str, key: Hashable, default: Any = None) -> Any:
+        """Remove and return a value."""
+        entry = self._remove((namespace, key))
+        return default if entry is None else entry.value
+
+    def evict_key(self, key: Hashable) -> int:
+        """
+        Evict the entries stored under a key in every namespace.
+
+        Returns:
+            int: The number of evicted entries.
+        """
+        keys = [k for k in self._entries if k[1] == key]
+        for entry_key in keys:
+            self._evict(entry_key, "released")
+        return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        namespaces: Dict[str, Dict[str, int]] = {}
+        for (namespace, _), entry in self._entries.items():
+            usage = namespaces.setdefault(namespace, {"entries": 0, "bytes": 0})
+            usage["entries"] += 1
+            usage["bytes"] += entry.size
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "namespaces": namespaces,
+            **self._stats,
+        }
+
+    def _namespace(self, namespace: str) -> _Namespace:
+        config = self._namespaces.get(namespace)
+        if config is None:
+            config = _Namespace(ttl=self.default_ttl, load=None, sizer=estimate_size)
+            self._namespaces[namespace] = config
+        return config
+
+    def _expiry(self, namespace: str) -> Optional[float]:
+        ttl = self._namespace(namespace).ttl
+        return time.monotonic() + ttl if ttl else None
+
+    def _enforce_bounds(self, keep: Tuple[str, Hashable]) -> None:
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            # A single entry larger than the budget is kept until something newer arrives
+            oldest = next((k for k in self._entries if k != keep and self._is_evictable(k)), None)
+            if oldest is None:
+                self._stats["over_budget"] += 1
+                break
+            self._evict(oldest, "evicted_entries" if len(self._entries) > self.max_entries else "evicted_bytes")
+
+    def _is_evictable(self, entry_key: Tuple[str, Hashable]) -> bool:
+        evictable = self._namespace(entry_key[0]).evictable
+        return evictable is None or evictable(self._entries[entry_key].value)
+
+    def _maybe_sweep(self) -> None:
+        now = time.monotonic()
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + self.sweep_interval
+        expired = [k for k, e in self._entries.items() if e.expires_at is not None and e.expires_at <= now]
+        for key in expired:
+            self._evict(key, "expired")
+
+    def _evict(self, entry_key: Tuple[str, Hashable], reason: str) -> None:
+        entry = self._remove(entry_key)
+        if entry is None:
+            return
+        self._stats[reason] += 1
+
+    def _remove(self, entry_key: Tuple[str, Hashable]) -> Optional[_Entry]:
+        entry = self._entries.pop(entry_key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+        return entry
+
+
+session_store = SessionStore()
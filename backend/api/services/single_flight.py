@@ -0,0 +1,314 @@
+import asyncio
+import copy
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from api.services.redis_service import SecureRedisService
+from utils.cancellation import CancellationToken, OperationCancelledError, current_cancellation_token
+from utils.logging import logger
+
+RELAY_POLL_INTERVAL_SECONDS = 0.2
+
+
+def _without_usage(result: Any) -> Any:
+    """Zero the token counts of a (value, usage) result, so shared results are not billed twice."""
+    if isinstance(result, tuple) and len(result) == 2 and isinstance(result[1], dict):
+        value, usage = result
+        return value, {k: 0 if isinstance(v, (int, float)) else v for k, v in usage.items()}
+    return result
+
+
+@dataclass
+class _Flight:
+    key: str
+    token: CancellationToken
+    # (user_id, run_id, message_id) of the request that started the execution
+    leader: Tuple[str, str, str]
+    task: Optional[asyncio.Task] = None
+    waiters: int = 0
+    thoughts: List[Dict[str, Any]] = field(default_factory=list)
+    followers: List[Tuple[str, str, str]] = field(default_factory=list)
+    pubsub: Any = None
+    # Serialises the pubsub reads, which run in worker threads
+    relay_lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    relay_stop: asyncio.Event = field(default_factory=asyncio.Event)
+
+
+class SingleFlight:
+    """
+    Coalesces identical in-flight agent executions.
+
+    The first request for a key runs the execution; identical requests arriving
+    while it runs attach to it and receive the same result. Agent thoughts the
+    leader publishes on its agent_thoughts channel are recorded and relayed to
+    every follower's channel, rewritten with the follower's ids, with earlier
+    thoughts replayed when a follower attaches. Successful results are kept for
+    a short TTL so requests arriving just after completion are served directly.
+    Only the request that ran the execution gets its token usage; for results
+    shaped (value, usage) everyone else gets the usage zeroed.
+
+    The shared execution only stops once every attached request is cancelled.
+    Redis calls of the relay run in worker threads so a slow Redis does not
+    stall the event loop.
+    """
+
+    def __init__(
+        self,
+        redis_client: Optional[SecureRedisService] = None,
+        result_ttl: Optional[float] = None,
+        max_cached_results: int = 256,
+    ):
+        self.redis_client = redis_client
+        self.result_ttl = result_ttl if result_ttl is not None else float(os.getenv("SINGLE_FLIGHT_RESULT_TTL", "300"))
+        self.max_cached_results = max_cached_results
+        self._flights: Dict[str, _Flight] = {}
+        self._results: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._executions = 0
+        self._coalesced = 0
+        self._cache_hits = 0
+
+    def set_redis_client(self, redis_client: SecureRedisService) -> None:
+        """Set the client used to relay agent thoughts to followers."""
+        self.redis_client = redis_client
+
+    @staticmethod
+    def make_key(
+        agent_type: str,
+        parameters: Dict[str, Any],
+        provider: str,
+        now: Optional[datetime] = None,
+    ) -> str:
+        """
+        Build the coalescing key of a request.
+
+        Parameter values are case and whitespace normalised and empty values are
+        dropped, and the key is bucketed by UTC day so results never outlive the
+        market day they were computed for.
+        """
+        day = (now or datetime.now(timezone.utc)).strftime("%Y-%m-%d")
+        normalised = {
+            k: SingleFlight._normalise(v)
+            for k, v in parameters.items()
+            if v not in (None, "", [], {})
+        }
+        payload = json.dumps([agent_type, provider, day, normalised], sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    @staticmethod
+    def _normalise(value: Any) -> Any:
+        if isinstance(value, str):
+            return " ".join(value.lower().split())
+        if isinstance(value, (list, tuple)):
+            return sorted(json.dumps(SingleFlight._normalise(v), sort_keys=True) for v in value)
+        if isinstance(value, dict):
+            return {k: SingleFlight._normalise(v) for k, v in value.items()}
+        return value
+
+    async def run(
+        self,
+        key: str,
+        func: Callable[[CancellationToken], Awaitable[Any]],
+        user_id: str,
+        run_id: str,
+        message_id: str,
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> Any:
+        """
+        Run func once per key and share its result with identical concurrent requests.
+
+        Args:
+            key (str): Coalescing key from make_key.
+            func: Coroutine function running the execution; it receives the token
+                of the shared execution and must use it instead of the caller's.
+            user_id (str): The requesting user.
+            run_id (str): The requesting conversation, used for the thoughts channel.
+            message_id (str): The requesting message.
+            cancellation_token (Optional[CancellationToken]): Token of the request,
+                defaults to the current one.
+
+        Returns:
+            Any: A copy of the result of func, with the usage zeroed unless this
+                request ran it.
+
+        Raises:
+            OperationCancelledError: If this request is cancelled before the result is ready.
+        """
+        cancellation_token = cancellation_token or current_cancellation_token.get()
+        if cancellation_token is not None:
+            cancellation_token.raise_if_cancelled()
+
+        cached = self._results.get(key)
+        if cached is not None:
+            expires_at, result = cached
+            if expires_at > time.monotonic():
+                self._cache_hits += 1
+                logger.info(logger.format_message(f"{user_id}:{run_id}", "Serving result from single-flight cache"))
+                return _without_usage(copy.deepcopy(result))
+            del self._results[key]
+
+        flight = self._flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = self._start(key, func, (user_id, run_id, message_id))
+            flight.waiters += 1
+        else:
+            self._coalesced += 1
+            logger.info(logger.format_message(f"{user_id}:{run_id}", "Attaching to identical in-flight execution"))
+            # Counted before attaching so the execution is kept alive meanwhile
+            flight.waiters += 1
+            try:
+                await self._attach_follower(flight, (user_id, run_id, message_id))
+            except BaseException:
+                flight.waiters -= 1
+                raise
+        return await self._wait(flight, cancellation_token, leader)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": len(self._flights),
+            "cached_results": len(self._results),
+            "executions": self._executions,
+            "coalesced": self._coalesced,
+            "cache_hits": self._cache_hits,
+        }
+
+    def _start(self, key: str, func: Callable[[CancellationToken], Awaitable[Any]], leader: Tuple[str, str, str]) -> _Flight:
+        flight = _Flight(key=key, token=CancellationToken(), leader=leader)
+        if self.redis_client is not None:
+            # Subscribed by _execute, before the execution can publish anything
+            flight.pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+
+        flight.task = asyncio.create_task(self._execute(flight, func))
+        flight.task.add_done_callback(lambda task: self._finish(flight, task))
+        self._flights[key] = flight
+        self._executions += 1
+        return flight
+
+    async def _execute(self, flight: _Flight, func: Callable[[CancellationToken], Awaitable[Any]]) -> Any:
+        # The task runs in a copy of the leader's context; switch it to the shared token
+        current_cancellation_token.set(flight.token)
+        relay = None
+        if flight.pubsub is not None:
+            async with flight.relay_lock:
+                try:
+                    await asyncio.to_thread(flight.pubsub.subscribe, f"agent_thoughts:{flight.leader[0]}:{flight.leader[1]}")
+                    relay = asyncio.create_task(self._relay(flight))
+                except Exception as e:
+                    logger.error(f"Error subscribing to leader thoughts: {str(e)}")
+                    flight.pubsub = None
+        try:
+            return await func(flight.token)
+        finally:
+            if relay is not None:
+                # Let a running drain finish rather than cancelling it mid-read
+                flight.relay_stop.set()
+                await relay
+                async with flight.relay_lock:
+                    await asyncio.to_thread(self._drain, flight)
+                try:
+                    await asyncio.to_thread(flight.pubsub.close)
+                except Exception as e:
+                    logger.error(f"Error closing single-flight pubsub: {str(e)}")
+
+    async def _relay(self, flight: _Flight) -> None:
+        while not flight.relay_stop.is_set():
+            async with flight.relay_lock:
+                await asyncio.to_thread(self._drain, flight)
+            try:
+                await asyncio.wait_for(flight.relay_stop.wait(), RELAY_POLL_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    def _drain(self, flight: _Flight) -> None:
+        """Record pending leader thoughts and forward them to the followers. Blocks on Redis."""
+        leader_message_id = flight.leader[2]
+        while True:
+            try:
+                message = flight.pubsub.get_message(timeout=0)
+            except Exception as e:
+                logger.error(f"Error reading leader thoughts: {str(e)}")
+                return
+            if not message:
+                return
+            if message["type"] != "message":
+                continue
+            try:
+                thought = json.loads(message["data"])
+            except (TypeError, ValueError):
+                continue
+            # Crews without message ids publish None; anything else belongs to another request
+            if thought.get("message_id") not in (None, leader_message_id):
+                continue
+            if thought.get("type") != "token":
+                # Late followers get the completed steps, not the token deltas
+                flight.thoughts.append(thought)
+            for follower in flight.followers:
+                self._publish_thought(thought, follower)
+
+    async def _attach_follower(self, flight: _Flight, follower: Tuple[str, str, str]) -> None:
+        if flight.pubsub is None:
+            return
+        async with flight.relay_lock:
+            await asyncio.to_thread(self._replay, flight, follower)
+
+    def _replay(self, flight: _Flight, follower: Tuple[str, str, str]) -> None:
+        """Send the thoughts so far to a new follower and add it to the relay. Blocks on Redis."""
+        self._drain(flight)
+        for thought in flight.thoughts:
+            self._publish_thought(thought, follower)
+        flight.followers.append(follower)
+
+    def _publish_thought(self, thought: Dict[str, Any], follower: Tuple[str, str, str]) -> None:
+        user_id, run_id, message_id = follower
+        relayed = {**thought, "user_id": user_id, "run_id": run_id, "message_id": message_id}
+        try:
+            self.redis_client.publish(f"agent_thoughts:{user_id}:{run_id}", json.dumps(relayed))
+        except Exception as e:
+            logger.error(f"Error relaying thought to {user_id}:{run_id}: {str(e)}")
+
+    async def _wait(self, flight: _Flight, cancellation_token: Optional[CancellationToken], leader: bool) -> Any:
+        loop = asyncio.get_running_loop()
+        cancelled = asyncio.Event()
+        if cancellation_token is not None:
+            cancellation_token.add_callback(lambda: loop.call_soon_threadsafe(cancelled.set))
+        cancel_wait = asyncio.create_task(cancelled.wait())
+        try:
+            await asyncio.wait({flight.task, cancel_wait}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            cancel_wait.cancel()
+            flight.waiters -= 1
+
+        if flight.task.done():
+            result = copy.deepcopy(flight.task.result())
+            return result if leader else _without_usage(result)
+
+        if flight.waiters == 0:
+            logger.info(logger.format_message(None, "Cancelling shared execution, no requests left waiting"))
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+            flight.token.cancel("all coalesced requests cancelled")
+        raise OperationCancelledError(f"Operation cancelled: {cancellation_token.reason}")
+
+    def _finish(self, flight: _Flight, task: asyncio.Task) -> None:
+        if self._flights.get(flight.key) is flight:
+            del self._flights[flight.key]
+        if task.cancelled():
+            return
+        # Retrieved here as well, since nobody awaits the task once every request has cancelled
+        if task.exception() is not None:
+            # Errors are delivered to the attached requests and never cached
+            return
+        if self.result_ttl > 0 and not flight.token.is_cancelled:
+            self._results[flight.key] = (time.monotonic() + self.result_ttl, task.result())
+            self._results.move_to_end(flight.key)
+            while len(self._results) > self.max_cached_results:
+                self._results.popitem(last=False)
+
+
+single_flight = SingleFlight()
@@ -0,0 +1,369 @@
+import asyncio
+import contextvars
+import functools
+import json
+import os
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from enum import Enum
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+from utils.cancellation import OperationCancelledError, current_cancellation_token
+from utils.logging import logger
+
+
+class WorkloadClass(str, Enum):
+    """Scheduling classes with independent concurrency budgets."""
+    INTERACTIVE = "interactive"
+    CREW = "crew"
+    DEEP_RESEARCH = "deep_research"
+
+
+class SchedulerSaturatedError(Exception):
+    """Raised when a workload class cannot accept more queued work."""
+
+    def __init__(self, workload_class: WorkloadClass, retry_after: float):
+        self.workload_class = workload_class
+        self.retry_after = retry_after
+        super().__init__(
+            f"{workload_class.value} workloads are saturated, retry in {retry_after:.0f} seconds"
+        )
+
+
+@dataclass
+class WorkloadLimits:
+    max_concurrent: int
+    max_queued: int
+    max_queued_per_user: int
+    max_running_per_user: int
+
+
+@dataclass
+class _Waiter:
+    user_id: str
+    conversation_id: Optional[str]
+    message_id: Optional[str]
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class _ClassState:
+    def __init__(self, limits: WorkloadLimits, default_service_time: float):
+        self.limits = limits
+        self.running = 0
+        self.running_per_user: Dict[str, int] = {}
+        # user_id -> pending waiters; order of keys is the round-robin order
+        self.waiting: "OrderedDict[str, Deque[_Waiter]]" = OrderedDict()
+        self.queued = 0
+        self.avg_service_time = default_service_time
+        self.completed = 0
+        self.rejected = 0
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def _default_limits() -> Dict[WorkloadClass, WorkloadLimits]:
+    return {
+        WorkloadClass.INTERACTIVE: WorkloadLimits(
+            max_concurrent=_env_int("SCHEDULER_INTERACTIVE_CONCURRENCY", 32),
+            max_queued=_env_int("SCHEDULER_INTERACTIVE_QUEUE", 128),
+            max_queued_per_user=_env_int("SCHEDULER_INTERACTIVE_QUEUE_PER_USER", 4),
+            max_running_per_user=_env_int("SCHEDULER_INTERACTIVE_RUNNING_PER_USER", 4),
+        ),
+        WorkloadClass.CREW: WorkloadLimits(
+            max_concurrent=_env_int("SCHEDULER_CREW_CONCURRENCY", 4),
+            max_queued=_env_int("SCHEDULER_CREW_QUEUE", 32),
+            max_queued_per_user=_env_int("SCHEDULER_CREW_QUEUE_PER_USER", 2),
+            max_running_per_user=_env_int("SCHEDULER_CREW_RUNNING_PER_USER", 1),
+        ),
+        WorkloadClass.DEEP_RESEARCH: WorkloadLimits(
+            max_concurrent=_env_int("SCHEDULER_DEEP_RESEARCH_CONCURRENCY", 2),
+            max_queued=_env_int("SCHEDULER_DEEP_RESEARCH_QUEUE", 16),
+            max_queued_per_user=_env_int("SCHEDULER_DEEP_RESEARCH_QUEUE_PER_USER", 1),
+            max_running_per_user=_env_int("SCHEDULER_DEEP_RESEARCH_RUNNING_PER_USER", 1),
+        ),
+    }
+
+
+# Rough starting estimates used for retry hints before any work has completed
+_DEFAULT_SERVICE_TIMES = {
+    WorkloadClass.INTERACTIVE: 10.0,
+    WorkloadClass.CREW: 90.0,
+    WorkloadClass.DEEP_RESEARCH: 180.0,
+}
+
+
+class WorkloadScheduler:
+    """
+    Admission control for agent workloads.
+
+    Every workload class has its own concurrency limit and bounded queue. Queued
+    work is granted round-robin across users, so a single user submitting a burst
+    cannot starve others, and each user is capped on how much of a class they may
+    run at once. Queued requests receive queue_position events over the WebSocket,
+    and requests arriving at a full queue are rejected with a retry hint instead
+    of piling up threads. Blocking work runs on a per-class executor sized to the
+    class limit so crews never occupy the event loop's default executor.
+    """
+
+    def __init__(self, limits: Optional[Dict[WorkloadClass, WorkloadLimits]] = None):
+        limits = limits or _default_limits()
+        self._states = {
+            workload_class: _ClassState(limits[workload_class], _DEFAULT_SERVICE_TIMES[workload_class])
+            for workload_class in WorkloadClass
+        }
+        self._executors = {
+            workload_class: ThreadPoolExecutor(
+                max_workers=max(1, limits[workload_class].max_concurrent),
+                thread_name_prefix=f"{workload_class.value}-worker",
+            )
+            for workload_class in WorkloadClass
+        }
+        self._notifier: Optional[Callable[[str, str, dict], Awaitable[bool]]] = None
+
+    def set_notifier(self, notifier: Callable[[str, str, dict], Awaitable[bool]]) -> None:
+        """
+        Set the coroutine used to push queue events to a conversation.
+
+        Args:
+            notifier: Coroutine taking (user_id, conversation_id, data), e.g.
+                WebSocketConnectionManager.send_message.
+        """
+        self._notifier = notifier
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        workload_class: WorkloadClass,
+        user_id: str,
+        conversation_id: Optional[str] = None,
+        message_id: Optional[str] = None,
+    ):
+        """
+        Hold a concurrency slot of the given class for the duration of the block.
+
+        Raises:
+            SchedulerSaturatedError: If the class queue is full for this user or globally.
+        """
+        await self._acquire(workload_class, user_id, conversation_id, message_id)
+        started_at = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(workload_class, user_id, time.monotonic() - started_at)
+
+    async def run(
+        self,
+        workload_class: WorkloadClass,
+        user_id: str,
+        func: Callable[..., Any],
+        *args: Any,
+        conversation_id: Optional[str] = None,
+        message_id: Optional[str] = None,
+        **kwargs: Any,
+    ) -> Any:
+        """
+        Run a blocking callable on the class executor once a slot is granted.
+
+        The caller's context variables are propagated to the worker thread the
+        same way asyncio.to_thread does.
+        """
+        async with self.slot(workload_class, user_id, conversation_id, message_id):
+            loop = asyncio.get_running_loop()
+            context = contextvars.copy_context()
+            call = functools.partial(context.run, func, *args, **kwargs)
+            return await loop.run_in_executor(self._executors[workload_class], call)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Return per-class occupancy and throughput counters."""
+        return {
+            workload_class.value: {
+                "running": state.running,
+                "queued": state.queued,
+                "max_concurrent": state.limits.max_concurrent,
+                "max_queued": state.limits.max_queued,
+                "completed": state.completed,
+                "rejected": state.rejected,
+                "avg_service_time": round(state.avg_service_time, 2),
+            }
+            for workload_class, state in self._states.items()
+        }
+
+    async def _acquire(
+        self,
+        workload_class: WorkloadClass,
+        user_id: str,
+        conversation_id: Optional[str],
+        message_id: Optional[str],
+    ) -> None:
+        state = self._states[workload_class]
+        cancellation_token = current_cancellation_token.get()
+        if cancellation_token is not None:
+            cancellation_token.raise_if_cancelled()
+
+        if state.queued == 0 and self._can_start(state, user_id):
+            self._start(state, user_id)
+            return
+
+        user_queue = state.waiting.get(user_id)
+        user_queued = len(user_queue) if user_queue else 0
+        if state.queued >= state.limits.max_queued or user_queued >= state.limits.max_queued_per_user:
+            state.rejected += 1
+            retry_after = self._estimate_wait(state, state.queued + 1)
+            logger.info(logger.format_message(
+                f"{user_id}:{conversation_id}" if conversation_id else None,
+                f"Rejecting {workload_class.value} workload, queue full (retry after {retry_after:.0f}s)"
+            ))
+            raise SchedulerSaturatedError(workload_class, retry_after)
+
+        waiter = _Waiter(
+            user_id=user_id,
+            conversation_id=conversation_id,
+            message_id=message_id,
+            future=asyncio.get_running_loop().create_future(),
+        )
+        state.waiting.setdefault(user_id, deque()).append(waiter)
+        state.queued += 1
+        # Free slots may be held back only by other users' per-user caps
+        self._dispatch(state)
+        self._notify_positions(workload_class, state)
+
+        if cancellation_token is not None:
+            # Leave the queue as soon as the request is cancelled
+            loop = asyncio.get_running_loop()
+            cancellation_token.add_callback(
+                lambda: loop.call_soon_threadsafe(self._cancel_waiter, waiter)
+            )
+
+        try:
+            await waiter.future
+        except OperationCancelledError:
+            self._remove_waiter(state, waiter)
+            self._notify_positions(workload_class, state)
+            raise
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Slot was granted just before cancellation, hand it back
+                self._release(workload_class, user_id, 0.0, record=False)
+            else:
+                self._remove_waiter(state, waiter)
+                self._notify_positions(workload_class, state)
+            raise
+
+    def _release(self, workload_class: WorkloadClass, user_id: str, duration: float, record: bool = True) -> None:
+        state = self._states[workload_class]
+        state.running -= 1
+        remaining = state.running_per_user.get(user_id, 1) - 1
+        if remaining > 0:
+            state.running_per_user[user_id] = remaining
+        else:
+            state.running_per_user.pop(user_id, None)
+
+        if record:
+            state.completed += 1
+            state.avg_service_time = 0.8 * state.avg_service_time + 0.2 * duration
+
+        if self._dispatch(state):
+            self._notify_positions(workload_class, state)
+
+    def _can_start(self, state: _ClassState, user_id: str) -> bool:
+        return (
+            state.running < state.limits.max_concurrent
+            and state.running_per_user.get(user_id, 0) < state.limits.max_running_per_user
+        )
+
+    def _start(self, state: _ClassState, user_id: str) -> None:
+        state.running += 1
+        state.running_per_user[user_id] = state.running_per_user.get(user_id, 0) + 1
+
+    def _dispatch(self, state: _ClassState) -> bool:
+        """Grant free slots round-robin across users. Returns True if anything was granted."""
+        granted = False
+        while state.running < state.limits.max_concurrent and state.waiting:
+            for user_id in list(state.waiting):
+                if self._can_start(state, user_id):
+                    break
+            else:
+                return granted
+
+            user_queue = state.waiting.pop(user_id)
+            waiter = user_queue.popleft()
+            state.queued -= 1
+            if user_queue:
+                # Re-inserting moves the user to the back of the rotation
+                state.waiting[user_id] = user_queue
+            if waiter.future.done():
+                continue
+            self._start(state, user_id)
+            waiter.future.set_result(None)
+            granted = True
+        return granted
+
+    @staticmethod
+    def _cancel_waiter(waiter: _Waiter) -> None:
+        if not waiter.future.done():
+            waiter.future.set_exception(OperationCancelledError("Queued request cancelled"))
+
+    def _remove_waiter(self, state: _ClassState, waiter: _Waiter) -> None:
+        user_queue = state.waiting.get(waiter.user_id)
+        if not user_queue or waiter not in user_queue:
+            return
+        user_queue.remove(waiter)
+        state.queued -= 1
+        if not user_queue:
+            del state.waiting[waiter.user_id]
+
+    def _queue_order(self, state: _ClassState) -> List[_Waiter]:
+        """Waiters in the order round-robin dispatch would grant them."""
+        order = []
+        queues = [list(user_queue) for user_queue in state.waiting.values()]
+        depth = 0
+        while True:
+            layer = [user_queue[depth] for user_queue in queues if depth < len(user_queue)]
+            if not layer:
+                return order
+            order.extend(layer)
+            depth += 1
+
+    def _estimate_wait(self, state: _ClassState, position: int) -> float:
+        concurrency = max(1, state.limits.max_concurrent)
+        return max(1.0, state.avg_service_time * position / concurrency)
+
+    def _notify_positions(self, workload_class: WorkloadClass, state: _ClassState) -> None:
+        if self._notifier is None:
+            return
+        for position, waiter in enumerate(self._queue_order(state), start=1):
+            if not waiter.conversation_id or waiter.future.done():
+                continue
+            data = {
+                "event": "queue_position",
+                "data": json.dumps({
+                    "workload_class": workload_class.value,
+                    "position": position,
+                    "queued": state.queued,
+                    "estimated_wait_seconds": round(self._estimate_wait(state, position)),
+                }),
+                "user_id": waiter.user_id,
+                "conversation_id": waiter.conversation_id,
+                "message_id": waiter.message_id,
+                "timestamp": datetime.now().isoformat(),
+            }
+            asyncio.create_task(self._safe_notify(waiter.user_id, waiter.conversation_id, data))
+
+    async def _safe_notify(self, user_id: str, conversation_id: str, data: dict) -> None:
+        try:
+            await self._notifier(user_id, conversation_id, data)
+        except Exception as e:
+            logger.error(f"Error sending queue position: {str(e)}")
+
+
+workload_scheduler = WorkloadScheduler()
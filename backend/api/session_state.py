@@ -5,64 +5,118 @@ from autogen_core.models import UserMessage, AssistantMessage
 import redis
 
 from .data_types import EndUserMessage
+from .services.session_store import session_store
 
 
 class SessionStateManager:
+    """
+    Router history of each conversation.
+
+    State lives in the worker's bounded session store under the
+    "{user_id}:{conversation_id}" key. Evicted histories are reloaded from the
+    conversation's turn list in Redis.
+    """
+
+    HISTORY_NAMESPACE = "history"
+
     def __init__(self, history_length: int = 10):
-        self.session_states = {}
-        self.session_histories = {}
         self.history_length = history_length
+        self.redis_client = None
+        session_store.register_namespace(self.HISTORY_NAMESPACE, load=self._load_history)
         
+    @staticmethod
+    def turns_key(user_id: str, conversation_id: str) -> str:
+        return f"turns:{user_id}:{conversation_id}"
+
     def init_conversation(self, redis_client: redis.Redis, user_id: str, conversation_id: str) -> None:
         """
         Initialize a conversation by loading its history from Redis.
         Should be called when a new conversation websocket connection is established.
+
+        Only the last turns are read from the capped turn list, so the cost does not
+        depend on the length of the conversation. Conversations stored before the turn
+        list existed are rebuilt once from their full message log.
+        """
+        self.redis_client = redis_client
+        history = self._read_history(redis_client, user_id, conversation_id)
+        session_store.set(self.HISTORY_NAMESPACE, f"{user_id}:{conversation_id}", history)
+
+    def record_turn(self, redis_client: redis.Redis, user_id: str, conversation_id: str, message_data: dict) -> None:
+        """
+        Append a user message or completion event to the conversation's capped turn list.
+        """
+        if message_data.get("event") not in ("user_message", "completion"):
+            return
+        key = self.turns_key(user_id, conversation_id)
+        redis_client.rpush(key, json.dumps(message_data), user_id)
+        redis_client.ltrim(key, -self.history_length, -1)
+
+    def _backfill_turns(self, redis_client: redis.Redis, user_id: str, conversation_id: str) -> list:
+        """
+        Build the turn list of a conversation from its full message log.
+
+        Returns:
+            list: The serialised turns kept, oldest first.
         """
-        # Load existing messages from Redis
         messages_key = f"messages:{user_id}:{conversation_id}"
         messages_data = redis_client.lrange(messages_key, 0, -1, user_id)
-        
-        # Initialize history deque
+        if not messages_data:
+            return []
+
+        turns = []
+        for message_json in messages_data:
+            message_data = json.loads(message_json)
+            if message_data.get("event") in ("user_message", "completion"):
+                turns.append((message_data.get("timestamp", ""), message_json))
+        turns.sort(key=lambda x: x[0])  # Sort by timestamp
+        turns_data = [turn_json for _, turn_json in turns[-self.history_length:]]
+
+        key = self.turns_key(user_id, conversation_id)
+        for turn_json in turns_data:
+            redis_client.rpush(key, turn_json, user_id)
+        return turns_data
+
+    @staticmethod
+    def _to_history_message(message_data: dict) -> Optional[UserMessage | AssistantMessage]:
+        if message_data["event"] == "user_message":
+            return UserMessage(content=message_data["data"], source="User")
+        if message_data["event"] == "completion":
+            return AssistantMessage(content=message_data["data"], source=message_data.get("source", "Assistant"))
+        return None
+
+    def _read_history(self, redis_client: redis.Redis, user_id: str, conversation_id: str) -> deque:
+        turns_data = redis_client.lrange(self.turns_key(user_id, conversation_id), -self.history_length, -1, user_id)
+        if not turns_data:
+            turns_data = self._backfill_turns(redis_client, user_id, conversation_id)
+
         history = deque(maxlen=self.history_length)
-        
-        # Process messages if they exist
-        if messages_data:
-            # Convert messages to objects with timestamps for sorting
-            messages = []
-            for message_json in messages_data:
-                message_data = json.loads(message_json)
-                timestamp = message_data.get("timestamp", "")
-                if message_data["event"] == "user_message":
-                    message = (timestamp, UserMessage(content=message_data["data"], source="User"))
-                    messages.append(message)
-                elif message_data["event"] == "completion":
-                    message = (timestamp, AssistantMessage(content=message_data["data"], source=message_data.get("source", "Assistant")))
-                    messages.append(message)
-            
-            # Sort by timestamp and add to history
-            messages.sort(key=lambda x: x[0])  # Sort by timestamp
-            for _, message in messages:
+        for turn_json in turns_data:
+            message = self._to_history_message(json.loads(turn_json))
+            if message is not None:
                 history.append(message)
-        
-        # Store in memory
-        self.session_histories[conversation_id] = history
-
-    def set_active_agent(self, conversation_id: str, agent_type: str) -> None:
-        self.session_states[conversation_id] = agent_type
+        return history
 
-    def get_active_agent(self, conversation_id: str) -> Optional[str]:
-        return self.session_states.get(conversation_id)
+    def _load_history(self, session_key: str) -> Optional[deque]:
+        if self.redis_client is None:
+            return None
+        user_id, conversation_id = session_key.split(":", 1)
+        return self._read_history(self.redis_client, user_id, conversation_id)
 
-    def clear_session(self, conversation_id: str) -> None:
-        if conversation_id in self.session_states:
-            del self.session_states[conversation_id]
-        if conversation_id in self.session_histories:
-            del self.session_histories[conversation_id]
+    def clear_session(self, user_id: str, conversation_id: str) -> None:
+        """Drop the conversation's state, e.g. when the chat is deleted."""
+        session_key = f"{user_id}:{conversation_id}"
+        session_store.pop(self.HISTORY_NAMESPACE, session_key)
 
-    def add_to_history(self, conversation_id: str, message: UserMessage | AssistantMessage) -> None:
-        if conversation_id not in self.session_histories:
-            self.session_histories[conversation_id] = deque(maxlen=self.history_length)
-        self.session_histories[conversation_id].append(message)
+    def add_to_history(self, user_id: str, conversation_id: str, message: UserMessage | AssistantMessage) -> None:
+        session_key = f"{user_id}:{conversation_id}"
+        history = session_store.get(self.HISTORY_NAMESPACE, session_key)
+        if history is None:
+            history = deque(maxlen=self.history_length)
+            history.append(message)
+            session_store.set(self.HISTORY_NAMESPACE, session_key, history)
+            return
+        history.append(message)
+        session_store.resize(self.HISTORY_NAMESPACE, session_key)
 
-    def get_history(self, conversation_id: str) -> deque:
-        return self.session_histories.get(conversation_id, deque())
+    def get_history(self, user_id: str, conversation_id: str) -> deque:
+        return session_store.get(self.HISTORY_NAMESPACE, f"{user_id}:{conversation_id}", deque())
@@ -2,7 +2,7 @@
 import json
 import os
 import re
-from typing import List
+from typing import List, Optional, Tuple
 from autogen_core import SingleThreadedAgentRuntime, TypeSubscription
 from autogen_core import DefaultSubscription
 from fastapi import WebSocket
@@ -45,6 +45,18 @@ class DocumentContextLengthError(Exception):
         self.max_tokens = max_tokens
         super().__init__(f"Combined documents exceed maximum context window size of {max_tokens} tokens (got {total_tokens} tokens). Please reduce the number or size of documents.")
 
+class RuntimeBinding:
+    """
+    Session-specific inputs of an agent runtime's factories.
+
+    Agents are only instantiated on the first message, so a runtime can be
+    built before its session is known and bound to it on connect.
+    """
+
+    def __init__(self, api_keys: Optional[APIKeys] = None):
+        self.api_keys = api_keys
+
+
 @weave.op(name='initialize_agent')
 async def initialize_agent_runtime(
     redis_client: SecureRedisService,
@@ -59,11 +71,50 @@ async def initialize_agent_runtime(
     Returns:
         SingleThreadedAgentRuntime: The initialized runtime for managing agents.
     """
-    global session_state_manager, aoai_model_client
-
     # load back session state
     session_state_manager.init_conversation(redis_client, user_id, conversation_id)
 
+    return await build_agent_runtime(redis_client, websocket_manager, RuntimeBinding(api_keys))
+
+
+async def build_warm_runtime(
+    redis_client: SecureRedisService,
+    websocket_manager: WebSocketInterface
+) -> Tuple[SingleThreadedAgentRuntime, RuntimeBinding]:
+    """
+    Builds a started runtime for the warm pool, to be bound to a session on connect.
+    """
+    binding = RuntimeBinding()
+    return await build_agent_runtime(redis_client, websocket_manager, binding), binding
+
+
+def bind_agent_runtime(
+    redis_client: SecureRedisService,
+    binding: RuntimeBinding,
+    api_keys: APIKeys,
+    user_id: str,
+    conversation_id: str
+) -> None:
+    """
+    Binds a warm runtime to a session before its first message.
+    """
+    binding.api_keys = api_keys
+    session_state_manager.init_conversation(redis_client, user_id, conversation_id)
+
+
+async def build_agent_runtime(
+    redis_client: SecureRedisService,
+    websocket_manager: WebSocketInterface,
+    binding: RuntimeBinding
+) -> SingleThreadedAgentRuntime:
+    """
+    Builds and starts a runtime with the required agents and tools registered.
+
+    The agent factories read the API keys from the binding when the agents are
+    instantiated, not when they are registered.
+    """
+    global aoai_model_client
+
     agent_runtime = SingleThreadedAgentRuntime(tracer_provider=tracer)
 
     # Add subscriptions
@@ -82,31 +133,31 @@ async def initialize_agent_runtime(
             session_manager=session_state_manager,
             websocket_manager=websocket_manager,
             redis_client=redis_client,
-            api_keys=api_keys,
+            api_keys=binding.api_keys,
         ),
     )
 
     await FinancialAnalysisAgent.register(
         agent_runtime,
         "financial_analysis",
-        lambda: FinancialAnalysisAgent(api_keys=api_keys, redis_client=redis_client),
+        lambda: FinancialAnalysisAgent(api_keys=binding.api_keys, redis_client=redis_client),
     )
 
     # Keep old educational content agent for "basic" usage
     await EducationalContentAgent.register(
         agent_runtime,
         "educational_content",
-        lambda: EducationalContentAgent(api_keys=api_keys),
+        lambda: EducationalContentAgent(api_keys=binding.api_keys),
     )
 
     await SalesLeadsAgent.register(
         agent_runtime,
         "sales_leads",
-        lambda: SalesLeadsAgent(api_keys=api_keys, redis_client=redis_client),
+        lambda: SalesLeadsAgent(api_keys=binding.api_keys, redis_client=redis_client),
     )
 
     await AssistantAgentWrapper.register(
-        agent_runtime, "assistant", lambda: AssistantAgentWrapper(api_keys=api_keys, redis_client=redis_client)
+        agent_runtime, "assistant", lambda: AssistantAgentWrapper(api_keys=binding.api_keys, redis_client=redis_client)
     )
 
     # Register the new deep research agent:
@@ -114,7 +165,7 @@ async def initialize_agent_runtime(
         agent_runtime,
         "deep_research",
         lambda: DeepResearchAgent(
-            api_keys=api_keys,
+            api_keys=binding.api_keys,
             redis_client=redis_client,
         ),
     )
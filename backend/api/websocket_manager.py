@@ -1,5 +1,6 @@
 from datetime import datetime, timedelta
 import os
+import time
 from autogen_core import DefaultTopicId
 from fastapi import WebSocket, WebSocketDisconnect
 import json
@@ -9,9 +10,14 @@ import redis
 from starlette.websockets import WebSocketState
 
 from api.data_types import APIKeys, EndUserMessage, AgentEnum, AgentStructuredResponse, ErrorResponse
-from api.utils import initialize_agent_runtime, load_documents, DocumentContextLengthError
+from api.utils import bind_agent_runtime, initialize_agent_runtime, load_documents, session_state_manager, DocumentContextLengthError
 from api.websocket_interface import WebSocketInterface
+from api.services.conversation_summary import conversation_summary_service
 from api.services.redis_service import SecureRedisService
+from api.services.runtime_pool import RuntimePool
+from api.services.session_expiry import SessionExpiryQueue
+from api.services.session_store import session_store
+from utils.cancellation import cancellation_registry
 
 from .otlp_tracing import logger
 
@@ -28,14 +34,18 @@ class WebSocketConnectionManager(WebSocketInterface):
         self.context_length_summariser = context_length_summariser
         # Add state storage for active connections
         self.active_sessions: Dict[str, dict] = {}
-        # Track last activity time for each session
-        self.session_last_active: Dict[str, datetime] = {}
-        # Session timeout (5 minutes)
+        # Session timeout (10 minutes)
         self.SESSION_TIMEOUT = timedelta(minutes=10)
+        # Deadline heap of idle sessions, rescheduled on every touch
+        self.session_expiry = SessionExpiryQueue(self.SESSION_TIMEOUT)
         # Store pubsub instances
         self.pubsub_instances: Dict[str, redis.client.PubSub] = {}
         # Add cleanup task
         self.cleanup_task: Optional[asyncio.Task] = None
+        # Wakes the cleanup task when an earlier deadline is scheduled
+        self._expiry_wakeup = asyncio.Event()
+        # Pre-built agent runtimes handed to new sessions, set on startup
+        self.runtime_pool: Optional[RuntimePool] = None
 
     def add_connection(self, websocket: WebSocket, user_id: str, conversation_id: str) -> None:
         """
@@ -75,52 +85,67 @@ class WebSocketConnectionManager(WebSocketInterface):
         if key in self.connections:
             del self.connections[key]
 
+    def _touch_session(self, session_key: str) -> None:
+        """Reschedule the idle deadline of a tracked session."""
+        if session_key not in self.active_sessions:
+            return
+        deadline = self.session_expiry.touch(session_key)
+        if self.session_expiry.next_deadline() == deadline:
+            self._expiry_wakeup.set()
+
+    @staticmethod
+    def _is_connected(websocket: Optional[WebSocket]) -> bool:
+        return (
+            websocket is not None
+            and websocket.client_state != WebSocketState.DISCONNECTED
+            and websocket.application_state != WebSocketState.DISCONNECTED
+        )
+
     async def cleanup_inactive_sessions(self):
-        """Cleanup sessions that have been inactive for longer than SESSION_TIMEOUT"""
-        current_time = datetime.now()
-        sessions_to_cleanup = []
-
-        for session_key, last_active in self.session_last_active.items():
-            # Only clean up if:
-            # 1. Session has exceeded timeout AND
-            # 2. Session exists in active_sessions AND is marked as inactive
-            if current_time - last_active > self.SESSION_TIMEOUT:
-                session = self.active_sessions.get(session_key)
-                if session is not None and not session.get('is_active', False):
-                    sessions_to_cleanup.append(session_key)
-                    logger.info(f"Session {session_key} marked for cleanup: last_active={last_active}, is_active={session.get('is_active', False)}")
-
-        for session_key in sessions_to_cleanup:
+        """Cleanup sessions whose idle deadline has passed"""
+        for session_key in self.session_expiry.pop_expired():
+            session = self.active_sessions.get(session_key)
+            if session is None:
+                # Session already gone, make sure no subscription is left behind
+                await self._cleanup_session(session_key)
+                continue
+
+            # A live connection keeps its session; a stale is_active flag does not
+            if session.get('is_active', False) and self._is_connected(session.get('websocket')):
+                self.session_expiry.touch(session_key)
+                continue
+
+            logger.info(f"Session {session_key} expired: is_active={session.get('is_active', False)}")
             await self._cleanup_session(session_key)
             logger.info(f"Cleaned up inactive session: {session_key}")
 
     async def _cleanup_session(self, session_key: str):
         """Clean up a specific session and its resources"""
-        if session_key in self.active_sessions:
-            session = self.active_sessions[session_key]
-            cleanup_tasks = []
-
-            if 'background_task' in session and session['background_task'] is not None:
-                session['background_task'].cancel()
-                cleanup_tasks.append(session['background_task'])
-
-            # Clean up pubsub from session
-            if 'pubsub' in session:
-                try:
-                    session['pubsub'].close()
-                except:
-                    pass
-                # Also remove from pubsub_instances
-                self.pubsub_instances.pop(session_key, None)
-
-            if 'agent_runtime' in session and session['agent_runtime'] is not None:
-                cleanup_tasks.append(asyncio.create_task(session['agent_runtime'].close()))
+        self.session_expiry.discard(session_key)
+        cancellation_registry.cancel_session(session_key, "session expired")
+        conversation_summary_service.discard(*session_key.split(":", 1))
+        # Per-session state is released with the session; history is reloaded from Redis on demand
+        session_store.evict_key(session_key)
+        session = self.active_sessions.pop(session_key, None) or {}
+        cleanup_tasks = []
+
+        if session.get('background_task') is not None:
+            session['background_task'].cancel()
+            cleanup_tasks.append(session['background_task'])
+
+        # Close the session pubsub and any instance still registered for the key
+        pubsubs = {id(p): p for p in (session.get('pubsub'), self.pubsub_instances.pop(session_key, None)) if p is not None}
+        for pubsub in pubsubs.values():
+            try:
+                pubsub.close()
+            except Exception as e:
+                logger.error(f"Error closing pubsub for session {session_key}: {str(e)}")
 
-            if cleanup_tasks:
-                await asyncio.gather(*cleanup_tasks, return_exceptions=True)
+        if session.get('agent_runtime') is not None:
+            cleanup_tasks.append(asyncio.create_task(session['agent_runtime'].close()))
 
-            del self.active_sessions[session_key]
-            self.session_last_active.pop(session_key, None)
+        if cleanup_tasks:
+            await asyncio.gather(*cleanup_tasks, return_exceptions=True)
 
     async def start_cleanup_task(self):
         """Start the background task for cleaning up inactive sessions"""
@@ -128,10 +153,42 @@ class WebSocketConnectionManager(WebSocketInterface):
             self.cleanup_task = asyncio.create_task(self.periodic_cleanup())
 
     async def periodic_cleanup(self):
-        """Periodically check and cleanup inactive sessions"""
+        """Sleep until the earliest session deadline and expire what is due"""
         while True:
-            await self.cleanup_inactive_sessions()
-            await asyncio.sleep(30)  # Check every 30 seconds
+            next_deadline = self.session_expiry.next_deadline()
+            timeout = None if next_deadline is None else max(0.0, next_deadline - time.monotonic())
+            self._expiry_wakeup.clear()
+            try:
+                await asyncio.wait_for(self._expiry_wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.cleanup_inactive_sessions()
+            except Exception as e:
+                logger.error(f"Error cleaning up inactive sessions: {str(e)}", exc_info=True)
+
+    async def _acquire_agent_runtime(self, api_keys: APIKeys, user_id: str, conversation_id: str):
+        """
+        Binds a warm runtime from the pool to the session, or builds one if the pool is empty.
+        """
+        start_time = time.time()
+        warm = self.runtime_pool.acquire() if self.runtime_pool is not None else None
+        if warm is None:
+            agent_runtime = await initialize_agent_runtime(
+                redis_client=self.redis_client,
+                api_keys=api_keys,
+                user_id=user_id,
+                conversation_id=conversation_id,
+                websocket_manager=self
+            )
+        else:
+            agent_runtime, binding = warm
+            bind_agent_runtime(self.redis_client, binding, api_keys, user_id, conversation_id)
+        logger.info(
+            f"Agent runtime ready for {user_id}:{conversation_id} in {time.time() - start_time:.3f} seconds "
+            f"({'warm' if warm is not None else 'cold'})"
+        )
+        return agent_runtime
 
     async def handle_websocket(self, websocket: WebSocket, user_id: str, conversation_id: str):
         """
@@ -174,7 +231,7 @@ class WebSocketConnectionManager(WebSocketInterface):
                 self.active_sessions[session_key]['is_active'] = True
 
             # Update session activity time
-            self.session_last_active[session_key] = datetime.now()
+            self._touch_session(session_key)
 
             # Check if we have an existing session state to restore
             session = self.active_sessions[session_key]
@@ -227,13 +284,7 @@ class WebSocketConnectionManager(WebSocketInterface):
             # Initialize agent runtime if not restored from session
             if not agent_runtime:
                 try:
-                    agent_runtime = await initialize_agent_runtime(
-                        redis_client=self.redis_client,
-                        api_keys=api_keys,
-                        user_id=user_id,
-                        conversation_id=conversation_id,
-                        websocket_manager=self
-                    )
+                    agent_runtime = await self._acquire_agent_runtime(api_keys, user_id, conversation_id)
                 except Exception as e:
                     logger.error(f"Failed to initialize agent runtime: {str(e)}")
                     await websocket.close(code=4005, reason="Failed to initialize agent runtime")
@@ -271,7 +322,7 @@ class WebSocketConnectionManager(WebSocketInterface):
 
                 user_message_text = await websocket.receive_text()
                 # Update session activity time on each message
-                self.session_last_active[session_key] = datetime.now()
+                self._touch_session(session_key)
 
                 try:
                     user_message_input = json.loads(user_message_text)
@@ -317,7 +368,14 @@ class WebSocketConnectionManager(WebSocketInterface):
                         message_key,
                         json.dumps(message_data),
                         user_id,
-                    )
+                    ),
+                    asyncio.to_thread(
+                        session_state_manager.record_turn,
+                        self.redis_client,
+                        user_id,
+                        conversation_id,
+                        message_data,
+                    ),
                 ]
 
                 # Add document loading to parallel tasks if present
@@ -367,6 +425,11 @@ class WebSocketConnectionManager(WebSocketInterface):
                     planner_model=user_message_input["planner_model"]
                 )
 
+                # A new message supersedes any request still running for this conversation
+                cancelled = cancellation_registry.cancel_session(session_key, "superseded by a new message")
+                if cancelled:
+                    logger.info(f"Cancelled {cancelled} in-flight request(s) for conversation: {conversation_id}")
+
                 # This must be awaited as it affects the conversation flow
                 await agent_runtime.publish_message(
                     user_message,
@@ -375,6 +438,7 @@ class WebSocketConnectionManager(WebSocketInterface):
 
         except WebSocketDisconnect:
             logger.info(f"WebSocket connection closed for conversation: {conversation_id}")
+            cancellation_registry.cancel_session(session_key, "client disconnected")
             if session_key in self.active_sessions:
                 # Only mark the connection as inactive, don't terminate the session
                 self.active_sessions[session_key]['is_active'] = False
@@ -394,9 +458,13 @@ class WebSocketConnectionManager(WebSocketInterface):
             except Exception as e:
                 logger.error(f"Error closing websocket: {str(e)}")
 
+            # The handler is gone, so the session can no longer be active for this socket
+            session = self.active_sessions.get(session_key)
+            if session is not None and session.get('websocket') is websocket:
+                session['is_active'] = False
+
             # Update last active time on disconnect
-            if session_key in self.session_last_active:
-                self.session_last_active[session_key] = datetime.now()
+            self._touch_session(session_key)
 
     async def _update_metadata(self, meta_key: str, message_data: str, user_id: str):
         """Helper method to update metadata asynchronously"""
@@ -446,6 +514,18 @@ class WebSocketConnectionManager(WebSocketInterface):
 
                             data_str = message["data"]
                             data_parsed = json.loads(data_str)
+                            if data_parsed.get("type") == "token":
+                                # Token deltas are live-only; the completed step arrives as a thought
+                                await self._safe_send(websocket, {
+                                    "event": "agent_token",
+                                    "data": data_str,
+                                    "user_id": user_id,
+                                    "conversation_id": conversation_id,
+                                    "timestamp": datetime.now().isoformat(),
+                                    "message_id": data_parsed["message_id"]
+                                })
+                                continue
+
                             message_data = {
                                 "event": "think",
                                 "data": data_str,
@@ -477,7 +557,7 @@ class WebSocketConnectionManager(WebSocketInterface):
             logger.error(f"Error in Redis message handler: {str(e)}")
         finally:
             # Update session activity time before exiting
-            self.session_last_active[session_key] = datetime.now()
+            self._touch_session(session_key)
 
     async def _safe_send(self, websocket: WebSocket, data: dict) -> bool:
         """
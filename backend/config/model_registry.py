@@ -1,5 +1,8 @@
 import json
-from typing import Dict, Any, Tuple
+from typing import Dict, Any, List, Optional, Tuple
+
+# Assumed for models without context window metadata
+DEFAULT_CONTEXT_WINDOW = 8192
 
 class ModelRegistry:
     def __init__(self, config_path: str = "config/model_config.json"):
@@ -81,5 +84,65 @@ class ModelRegistry:
 
         return provider_config["model_mapping"]
 
+    def list_providers(self) -> List[str]:
+        """
+        List the configured LLM providers.
+
+        Returns:
+            List[str]: The provider names, in configuration order
+        """
+        return list(self._config["providers"].keys())
+
+    def get_context_window(self, model_key: str, provider: str) -> int:
+        """
+        Get the context window of a model, in tokens.
+
+        Args:
+            model_key: The key of the model in the configuration
+            provider: The LLM provider serving the model
+
+        Returns:
+            int: Prompt plus completion tokens the provider accepts
+
+        Raises:
+            ValueError: If the provider or model_key is not found in configuration
+        """
+        return self.get_model_info(model_key=model_key, provider=provider).get("context_window", DEFAULT_CONTEXT_WINDOW)
+
+    def get_max_output_tokens(self, model_key: str, provider: str) -> Optional[int]:
+        """
+        Get the largest completion the provider returns for a model, in tokens.
+
+        Returns:
+            Optional[int]: The limit, or None if it is not configured
+        """
+        return self.get_model_info(model_key=model_key, provider=provider).get("max_output_tokens")
+
+    def get_tokens_per_second(self, model_key: str, provider: str) -> Optional[float]:
+        """
+        Get the approximate output throughput of a model at the provider.
+
+        Returns:
+            Optional[float]: Generated tokens per second, or None if it is not configured
+        """
+        return self.get_model_info(model_key=model_key, provider=provider).get("tokens_per_second")
+
+    def find_model(self, model_name: str) -> Optional[Tuple[str, str]]:
+        """
+        Find the provider and model key of a model name.
+
+        Args:
+            model_name: A provider model name, optionally prefixed with its
+                crewai prefix, e.g. "sambanova/Meta-Llama-3.3-70B-Instruct"
+
+        Returns:
+            Optional[Tuple[str, str]]: The provider and model key, or None if unknown
+        """
+        for provider, provider_config in self._config["providers"].items():
+            for model_key, info in provider_config["model_mapping"].items():
+                if model_name in (info["model"], f"{info['crewai_prefix']}/{info['model']}"):
+                    return provider, model_key
+        return None
+
 # Global instance
 model_registry = ModelRegistry() 
\ No newline at end of file
@@ -8,6 +8,7 @@ parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 if parent_dir not in sys.path:
     sys.path.insert(0, parent_dir)
 
+from api.services.llm_cache import llm_cache
 from config.model_registry import model_registry
 from utils.envutils import EnvUtils
 
@@ -89,13 +90,17 @@ class FinancialPromptExtractor:
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
+        cache_key = llm_cache.key(self.model_name, payload["messages"], temperature=payload["temperature"], url=self.url)
         try:
-            resp = requests.post(self.url, headers=headers, data=json.dumps(payload), timeout=30)
-            resp.raise_for_status()
-            jr = resp.json()
-            if "choices" not in jr or len(jr["choices"]) == 0:
-                return ("","")
-            content = jr["choices"][0]["message"]["content"].strip()
+            content = llm_cache.get(cache_key)
+            if content is None:
+                resp = requests.post(self.url, headers=headers, data=json.dumps(payload), timeout=30)
+                resp.raise_for_status()
+                jr = resp.json()
+                if "choices" not in jr or len(jr["choices"]) == 0:
+                    return ("","")
+                content = jr["choices"][0]["message"]["content"].strip()
+                llm_cache.set(cache_key, content, jr.get("usage"))
             content = content.replace("```json","").replace("```","").strip()
             parsed = json.loads(content)
             company_name = parsed.get("company_name","")
@@ -0,0 +1,273 @@
+import math
+import os
+import re
+from collections import Counter, deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+from .keyword_matcher import query_keyword_matcher
+
+# Labelled queries the classifier starts from: the router prompt's few-shot
+# examples plus a handful of typical queries per route.
+SEED_EXAMPLES: Tuple[Tuple[str, str], ...] = (
+    ("What is the weather in Tokyo?", "assistant"),
+    ("Who are SambaNova?", "assistant"),
+    ("What is the capital of France?", "assistant"),
+    ("What is Tesla's stock price today?", "assistant"),
+    ("What is the latest news on Apple?", "assistant"),
+    ("What is AAPL's price", "assistant"),
+    ("What is the current price of NVDA stock?", "assistant"),
+    ("How much is Microsoft stock trading at right now?", "assistant"),
+    ("Who is the CEO of Nvidia?", "assistant"),
+    ("When was Amazon founded?", "assistant"),
+    ("What time is it in London?", "assistant"),
+    ("Give me the latest headlines on the stock market", "assistant"),
+    ("Summarize the uploaded document", "assistant"),
+    ("What does the document say about revenue?", "assistant"),
+    ("Translate this sentence into Spanish", "assistant"),
+    ("Hi, how are you?", "assistant"),
+    ("Analyze Google", "financial_analysis"),
+    ("Perform a fundamental analysis on Tesla stock", "financial_analysis"),
+    ("Tell me about Apple's financials", "financial_analysis"),
+    ("What's the financial statement of Tesla?", "financial_analysis"),
+    ("Give me a technical analysis of NVDA", "financial_analysis"),
+    ("Analyze Microsoft's balance sheet and income statement", "financial_analysis"),
+    ("Is Amazon stock a good investment based on its fundamentals?", "financial_analysis"),
+    ("Do a full financial analysis of Netflix", "financial_analysis"),
+    ("Evaluate Intel's valuation and key financial ratios", "financial_analysis"),
+    ("Provide a financial report on AMD", "financial_analysis"),
+    ("Find AI startups in Boston", "sales_leads"),
+    ("Ai chip companies based in geneva", "sales_leads"),
+    ("Find me sales leads in the tech sector", "sales_leads"),
+    ("What are the sales leads in the US?", "sales_leads"),
+    ("Sales leads in the retail industry", "sales_leads"),
+    ("Find series A fintech startups in London", "sales_leads"),
+    ("List seed stage healthcare companies in Berlin", "sales_leads"),
+    ("Generate leads for cybersecurity vendors in Texas", "sales_leads"),
+    ("Write me a report on the future of AI", "deep_research"),
+    ("Dark Matter, Black Holes and Quantum Physics", "deep_research"),
+    ("Explain the relationship between quantum entanglement and teleportation", "deep_research"),
+    ("Prepare a syllabus for a course on flowers", "deep_research"),
+    ("Analyze Coreweave and the S-1", "deep_research"),
+    ("Compare cloud revenue growth between Microsoft Azure and AWS only", "deep_research"),
+    ("Analyze the stock market sell off today and tell me three S&P companies I should not invest in based on their stock price", "deep_research"),
+    ("Generate a thorough technical report on quantum entanglement with references", "deep_research"),
+    ("Compare the financials of Apple and Microsoft", "deep_research"),
+    ("Write a detailed research report on renewable energy storage", "deep_research"),
+    ("Give me an in-depth history of the Roman Empire", "deep_research"),
+    ("Research the impact of large language models on software engineering", "deep_research"),
+    ("Tell me about this company?", "user_proxy"),
+    ("What are the best ways to save money?", "user_proxy"),
+    ("Write a financial report on my local bank?", "user_proxy"),
+    ("Analyze that company", "user_proxy"),
+)
+
+# Routes the fast path may emit; the others always need the LLM's parameter extraction
+FAST_PATH_TYPES = frozenset({"assistant", "deep_research", "financial_analysis"})
+
+# Ticker and display name for the companies the keyword matcher recognises
+COMPANY_TICKERS: Dict[str, Tuple[str, str]] = {
+    "google": ("GOOGL", "Google"), "alphabet": ("GOOGL", "Alphabet"),
+    "goog": ("GOOGL", "Google"), "googl": ("GOOGL", "Google"),
+    "amazon": ("AMZN", "Amazon"), "amzn": ("AMZN", "Amazon"),
+    "apple": ("AAPL", "Apple"), "aapl": ("AAPL", "Apple"),
+    "tesla": ("TSLA", "Tesla"), "tsla": ("TSLA", "Tesla"),
+    "microsoft": ("MSFT", "Microsoft"), "msft": ("MSFT", "Microsoft"),
+    "netflix": ("NFLX", "Netflix"), "nflx": ("NFLX", "Netflix"),
+    "meta": ("META", "Meta"),
+    "nvidia": ("NVDA", "Nvidia"), "nvda": ("NVDA", "Nvidia"),
+    "amd": ("AMD", "AMD"),
+    "intel": ("INTC", "Intel"), "intc": ("INTC", "Intel"),
+}
+
+# Words that make a query depend on the conversation so far
+_REFERENTIAL_PATTERN = re.compile(
+    r"\b(?:it|its|this|that|these|those|they|them|their|he|she|his|her|above|previous|earlier|again|more|same)\b"
+)
+_TOKEN_PATTERN = re.compile(r"[a-z0-9&]+(?:-[a-z0-9]+)*")
+
+
+def _features(text: str) -> Counter:
+    tokens = _TOKEN_PATTERN.findall(text.lower().replace("'s", ""))
+    features = Counter(tokens)
+    features.update(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+    return features
+
+
+@dataclass
+class IntentPrediction:
+    type: str
+    confidence: float
+    similarity: float
+
+
+class IntentClassifier:
+    """
+    TF-IDF nearest-neighbour intent classifier for the chat query router.
+
+    Starts from the router's few-shot examples and learns online from the
+    routes the LLM router chooses, keeping the most recent `max_learned` of
+    them. fast_route only answers for route types whose parameters can be
+    derived from the query alone, and only when the neighbours agree with at
+    least `threshold` confidence; everything else falls back to the LLM.
+    """
+
+    def __init__(
+        self,
+        seed_examples: Iterable[Tuple[str, str]] = SEED_EXAMPLES,
+        k: int = 5,
+        threshold: Optional[float] = None,
+        min_similarity: Optional[float] = None,
+        max_learned: int = 2000,
+        rebuild_every: int = 32,
+    ):
+        self.k = k
+        self.threshold = threshold if threshold is not None else float(os.getenv("ROUTER_FAST_PATH_THRESHOLD", "0.8"))
+        self.min_similarity = (
+            min_similarity if min_similarity is not None
+            else float(os.getenv("ROUTER_FAST_PATH_MIN_SIMILARITY", "0.35"))
+        )
+        self._seed: List[Tuple[str, str]] = list(seed_examples)
+        self._learned: Deque[Tuple[str, str]] = deque(maxlen=max_learned)
+        self.rebuild_every = rebuild_every
+        # Examples learned since the index was last built; None forces a build
+        self._pending: Optional[int] = None
+        self._idf: Dict[str, float] = {}
+        self._labels: List[str] = []
+        self._postings: Dict[str, List[Tuple[int, float]]] = {}
+        self._stats: Counter = Counter()
+
+    def learn(self, query: str, route_type: str, context_summary: str = "") -> None:
+        """Add a routed query as a training example, unless its route depended on the conversation."""
+        if not query.strip() or self.is_context_dependent(query, context_summary):
+            return
+        self._learned.append((query, route_type))
+        if self._pending is not None:
+            self._pending += 1
+        self._stats["learned"] += 1
+
+    def predict(self, query: str) -> Optional[IntentPrediction]:
+        """Return the most likely route type of a query, or None if nothing is similar."""
+        self._build_index()
+        vector = self._vector(_features(query))
+        if not vector:
+            return None
+
+        scores: Dict[int, float] = {}
+        for feature, weight in vector.items():
+            for example, example_weight in self._postings.get(feature, ()):
+                scores[example] = scores.get(example, 0.0) + weight * example_weight
+        if not scores:
+            return None
+
+        neighbours = sorted(scores.items(), key=lambda item: item[1], reverse=True)[: self.k]
+        votes: Dict[str, float] = {}
+        best_similarity: Dict[str, float] = {}
+        for example, similarity in neighbours:
+            label = self._labels[example]
+            # Squared similarity lets close neighbours outvote loosely related ones
+            votes[label] = votes.get(label, 0.0) + similarity * similarity
+            best_similarity[label] = max(best_similarity.get(label, 0.0), similarity)
+
+        route_type = max(votes, key=votes.get)
+        return IntentPrediction(
+            type=route_type,
+            confidence=votes[route_type] / sum(votes.values()),
+            similarity=best_similarity[route_type],
+        )
+
+    def fast_route(self, query: str, context_summary: str = "", num_docs: int = 0) -> Optional[Dict[str, Any]]:
+        """
+        Route a query locally when the classifier is confident.
+
+        Args:
+            query (str): The user query.
+            context_summary (str): Summary of the conversation so far, if any.
+            num_docs (int): Documents attached to the query. Whether they are
+                relevant to it is left to the LLM router.
+
+        Returns:
+            Optional[Dict[str, Any]]: QueryType fields, or None to fall back to the LLM router.
+        """
+        self._stats["requests"] += 1
+
+        if self.is_context_dependent(query, context_summary):
+            return self._fallback("context_dependent")
+        if num_docs > 0:
+            return self._fallback("documents")
+
+        prediction = self.predict(query)
+        if prediction is None or prediction.similarity < self.min_similarity:
+            return self._fallback("unfamiliar")
+        if prediction.confidence < self.threshold:
+            return self._fallback("low_confidence")
+        if prediction.type not in FAST_PATH_TYPES:
+            return self._fallback("needs_extraction")
+
+        if prediction.type == "assistant":
+            parameters = {"query": query}
+        elif prediction.type == "deep_research":
+            parameters = {"deep_research_topic": query}
+        else:
+            companies = {COMPANY_TICKERS[term] for term in query_keyword_matcher.match(query)["company"]}
+            if len({ticker for ticker, _ in companies}) != 1:
+                return self._fallback("unresolved_ticker")
+            ticker, company_name = sorted(companies)[0]
+            parameters = {"query_text": query, "ticker": ticker, "company_name": company_name}
+
+        self._stats["fast_path"] += 1
+        self._stats[f"fast_path_{prediction.type}"] += 1
+        return {"type": prediction.type, "parameters": parameters, "confidence": prediction.confidence}
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the threshold, hit rate and fallback counters."""
+        requests = self._stats["requests"]
+        return {
+            "threshold": self.threshold,
+            "min_similarity": self.min_similarity,
+            "examples": len(self._seed) + len(self._learned),
+            "hit_rate": self._stats["fast_path"] / requests if requests else 0.0,
+            **self._stats,
+        }
+
+    @staticmethod
+    def is_context_dependent(query: str, context_summary: str) -> bool:
+        """Whether the query refers back to a conversation that has a summary."""
+        return bool(context_summary) and _REFERENTIAL_PATTERN.search(query.lower()) is not None
+
+    def _fallback(self, reason: str) -> None:
+        self._stats[f"fallback_{reason}"] += 1
+        return None
+
+    def _vector(self, features: Counter) -> Dict[str, float]:
+        vector = {
+            feature: (1.0 + math.log(count)) * self._idf[feature]
+            for feature, count in features.items()
+            if feature in self._idf
+        }
+        norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+        return {feature: weight / norm for feature, weight in vector.items()} if norm else {}
+
+    def _build_index(self) -> None:
+        # Rebuilding re-weights every example, so learned routes are indexed in batches
+        if self._pending is not None and self._pending < self.rebuild_every:
+            return
+        examples = self._seed + list(self._learned)
+        example_features = [_features(query) for query, _ in examples]
+        document_frequency: Counter = Counter()
+        for features in example_features:
+            document_frequency.update(features.keys())
+        total = len(examples)
+        self._idf = {
+            feature: math.log((1 + total) / (1 + frequency)) + 1.0
+            for feature, frequency in document_frequency.items()
+        }
+        self._labels = [label for _, label in examples]
+        self._postings = {}
+        for index, features in enumerate(example_features):
+            for feature, weight in self._vector(features).items():
+                self._postings.setdefault(feature, []).append((index, weight))
+        self._pending = 0
+
+
+intent_classifier = IntentClassifier()
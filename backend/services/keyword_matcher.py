@@ -0,0 +1,180 @@
+import re
+from typing import Dict, FrozenSet, Iterable, Set, Tuple
+
+# Expanded / refined keywords for educational content (including some "report", "compare", etc.)
+EDU_KEYWORDS = (
+    "explain", "guide", "learn", "teach", "understand", "what is",
+    "how does", "tutorial", "course", "education", "training",
+    "concepts", "fundamentals", "basics", "advanced", "intermediate",
+    "beginner", "introduction", "deep dive", "overview", "study",
+    "technology", "architecture", "design", "implementation",
+    "comparison", "compare", "comparing", "performance", "methodology",
+    "framework", "system", "protocol", "algorithm", "mechanism",
+    "theory", "principle", "structure", "process",
+    # Cues for research/educational style requests
+    "report", "tell me about", "describe", "differences", "similarities",
+)
+
+# Sales leads keywords
+SALES_KEYWORDS = (
+    "find", "search", "companies", "startups", "leads", "vendors",
+    "identify", "discover", "list", "funding", "funded", "investors",
+    "market research", "competitors", "industry", "geography",
+    "series", "seed", "venture", "investment", "firm", "corporation",
+    "business", "enterprise", "provider", "supplier", "manufacturer",
+)
+
+# Financial keywords - generic "analysis" is left out to avoid over-triggering
+FINANCIAL_KEYWORDS = (
+    "stock", "fundamental analysis", "technical analysis", "price target",
+    "investment strategy", "ticker", "financial analysis", "ratios", "eps",
+    "balance sheet", "income statement", "market cap", "valuation",
+)
+
+# Phrases that always force financial_analysis
+OVERRIDE_PHRASES = (
+    "fundamental analysis",
+    "technical analysis",
+    "fundamental & technical analysis",
+)
+
+# A small set of known big company names to help push "analysis" queries to financial
+KNOWN_BIG_COMPANIES = (
+    "google", "amazon", "apple", "tesla", "microsoft", "netflix",
+    "meta", "alphabet", "nvidia", "amd", "intel",
+)
+
+# Tickers for some known big companies
+KNOWN_TICKERS = (
+    "goog", "googl", "amzn", "aapl", "tsla", "msft",
+    "nflx", "meta", "nvda", "amd", "intc",
+)
+
+# S-1 filings, IPOs and index-wide questions need deep research
+DEEP_RESEARCH_CUES = ("s-1", "s1", "ipo", "s&p", "s & p")
+
+MULTI_COMPANY_CUES = ("compare", "vs", "between")
+
+ANALYSIS_CUES = ("analysis", "analyze")
+
+STRONG_FINANCE_CUES = ("stock", "price target", "investment strategy")
+
+# Inflections accepted after a keyword, so "stocks" or "learning" still match
+_SUFFIX = r"(?:s|es|d|ed|ing)?"
+
+
+def _normalise(term: str) -> str:
+    return " ".join(term.lower().split())
+
+
+def _term_pattern(term: str) -> str:
+    return r"\s+".join(re.escape(word) for word in term.split())
+
+
+def _trie_pattern(terms: Iterable[str]) -> str:
+    """
+    Build a regex alternation shaped as a character trie.
+
+    The engine then descends one branch per character instead of trying every
+    term at every position, and longer terms are preferred over their prefixes.
+    """
+    root: Dict[str, dict] = {}
+    for term in terms:
+        node = root
+        for char in term:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: Dict[str, dict]) -> str:
+        branches = [
+            (r"\s+" if char == " " else re.escape(char)) + build(child)
+            for char, child in sorted(node.items())
+            if char
+        ]
+        if not branches:
+            return ""
+        is_term_end = "" in node
+        if len(branches) == 1 and not is_term_end:
+            return branches[0]
+        return "(?:" + "|".join(branches) + ")" + ("?" if is_term_end else "")
+
+    return build(root)
+
+
+class KeywordMatcher:
+    """
+    Finds every keyword of several categories in a single regex pass.
+
+    All terms are compiled into one trie-shaped alternation, matched only on
+    word boundaries and with an optional inflection suffix. The scan takes the
+    longest term at each position; the shorter terms contained in it (e.g.
+    "technical analysis" and "analysis" in "fundamental & technical analysis")
+    are resolved from a table built at construction.
+    """
+
+    def __init__(self, categories: Dict[str, Iterable[str]]):
+        self._categories: Dict[str, FrozenSet[str]] = {}
+        term_categories: Dict[str, Set[str]] = {}
+        for category, terms in categories.items():
+            normalised = frozenset(_normalise(term) for term in terms)
+            self._categories[category] = normalised
+            for term in normalised:
+                term_categories.setdefault(term, set()).add(category)
+
+        terms = sorted(term_categories)
+        # Text is lowercased before matching, which is cheaper than re.IGNORECASE
+        self._pattern = re.compile(r"(?<!\w)(" + _trie_pattern(terms) + r")" + _SUFFIX + r"(?!\w)")
+
+        # term -> (category, term) hits of the term and every term it contains
+        self._hits: Dict[str, Tuple[Tuple[str, str], ...]] = {}
+        for term in terms:
+            contained = {term}
+            for other in terms:
+                if other != term and len(other) < len(term):
+                    pattern = r"(?<!\w)" + _term_pattern(other) + _SUFFIX + r"(?!\w)"
+                    if re.search(pattern, term):
+                        contained.add(other)
+            self._hits[term] = tuple(
+                (category, contained_term)
+                for contained_term in sorted(contained)
+                for category in sorted(term_categories[contained_term])
+            )
+
+    @property
+    def categories(self) -> Dict[str, FrozenSet[str]]:
+        return dict(self._categories)
+
+    def match(self, text: str) -> Dict[str, Set[str]]:
+        """
+        Return the distinct terms found per category.
+
+        Args:
+            text (str): The text to scan, matching is case-insensitive.
+
+        Returns:
+            Dict[str, Set[str]]: Matched terms for every category, empty sets included.
+        """
+        hits: Dict[str, Set[str]] = {category: set() for category in self._categories}
+        for term in self._pattern.findall(text.lower()):
+            term_hits = self._hits.get(term)
+            if term_hits is None:
+                # Multi-word term matched across irregular whitespace
+                term_hits = self._hits[_normalise(term)]
+            for category, contained_term in term_hits:
+                hits[category].add(contained_term)
+        return hits
+
+
+query_keyword_matcher = KeywordMatcher({
+    "edu": EDU_KEYWORDS,
+    "sales": SALES_KEYWORDS,
+    "financial": FINANCIAL_KEYWORDS,
+    "override": OVERRIDE_PHRASES,
+    "company": KNOWN_BIG_COMPANIES + KNOWN_TICKERS,
+    "deep_research": DEEP_RESEARCH_CUES,
+    "multi_company": MULTI_COMPANY_CUES,
+    "analysis": ANALYSIS_CUES,
+    "strong_finance": STRONG_FINANCE_CUES,
+})
+
+NUM_COMPANIES_PATTERN = re.compile(r"(\d+)\s+companies", re.IGNORECASE)
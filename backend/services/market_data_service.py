@@ -0,0 +1,313 @@
+import asyncio
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+import pandas as pd
+import yfinance as yf
+
+from utils.logging import logger
+
+# Financial statements exposed by yf.Ticker, all DataFrames with one column per report date
+STATEMENTS = ("financials", "quarterly_financials", "balance_sheet", "cashflow")
+
+
+class MarketDataService:
+    """
+    Shared access to Yahoo Finance data for the financial tools.
+
+    Ticker info, price history, financial statements and dividends are kept in
+    an in-process LRU with a TTL per kind of data. Price history, statements and
+    dividends are also written to an on-disk Parquet store keyed by ticker and
+    period, so repeat reports on hot tickers, and other workers on the same host,
+    are served locally. Concurrent requests for the same dataset are coalesced
+    into one fetch, so a report that needs a ticker's info in several tools
+    fetches it once. info_many loads many tickers at once on a bounded thread
+    pool, returning whatever loaded within the timeout.
+
+    The disk store needs pyarrow and is skipped when it is not installed or the
+    directory is not writable.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Optional[str] = None,
+        max_entries: Optional[int] = None,
+        info_ttl: Optional[float] = None,
+        history_ttl: Optional[float] = None,
+        statement_ttl: Optional[float] = None,
+        quote_ttl: Optional[float] = None,
+        max_workers: Optional[int] = None,
+        batch_timeout: Optional[float] = None,
+    ):
+        self.enabled = os.getenv("MARKET_DATA_CACHE_ENABLED", "true").lower() == "true"
+        self.cache_dir = cache_dir if cache_dir is not None else os.getenv("MARKET_DATA_CACHE_DIR", "cache/market_data")
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv("MARKET_DATA_MAX_ENTRIES", "1000"))
+        statement_ttl = statement_ttl if statement_ttl is not None else float(os.getenv("MARKET_DATA_STATEMENT_TTL", "86400"))
+        self.ttls = {
+            "info": info_ttl if info_ttl is not None else float(os.getenv("MARKET_DATA_INFO_TTL", "900")),
+            "history": history_ttl if history_ttl is not None else float(os.getenv("MARKET_DATA_HISTORY_TTL", "900")),
+            # Statements and dividends only change with quarterly reports
+            "statement": statement_ttl,
+            "dividends": statement_ttl,
+            "quote": quote_ttl if quote_ttl is not None else float(os.getenv("MARKET_DATA_QUOTE_TTL", "60")),
+        }
+        self.batch_timeout = batch_timeout if batch_timeout is not None else float(os.getenv("MARKET_DATA_BATCH_TIMEOUT", "10"))
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers if max_workers is not None else int(os.getenv("MARKET_DATA_MAX_WORKERS", "8")),
+            thread_name_prefix="market-data",
+        )
+        self._entries: "OrderedDict[Tuple, Tuple[float, Any]]" = OrderedDict()
+        # Crew tools call from worker threads, the assistant from the event loop
+        self._lock = threading.Lock()
+        self._flights: Dict[Tuple, Future] = {}
+        self._async_flights: Dict[Tuple, asyncio.Future] = {}
+        self._disk_enabled = bool(self.cache_dir)
+        self._stats: Counter = Counter()
+
+    def info(self, ticker: str) -> Dict[str, Any]:
+        """yf.Ticker(ticker).info"""
+        ticker = self._normalise(ticker)
+        return self._get(("info", ticker), lambda: yf.Ticker(ticker).info or {}, self.ttls["info"])
+
+    def info_many(self, tickers: Iterable[str], timeout: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Fetch the info of several tickers concurrently.
+
+        Args:
+            tickers: Ticker symbols; duplicates are fetched once.
+            timeout (float, optional): Seconds each ticker may take, defaults
+                to MARKET_DATA_BATCH_TIMEOUT. A ticker that times out keeps
+                loading in the background and is cached when it completes.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: Info by normalised ticker, in request
+                order, for the tickers that loaded in time. Failed and timed out
+                tickers are left out.
+        """
+        return self._fetch_many(self.info, tickers, timeout)
+
+    def history(self, ticker: str, period: str = "1mo", interval: str = "1d", rounding: bool = False) -> pd.DataFrame:
+        """yf.Ticker(ticker).history(period=period, interval=interval, rounding=rounding)"""
+        ticker = self._normalise(ticker)
+        key = ("history", ticker, period, interval, rounding)
+        return self._get(
+            key,
+            lambda: yf.Ticker(ticker).history(period=period, interval=interval, rounding=rounding),
+            self.ttls["history"],
+            disk=True,
+        ).copy()
+
+    def statement(self, ticker: str, name: str) -> pd.DataFrame:
+        """A financial statement of yf.Ticker(ticker), e.g. "balance_sheet"."""
+        if name not in STATEMENTS:
+            raise ValueError(f"Unknown financial statement: {name}")
+        ticker = self._normalise(ticker)
+        return self._get(
+            ("statement", ticker, name),
+            lambda: getattr(yf.Ticker(ticker), name),
+            self.ttls["statement"],
+            disk=True,
+        ).copy()
+
+    def dividends(self, ticker: str) -> pd.Series:
+        """yf.Ticker(ticker).dividends"""
+        ticker = self._normalise(ticker)
+        frame = self._get(
+            ("dividends", ticker),
+            lambda: yf.Ticker(ticker).dividends.to_frame(name="Dividends"),
+            self.ttls["dividends"],
+            disk=True,
+        )
+        return frame["Dividends"].copy()
+
+    async def aquote(self, symbol: str, fetch: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """
+        Cache a quote fetched on the event loop.
+
+        Args:
+            symbol (str): Ticker symbol.
+            fetch: Coroutine function returning the quote; results containing
+                an "error" are returned but not cached.
+        """
+        if not self.enabled:
+            self._stats["fetches"] += 1
+            return await fetch()
+
+        key = ("quote", self._normalise(symbol))
+        cached = self._get_local(key)
+        if cached is not None:
+            return cached
+
+        flight = self._async_flights.get(key)
+        if flight is not None:
+            self._stats["coalesced"] += 1
+            return await asyncio.shield(flight)
+
+        flight = asyncio.get_running_loop().create_future()
+        self._async_flights[key] = flight
+        try:
+            self._stats["fetches"] += 1
+            result = await fetch()
+            if "error" not in result:
+                self._store_local(key, result, self.ttls["quote"])
+            flight.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            flight.cancel()
+            raise
+        except Exception as e:
+            flight.set_exception(e)
+            # Followers receive the error, the leader raises it; avoid "never retrieved" warnings
+            flight.exception()
+            raise
+        finally:
+            self._async_flights.pop(key, None)
+
+    def clear(self) -> None:
+        """Drop the in-process entries; the disk store expires on its own."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "disk_store": self.cache_dir if self._disk_enabled else None,
+            **self._stats,
+        }
+
+    @staticmethod
+    def _normalise(ticker: str) -> str:
+        return ticker.strip().upper()
+
+    def _fetch_many(self, fetch: Callable[[str], Any], tickers: Iterable[str], timeout: Optional[float]) -> Dict[str, Any]:
+        tickers = list(dict.fromkeys(self._normalise(t) for t in tickers if t and t.strip()))
+        futures = {ticker: self._executor.submit(fetch, ticker) for ticker in tickers}
+        # All tickers load concurrently, so each one gets the timeout from the same start
+        wait(futures.values(), timeout=timeout if timeout is not None else self.batch_timeout)
+
+        results = {}
+        for ticker, future in futures.items():
+            if not future.done():
+                self._stats["batch_timeouts"] += 1
+                logger.warning(f"Timed out fetching market data for {ticker}")
+            elif future.exception() is not None:
+                self._stats["batch_errors"] += 1
+                logger.warning(f"Could not fetch market data for {ticker}: {str(future.exception())}")
+            else:
+                results[ticker] = future.result()
+        return results
+
+    def _get(self, key: Tuple, fetch: Callable[[], Any], ttl: float, disk: bool = False) -> Any:
+        if not self.enabled:
+            self._stats["fetches"] += 1
+            return fetch()
+
+        cached = self._get_local(key)
+        if cached is not None:
+            return cached
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = Future()
+        if not leader:
+            self._stats["coalesced"] += 1
+            return flight.result()
+
+        try:
+            value = self._read_disk(key, ttl) if disk else None
+            if value is None:
+                self._stats["fetches"] += 1
+                value = fetch()
+                if disk:
+                    self._write_disk(key, value)
+            self._store_local(key, value, ttl)
+            flight.set_result(value)
+            return value
+        except BaseException as e:
+            flight.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+
+    def _get_local(self, key: Tuple) -> Optional[Any]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                self._stats["misses"] += 1
+                return None
+            expires_at, value = item
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return value
+
+    def _store_local(self, key: Tuple, value: Any, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _path(self, key: Tuple) -> str:
+        kind, ticker, *params = key
+        suffix = "_".join(str(p) for p in params)
+        # Tickers like "^GSPC" or "BRK-B" must map to distinct, portable file names
+        safe = re.sub(r"[^A-Za-z0-9_.-]", "_", f"{ticker}_{suffix}" if suffix else ticker)
+        digest = hashlib.sha256(repr(key).encode()).hexdigest()[:8]
+        return os.path.join(self.cache_dir, kind, f"{safe}-{digest}.parquet")
+
+    def _read_disk(self, key: Tuple, ttl: float) -> Optional[pd.DataFrame]:
+        if not self._disk_enabled:
+            return None
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > ttl:
+                return None
+            frame = pd.read_parquet(path)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Could not read market data from {path}: {str(e)}")
+            return None
+        if key[0] == "statement":
+            # Parquet column names are strings; the tools expect report dates
+            frame.columns = pd.to_datetime(frame.columns)
+        self._stats["disk_hits"] += 1
+        return frame
+
+    def _write_disk(self, key: Tuple, frame: Any) -> None:
+        if not self._disk_enabled or not isinstance(frame, pd.DataFrame) or frame.empty:
+            return
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if key[0] == "statement":
+                frame = frame.copy()
+                frame.columns = [str(column) for column in frame.columns]
+            # Write then rename so concurrent readers never see a partial file
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            frame.to_parquet(tmp_path)
+            os.replace(tmp_path, path)
+        except ImportError as e:
+            logger.warning(f"Market data disk store disabled: {str(e)}")
+            self._disk_enabled = False
+        except Exception as e:
+            logger.warning(f"Could not write market data to {path}: {str(e)}")
+
+
+# Global instance
+market_data = MarketDataService()
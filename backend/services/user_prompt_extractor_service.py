@@ -7,6 +7,7 @@ parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 if parent_dir not in sys.path:
     sys.path.insert(0, parent_dir)
 
+from api.services.llm_cache import llm_cache
 from utils.envutils import EnvUtils
 
 class UserPromptExtractor:
@@ -65,6 +66,42 @@ class UserPromptExtractor:
             "temperature": 0.0
         }
 
+        content = self._complete(payload)
+        if content is None:
+            return {
+                "industry": "",
+                "company_stage": "",
+                "geography": "",
+                "funding_stage": "",
+                "product": ""
+            }
+
+        content = content.replace("```json", "").replace("```", "").strip()
+
+        try:
+            parsed = json.loads(content)
+        except json.JSONDecodeError:
+            print(f"Failed to parse JSON from LLM content: {content}")
+            parsed = {}
+
+        # Ensure the five keys exist
+        for key in ["industry", "company_stage", "geography", "funding_stage", "product"]:
+            if key not in parsed:
+                parsed[key] = ""
+
+        return parsed
+
+    def _complete(self, payload: dict):
+        """
+        Return the content of a ChatCompletion response, or None if the call failed.
+
+        Responses are served from the LLM cache when the same request was answered before.
+        """
+        cache_key = llm_cache.key(self.model_name, payload["messages"], temperature=payload["temperature"], url=self.url)
+        content = llm_cache.get(cache_key)
+        if content is not None:
+            return content
+
         headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {self.api_key}"
@@ -80,51 +117,22 @@ class UserPromptExtractor:
             response.raise_for_status()
         except requests.exceptions.RequestException as e:
             print(f"HTTP error calling SambaNova ChatCompletion: {e}")
-            return {
-                "industry": "",
-                "company_stage": "",
-                "geography": "",
-                "funding_stage": "",
-                "product": ""
-            }
+            return None
 
         try:
             json_response = response.json()
         except json.JSONDecodeError:
             print("Error: Could not parse JSON from SambaNova response.")
-            return {
-                "industry": "",
-                "company_stage": "",
-                "geography": "",
-                "funding_stage": "",
-                "product": ""
-            }
+            return None
 
         if "choices" not in json_response or len(json_response["choices"]) == 0:
             print("Error: No choices found in SambaNova response.")
-            return {
-                "industry": "",
-                "company_stage": "",
-                "geography": "",
-                "funding_stage": "",
-                "product": ""
-            }
+            return None
 
         content = json_response["choices"][0]["message"]["content"].strip()
-        content = content.replace("```json", "").replace("```", "").strip()
+        llm_cache.set(cache_key, content, json_response.get("usage"))
+        return content
 
-        try:
-            parsed = json.loads(content)
-        except json.JSONDecodeError:
-            print(f"Failed to parse JSON from LLM content: {content}")
-            parsed = {}
-
-        # Ensure the five keys exist
-        for key in ["industry", "company_stage", "geography", "funding_stage", "product"]:
-            if key not in parsed:
-                parsed[key] = ""
-
-        return parsed
 
 def main():
     # Example usage
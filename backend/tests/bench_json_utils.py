@@ -0,0 +1,85 @@
+"""
+Microbenchmark of JSON extraction from LLM output.
+
+Compares the single-pass scanner with the previous code-block regex plus
+brace-matching extractor on large aggregator-style outputs. Run from the
+repository root with:
+
+    python -m backend.tests.bench_json_utils
+"""
+import json
+import re
+import timeit
+
+from backend.utils.json_utils import extract_json_from_string
+
+
+def previous_extract_json_from_string(content: str):
+    """The extractor used before the single-pass scanner."""
+    content = content.strip()
+    code_blocks = re.findall(r"```(?:json)?\s*({[\s\S]*?})\s*```", content)
+    if code_blocks:
+        try:
+            return json.loads(code_blocks[0])
+        except json.JSONDecodeError:
+            pass
+
+    objects = []
+    stack = []
+    start = -1
+    for i, char in enumerate(content):
+        if char == '{':
+            if not stack:
+                start = i
+            stack.append(char)
+        elif char == '}':
+            if stack:
+                stack.pop()
+                if not stack and start != -1:
+                    objects.append(content[start:i + 1])
+                    start = -1
+
+    for match in objects:
+        try:
+            return json.loads(match.replace("```json", "").replace("```", "").strip())
+        except json.JSONDecodeError:
+            continue
+    return None
+
+
+def aggregator_output(competitors: int = 200) -> str:
+    """A financial aggregator style answer wrapped in prose and a fenced block."""
+    result = {
+        "ticker": "GOOGL",
+        "summary": "Alphabet {Google} remains dominant in search. " * 40,
+        "competitor": {"competitors": [
+            {"name": f"Company {i}", "ticker": f"C{i}", "notes": "Strong {cloud} growth, see \"Q3\"", "pe": 21.5 + i}
+            for i in range(competitors)
+        ]},
+        "technical": {"weekly": [{"date": f"2024-{i % 12 + 1:02d}-01", "close": 100 + i} for i in range(competitors)]},
+    }
+    return (
+        "Here is the final analysis {as requested}. I combined the competitor, {fundamental} and technical data.\n"
+        "```json\n" + json.dumps(result, indent=2) + "\n```\nLet me know if you need anything else {e.g. charts}."
+    )
+
+
+def unfenced_output(fragments: int = 2000) -> str:
+    """Many unterminated fences and braces, the worst case of the code-block regex."""
+    return "```json {" * fragments + '{"type": "assistant"}'
+
+
+def main(number: int = 20) -> None:
+    inputs = {
+        "aggregator output": aggregator_output(),
+        "unterminated fences": unfenced_output(),
+    }
+    for label, text in inputs.items():
+        print(f"{label} ({len(text) / 1024:.0f} KB)")
+        for name, func in (("previous", previous_extract_json_from_string), ("single pass", extract_json_from_string)):
+            seconds = timeit.timeit(lambda: func(text), number=number)
+            print(f"{name:>12}: {seconds / number * 1e3:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Microbenchmark of the heuristic pre-router keyword scan.
+
+Compares the compiled single-pass matcher with the previous per-keyword
+substring scans. Run from the repository root with:
+
+    python -m backend.tests.bench_keyword_matcher
+"""
+import timeit
+
+from backend.services.keyword_matcher import (
+    EDU_KEYWORDS,
+    FINANCIAL_KEYWORDS,
+    KNOWN_BIG_COMPANIES,
+    KNOWN_TICKERS,
+    SALES_KEYWORDS,
+    query_keyword_matcher,
+)
+
+QUERIES = [
+    "Give me a fundamental & technical analysis of GOOGL",
+    "Find seed-funded fintech startups in Europe building payment infrastructure",
+    "Explain the architecture of transformer models for an intermediate audience",
+    "Compare the cloud businesses of Amazon, Microsoft and Google over the last five years",
+    "What is the latest news on Tesla?",
+]
+
+
+def substring_scan(query: str):
+    """The per-keyword scans the routers used before the compiled matcher."""
+    query_lower = query.lower()
+    deep_research = any(cue in query_lower for cue in ("s-1", "s1", "ipo", "s&p", "s & p", "compare", " vs ", " between "))
+    count_known_cos = sum(1 for co in KNOWN_BIG_COMPANIES + KNOWN_TICKERS if co in query_lower)
+    override = "fundamental analysis" in query_lower or "technical analysis" in query_lower
+    edu_score = sum(1 for keyword in EDU_KEYWORDS if keyword in query_lower)
+    sales_score = sum(1 for keyword in SALES_KEYWORDS if keyword in query_lower)
+    fin_score = sum(1 for keyword in FINANCIAL_KEYWORDS if keyword in query_lower)
+    analysis = "analysis" in query_lower or "analyze" in query_lower
+    strong_finance = any(cue in query_lower for cue in ("stock", "price target", "investment strategy"))
+    return deep_research, count_known_cos, override, edu_score, sales_score, fin_score, analysis, strong_finance
+
+
+def compiled_scan(query: str):
+    hits = query_keyword_matcher.match(query)
+    return (
+        bool(hits["deep_research"] or hits["multi_company"]),
+        len(hits["company"]),
+        bool(hits["override"]),
+        len(hits["edu"]),
+        len(hits["sales"]),
+        len(hits["financial"]),
+        bool(hits["analysis"]),
+        bool(hits["strong_finance"]),
+    )
+
+
+def main(number: int = 20000) -> None:
+    for name, func in (("substring scan", substring_scan), ("compiled matcher", compiled_scan)):
+        seconds = timeit.timeit(lambda: [func(q) for q in QUERIES], number=number)
+        per_query = seconds / (number * len(QUERIES)) * 1e6
+        print(f"{name:>16}: {per_query:.2f} us/query")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+import unittest
+from backend.services.intent_classifier import IntentClassifier
+
+class TestIntentClassifier(unittest.TestCase):
+    def setUp(self):
+        self.classifier = IntentClassifier(threshold=0.8, min_similarity=0.35)
+
+    def test_fast_routes_quick_price_question_to_assistant(self):
+        route = self.classifier.fast_route("What is AAPL's price")
+
+        self.assertEqual(route["type"], "assistant")
+        self.assertEqual(route["parameters"], {"query": "What is AAPL's price"})
+
+    def test_fast_routes_financial_analysis_with_resolved_ticker(self):
+        route = self.classifier.fast_route("Perform a technical analysis on AMD stock")
+
+        self.assertEqual(route["type"], "financial_analysis")
+        self.assertEqual(route["parameters"]["ticker"], "AMD")
+
+    def test_falls_back_for_routes_needing_extraction(self):
+        self.assertIsNone(self.classifier.fast_route("Find fintech startups in Paris"))
+        self.assertEqual(self.classifier.stats()["fallback_needs_extraction"], 1)
+
+    def test_falls_back_for_context_dependent_queries(self):
+        self.assertIsNone(self.classifier.fast_route("What is its price", "The user asked about Tesla"))
+        self.assertEqual(self.classifier.stats()["fallback_context_dependent"], 1)
+
+    def test_falls_back_when_documents_are_attached(self):
+        self.assertIsNone(self.classifier.fast_route("What is AAPL's price", num_docs=1))
+        self.assertEqual(self.classifier.stats()["fallback_documents"], 1)
+
+    def test_learns_from_routed_queries(self):
+        classifier = IntentClassifier(threshold=0.8, min_similarity=0.35, rebuild_every=1)
+        self.assertIsNone(classifier.fast_route("Who won the football world cup in 2018?"))
+
+        classifier.learn("Who won the football world cup in 2014?", "assistant")
+        classifier.learn("Who won the football world cup in 2010?", "assistant")
+
+        self.assertEqual(classifier.fast_route("Who won the football world cup in 2018?")["type"], "assistant")
+        self.assertEqual(classifier.stats()["learned"], 2)
+
+if __name__ == '__main__':
+    unittest.main()
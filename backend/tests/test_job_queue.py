@@ -0,0 +1,112 @@
+import os
+import sys
+import unittest
+
+# job_queue imports its dependencies the way the app does, relative to backend/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+try:
+    from api.services.job_queue import JobQueue
+    from api.services.redis_service import SecureRedisService
+except ImportError:  # redis, cryptography or the logging stack are not installed
+    JobQueue = None
+    SecureRedisService = object
+
+
+class InMemoryRedis(SecureRedisService):
+    """SecureRedisService with the commands the job queue uses answered from a dict."""
+
+    def __init__(self):
+        super().__init__()
+        self.data = {}
+
+    def execute_command(self, command, *args, **options):
+        name = args[0] if args else None
+        if command == "SET":
+            self.data[name] = args[1]
+            return True
+        if command == "GET":
+            return self.data.get(name)
+        if command == "HSET":
+            fields = self.data.setdefault(name, {})
+            fields.update(zip(args[1::2], args[2::2]))
+            return len(args[1:]) // 2
+        if command == "HGETALL":
+            return dict(self.data.get(name, {}))
+        if command == "LPUSH":
+            self.data.setdefault(name, [])[:0] = reversed(args[1:])
+            return len(self.data[name])
+        if command == "ZADD":
+            self.data.setdefault(name, {}).update(zip(args[2::2], args[1::2]))
+            return 1
+        if command == "LRANGE":
+            return list(self.data.get(name, []))
+        if command == "LREM":
+            values = self.data.get(name, [])
+            if args[2] in values:
+                values.remove(args[2])
+                return 1
+            return 0
+        if command == "BRPOPLPUSH":
+            values = self.data.get(name, [])
+            if not values:
+                return None
+            item = values.pop()
+            self.data.setdefault(args[1], []).insert(0, item)
+            return item
+        if command == "SETEX":
+            self.data[name] = args[2]
+            return True
+        if command == "DEL":
+            return sum(self.data.pop(key, None) is not None for key in args)
+        if command == "EXISTS":
+            return sum(key in self.data for key in args)
+        if command == "EXPIRE":
+            return True
+        raise NotImplementedError(command)
+
+
+@unittest.skipIf(JobQueue is None, "redis and cryptography are required")
+class TestJobQueue(unittest.TestCase):
+    def setUp(self):
+        self.queue = JobQueue(InMemoryRedis())
+        self.job_id = self.queue.enqueue("alice", "financial_analysis", {"ticker": "AMD"}, {})
+
+    def test_owner_can_read_job(self):
+        job = self.queue.get_job(self.job_id, "alice")
+
+        self.assertEqual(job["user_id"], "alice")
+        self.assertEqual(job["status"], "queued")
+
+    def test_other_user_cannot_read_job(self):
+        self.assertIsNone(self.queue.get_job(self.job_id, "mallory"))
+        self.assertIsNone(self.queue.get_job(self.job_id, ""))
+
+    def test_other_user_cannot_read_job_without_owner_key(self):
+        # Jobs stored before the owner key existed fall back to decryption
+        del self.queue.redis_client.data[JobQueue.owner_key(self.job_id)]
+
+        self.assertIsNone(self.queue.get_job(self.job_id, "mallory"))
+        self.assertIsNotNone(self.queue.get_job(self.job_id, "alice"))
+
+    def test_late_ack_keeps_heartbeat_of_new_claim(self):
+        redis_client = self.queue.redis_client
+        first = self.queue.claim(timeout=0)
+        # The first worker stalls, its heartbeat expires and the job is claimed again
+        del redis_client.data[JobQueue.heartbeat_key(self.job_id)]
+        self.assertEqual(self.queue.recover_orphans(), 1)
+        second = self.queue.claim(timeout=0)
+
+        self.queue.ack(first)
+        self.queue.ack(first)
+
+        self.assertIn(JobQueue.heartbeat_key(self.job_id), redis_client.data)
+        self.queue.ack(second)
+        self.assertNotIn(JobQueue.heartbeat_key(self.job_id), redis_client.data)
+
+    def test_unknown_job(self):
+        self.assertIsNone(self.queue.get_job("missing", "alice"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,5 @@
 import unittest
-from backend.utils.json_utils import extract_json_from_string
+from backend.utils.json_utils import IncrementalJsonParser, extract_json_from_string
 
 class TestJsonUtils(unittest.TestCase):
     def test_extract_json_from_markdown_text(self):
@@ -56,5 +56,69 @@ Note: The query is classified as "assistant" because it is a general query that
         # Test invalid JSON
         self.assertIsNone(extract_json_from_string("{invalid json}"))
 
+        # Test unterminated object
+        self.assertIsNone(extract_json_from_string('{"type": "assistant"'))
+
+    def test_skips_braces_in_prose(self):
+        test_input = 'Routing {as requested} below:\n```json\n{"type": "assistant", "parameters": {"query": "a } b {"}}\n```'
+        expected_output = {"type": "assistant", "parameters": {"query": "a } b {"}}
+        self.assertEqual(extract_json_from_string(test_input), expected_output)
+
+    def test_repairs_trailing_commas_and_single_quotes(self):
+        test_input = "{'ticker': 'GOOGL', 'note': 'it\\'s \"cheap\"', 'peers': ['MSFT', 'AMZN',],}"
+        expected_output = {"ticker": "GOOGL", "note": 'it\'s "cheap"', "peers": ["MSFT", "AMZN"]}
+        self.assertEqual(extract_json_from_string(test_input), expected_output)
+
+    def test_repairs_bare_words_and_comments(self):
+        test_input = '{type: assistant, "valid": True, "docs": None // no documents\n}'
+        expected_output = {"type": "assistant", "valid": True, "docs": None}
+        self.assertEqual(extract_json_from_string(test_input), expected_output)
+
+    def test_accepts_raw_newlines_in_strings(self):
+        test_input = '{"summary": "first line\nsecond line"}'
+        self.assertEqual(extract_json_from_string(test_input), {"summary": "first line\nsecond line"})
+
+    def test_returns_first_valid_object(self):
+        test_input = '{"a": [1, {"b": 2}]] then {"c": 3} and {"d": 4}'
+        self.assertEqual(extract_json_from_string(test_input), {"c": 3})
+
+
+class TestIncrementalJsonParser(unittest.TestCase):
+    STREAM = (
+        'Here is the route:\n```json\n'
+        '{"type": "financial_analysis", "parameters": {"query_text": "Analyze \\"Google\\"", '
+        '"ticker": "GOOGL", "depth": 2, "areas": ["a", "b"], "docs": null}}\n```'
+    )
+
+    def test_type_surfaces_before_parameters(self):
+        parser = IncrementalJsonParser()
+        head, tail = self.STREAM.split(', "parameters"', 1)
+        self.assertEqual(parser.feed(head), [("type", "financial_analysis")])
+        self.assertNotIn("parameters.ticker", parser.fields)
+        parser.feed(', "parameters"' + tail)
+        self.assertEqual(parser.fields["parameters.ticker"], "GOOGL")
+
+    def test_chunk_boundaries_do_not_matter(self):
+        expected = {
+            "type": "financial_analysis",
+            "parameters.query_text": 'Analyze "Google"',
+            "parameters.ticker": "GOOGL",
+            "parameters.depth": 2,
+            "parameters.areas.0": "a",
+            "parameters.areas.1": "b",
+            "parameters.docs": None,
+        }
+        for size in (1, 2, 5, len(self.STREAM)):
+            parser = IncrementalJsonParser()
+            for start in range(0, len(self.STREAM), size):
+                parser.feed(self.STREAM[start:start + size])
+            self.assertEqual(parser.fields, expected)
+            self.assertTrue(parser.done)
+
+    def test_ignores_text_after_object(self):
+        parser = IncrementalJsonParser()
+        parser.feed('{"type": "assistant"} {"type": "sales_leads"}')
+        self.assertEqual(parser.fields, {"type": "assistant"})
+
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
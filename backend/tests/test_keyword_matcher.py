@@ -0,0 +1,47 @@
+import unittest
+from backend.services.keyword_matcher import KeywordMatcher, query_keyword_matcher
+
+class TestKeywordMatcher(unittest.TestCase):
+    def test_matches_all_categories_in_one_pass(self):
+        hits = query_keyword_matcher.match("Give me a fundamental & technical analysis of GOOGL stocks")
+
+        self.assertEqual(hits["override"], {"fundamental & technical analysis", "technical analysis"})
+        self.assertEqual(hits["financial"], {"technical analysis", "stock"})
+        self.assertEqual(hits["company"], {"googl"})
+        self.assertEqual(hits["analysis"], {"analysis"})
+        self.assertEqual(hits["edu"], set())
+
+    def test_respects_word_boundaries(self):
+        hits = query_keyword_matcher.match("Run the command and list the steps")
+
+        self.assertEqual(hits["company"], set())
+        self.assertEqual(hits["financial"], set())
+        self.assertEqual(hits["sales"], {"list"})
+
+    def test_accepts_inflections_and_flexible_whitespace(self):
+        hits = query_keyword_matcher.match("Learning about Balance   Sheets of companies I compared")
+
+        self.assertEqual(hits["edu"], {"learn", "compare"})
+        self.assertEqual(hits["financial"], {"balance sheet"})
+
+    def test_reports_shared_prefix_terms(self):
+        hits = query_keyword_matcher.match("an investment strategy for Nvidia")
+
+        self.assertEqual(hits["sales"], {"investment"})
+        self.assertEqual(hits["financial"], {"investment strategy"})
+        self.assertEqual(hits["strong_finance"], {"investment strategy"})
+
+    def test_counts_repeated_terms_once(self):
+        hits = query_keyword_matcher.match("Meta, meta and META")
+
+        self.assertEqual(hits["company"], {"meta"})
+
+    def test_custom_categories(self):
+        matcher = KeywordMatcher({"a": ["s-1", "s & p"], "b": ["ipo"]})
+
+        self.assertEqual(matcher.match("Read the S-1 before the IPO"), {"a": {"s-1"}, "b": {"ipo"}})
+        self.assertEqual(matcher.match("The S & P index"), {"a": {"s & p"}, "b": set()})
+        self.assertEqual(matcher.match("tipoff"), {"a": set(), "b": set()})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+from backend.utils.token_budget import (
+    TRUNCATION_MARKER,
+    estimate_messages_tokens,
+    fit_messages,
+    prompt_budget,
+)
+
+class TestTokenBudget(unittest.TestCase):
+    def test_messages_within_budget_are_unchanged(self):
+        messages = [
+            {"role": "system", "content": "You are helpful."},
+            {"role": "user", "content": "Hello"},
+        ]
+        self.assertEqual(fit_messages(messages, 1000), messages)
+
+    def test_oldest_turns_are_dropped_first(self):
+        messages = [
+            {"role": "system", "content": "You are helpful."},
+            {"role": "user", "content": "a" * 300},
+            {"role": "assistant", "content": "b" * 300},
+            {"role": "user", "content": "latest question"},
+        ]
+        budget = estimate_messages_tokens([messages[0], messages[2], messages[3]])
+        result = fit_messages(messages, budget)
+        self.assertEqual(result, [messages[0], messages[2], messages[3]])
+
+    def test_tool_results_are_dropped_with_their_call(self):
+        messages = [
+            {"role": "assistant", "content": "", "tool_calls": [{"id": "1"}]},
+            {"role": "tool", "content": "c" * 300},
+            {"role": "user", "content": "d" * 300},
+            {"role": "user", "content": "latest question"},
+        ]
+        budget = estimate_messages_tokens(messages[1:])
+        result = fit_messages(messages, budget)
+        self.assertEqual(result, messages[2:])
+
+    def test_long_content_is_truncated_in_the_middle(self):
+        content = "head " + "x" * 30000 + " tail"
+        messages = [
+            {"role": "system", "content": "Summarize the sources."},
+            {"role": "user", "content": content},
+        ]
+        result = fit_messages(messages, 2000)
+        self.assertLessEqual(estimate_messages_tokens(result), 2000)
+        self.assertTrue(result[1]["content"].startswith("head "))
+        self.assertTrue(result[1]["content"].endswith(" tail"))
+        self.assertIn(TRUNCATION_MARKER, result[1]["content"])
+        # The input is not modified
+        self.assertEqual(messages[1]["content"], content)
+
+    def test_prompt_budget_leaves_room_for_the_completion(self):
+        self.assertLess(prompt_budget(16384, 8192), 16384 - 8192)
+        self.assertEqual(prompt_budget(1000, 8192), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,10 @@
-import yfinance as yf
 from typing import Dict, Any, List
 from crewai.tools import tool
 import weave
 
+from services.market_data_service import market_data
+from utils.cancellation import check_cancelled
+
 ###################### COMPETITOR TOOL WITH PROMPT ENGINEERING ######################
 
 @tool('EnhancedCompetitorTool')
@@ -12,9 +14,9 @@ def enhanced_competitor_tool(company_name: str, ticker: str) -> Dict[str, Any]:
     Attempt to find 3 best competitor tickers from yfinance, fallback LLM guess if not found.
     Return: competitor_tickers[], competitor_details[] = []
     """
+    check_cancelled()
     fallback_competitors = []
-    y = yf.Ticker(ticker)
-    inf = y.info
+    inf = market_data.info(ticker)
     sector = inf.get("sector","")
 
     if sector and "Tech" in sector:
@@ -35,14 +37,16 @@ def enhanced_competitor_tool(company_name: str, ticker: str) -> Dict[str, Any]:
 
 def competitor_analysis_tool(tickers: List[str]) -> Dict[str, Any]:
     """
-    For each competitor ticker in 'tickers', fetch fundamental info from yfinance.
+    For each competitor ticker in 'tickers', fetch fundamental info from yfinance, concurrently.
     Return competitor_tickers plus competitor_details[] with fields:
     {ticker, name, market_cap, pe_ratio, ps_ratio, ebitda_margins, profit_margins, revenue_growth, earnings_growth, short_ratio, industry, sector}.
     """
+    check_cancelled()
+    # Tickers that fail or time out are left out of competitor_details
+    infos = market_data.info_many(tickers)
+    check_cancelled()
     details = []
-    for t in tickers:
-        data = yf.Ticker(t)
-        info = data.info
+    for t, info in infos.items():
         details.append({
             "ticker": t,
             "name": info.get("longName",""),
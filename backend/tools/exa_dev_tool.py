@@ -7,6 +7,7 @@ import requests
 from typing import Any, Type
 from crewai.tools import BaseTool
 from pydantic import BaseModel, Field
+from api.services.rate_limiter import rate_limiter
 from utils.logging import logger
 class ExaDevToolSchema(BaseModel):
     search_query: str = Field(..., description="Search query for Exa semantic search.")
@@ -54,8 +55,12 @@ class ExaDevTool(BaseTool):
 
         try:
             start_time = time.time()
-            response = requests.post("https://api.exa.ai/search", headers=headers, json=payload, timeout=30)
-            response.raise_for_status()
+            def post():
+                response = requests.post("https://api.exa.ai/search", headers=headers, json=payload, timeout=30)
+                response.raise_for_status()
+                return response
+
+            response = rate_limiter.call("exa", api_key, post)
             elapsed_time = time.time() - start_time
             if elapsed_time > 10:
                 logger.warning(f"Exa Dev Tool took {elapsed_time:.2f} seconds to complete search for query: {search_query}")
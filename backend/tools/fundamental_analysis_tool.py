@@ -1,6 +1,7 @@
-import yfinance as yf
 from typing import Dict, Any, List
 from crewai.tools import tool
+from services.market_data_service import market_data
+from utils.cancellation import check_cancelled
 
 
 
@@ -14,8 +15,8 @@ def fundamental_analysis_tool(ticker: str) -> Dict[str, Any]:
     - dividend_history
     - quarterly_fundamentals
     """
-    data = yf.Ticker(ticker)
-    info = data.info
+    check_cancelled()
+    info = market_data.info(ticker)
 
     result = {
         "ticker": ticker,
@@ -42,9 +43,9 @@ def fundamental_analysis_tool(ticker: str) -> Dict[str, Any]:
     }
 
     # Attempt advanced statement analysis
-    fin = data.financials
-    bs = data.balance_sheet
-    cf = data.cashflow
+    fin = market_data.statement(ticker, "financials")
+    bs = market_data.statement(ticker, "balance_sheet")
+    cf = market_data.statement(ticker, "cashflow")
 
     current_ratio = None
     debt_to_equity = None
@@ -111,7 +112,7 @@ def fundamental_analysis_tool(ticker: str) -> Dict[str, Any]:
 
     quarterly_csv = []
     try:
-        qfin = data.quarterly_financials
+        qfin = market_data.statement(ticker, "quarterly_financials")
         if qfin is not None and not qfin.empty:
             for date_col in qfin.columns:
                 col_str = str(date_col.date()) if hasattr(date_col, "date") else str(date_col)
@@ -141,7 +142,7 @@ def fundamental_analysis_tool(ticker: str) -> Dict[str, Any]:
 
     div_hist = []
     try:
-        dividends = data.dividends
+        dividends = market_data.dividends(ticker)
         for dt, val in dividends.iteritems():
             div_hist.append({"date": str(dt.date()), "dividend": float(val)})
     except:
@@ -1,7 +1,8 @@
-import yfinance as yf
 import numpy as np
 from typing import Dict, Any
 from crewai.tools import tool
+from services.market_data_service import market_data
+from utils.cancellation import check_cancelled
 
 
 ###################### RISK ASSESSMENT TOOL ######################
@@ -10,11 +11,9 @@ def risk_assessment_tool(ticker: str, benchmark: str = "^GSPC", period: str = "1
     """
     Compute Beta, Sharpe, VaR, Max Drawdown, Volatility, plus monthly-averaged daily_returns for plotting.
     """
-    stock = yf.Ticker(ticker)
-    bench = yf.Ticker(benchmark)
-
-    stock_close = stock.history(period=period)['Close']
-    bench_close = bench.history(period=period)['Close']
+    check_cancelled()
+    stock_close = market_data.history(ticker, period=period)['Close']
+    bench_close = market_data.history(benchmark, period=period)['Close']
 
     if stock_close.empty or bench_close.empty:
         return {"error": "Insufficient data for risk metrics."}
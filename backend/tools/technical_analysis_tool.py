@@ -1,9 +1,10 @@
-import yfinance as yf
 import pandas as pd
 import numpy as np
 # import matplotlib.pyplot as plt  # For potential plotting if desired
 from datetime import datetime, timedelta
 from crewai.tools import tool
+from services.market_data_service import market_data
+from utils.cancellation import check_cancelled
 from typing import Dict, Any
 
 
@@ -13,8 +14,8 @@ def yf_tech_analysis(ticker: str, period: str = "3mo") -> Dict[str, Any]:
     """
     Get 3-month weekly intervals from yfinance for the ticker, returning standard fields plus stock_price_data.
     """
-    data = yf.Ticker(ticker)
-    hist = data.history(period=period, interval='1wk', rounding=True)
+    check_cancelled()
+    hist = market_data.history(ticker, period=period, interval='1wk', rounding=True)
     stock_price_data = []
     for dt, row in hist.iterrows():
         date_str = dt.strftime("%Y-%m-%d")
@@ -1,7 +1,10 @@
 import redis
 import json
+import threading
 import time
-from typing import Any
+import uuid
+from collections import Counter
+from typing import Any, Dict, List, Optional
 import os
 from crewai.agents.parser import AgentFinish, AgentAction
 
@@ -59,6 +62,9 @@ class RedisConversationLogger:
             self.llm_name = llm_name
         self.init_timestamp = time.time()
         self._message_id = str(message_id) if message_id else None
+        # Token usage of this agent's LLM calls; calls may report from several threads
+        self._usage: Counter = Counter()
+        self._usage_lock = threading.Lock()
 
     @property
     def message_id(self):
@@ -72,14 +78,38 @@ class RedisConversationLogger:
         """Update the message_id for the next set of logs."""
         self.message_id = message_id
 
-    # TODO: log llm usage
+    def open_token_stream(self) -> "TokenStream":
+        """Start publishing the token deltas of one LLM call of this agent."""
+        return TokenStream(self)
+
     def log_success_event(
+                        self,
                         kwargs,
                         response_obj,
                         start_time,
                         end_time,
                     ):
-        pass
+        """Account the token usage of one LLM call of this agent."""
+        usage = response_obj.get("usage") if isinstance(response_obj, dict) else getattr(response_obj, "usage", None)
+        if not usage:
+            return
+        if not isinstance(usage, dict):
+            usage = {
+                "prompt_tokens": getattr(usage, "prompt_tokens", 0),
+                "completion_tokens": getattr(usage, "completion_tokens", 0),
+                "total_tokens": getattr(usage, "total_tokens", 0),
+            }
+        with self._usage_lock:
+            self._usage["prompt_tokens"] += usage.get("prompt_tokens") or 0
+            self._usage["completion_tokens"] += usage.get("completion_tokens") or 0
+            self._usage["total_tokens"] += usage.get("total_tokens") or 0
+            self._usage["llm_calls"] += 1
+
+    @property
+    def usage(self) -> Dict[str, int]:
+        """Token usage accumulated over this agent's LLM calls."""
+        with self._usage_lock:
+            return dict(self._usage)
 
     def __call__(self, output: Any):
         try:
@@ -103,6 +133,7 @@ class RedisConversationLogger:
                         "llm_name": self.llm_name,
                         "llm_provider": self.llm_provider,
                         "task": task,
+                        "usage": self.usage,
                     },
                 }
                 self.init_timestamp = time.time()
@@ -111,3 +142,96 @@ class RedisConversationLogger:
         except Exception as e:
             print(f"Error publishing to Redis: {e}")
             print(f"Message attempted: {message if 'message' in locals() else 'No message created'}")
+
+
+class TokenStream:
+    """
+    Publishes the token deltas of one LLM call on the agent-thought channel.
+
+    Deltas are coalesced into messages of at most TOKEN_STREAM_FLUSH_CHARS
+    characters or TOKEN_STREAM_FLUSH_INTERVAL seconds, except the first one,
+    which is sent immediately. Messages carry type "token", the agent name and
+    the message_id of the conversation logger, plus a stream_id and seq so the
+    client can assemble them. The last message has final set.
+    """
+
+    FLUSH_INTERVAL = float(os.getenv("TOKEN_STREAM_FLUSH_INTERVAL", "0.1"))
+    FLUSH_CHARS = int(os.getenv("TOKEN_STREAM_FLUSH_CHARS", "256"))
+
+    def __init__(self, conversation_logger: RedisConversationLogger):
+        self.conversation_logger = conversation_logger
+        self.stream_id = uuid.uuid4().hex
+        self.seq = 0
+        self._buffer: List[str] = []
+        self._buffered = 0
+        self._last_flush = time.monotonic()
+
+    def add(self, delta: Optional[str]) -> bool:
+        """
+        Buffer a delta.
+
+        Returns:
+            bool: Whether the buffer is due to be flushed.
+        """
+        if delta:
+            self._buffer.append(delta)
+            self._buffered += len(delta)
+        return self._buffered > 0 and (
+            self.seq == 0
+            or self._buffered >= self.FLUSH_CHARS
+            or time.monotonic() - self._last_flush >= self.FLUSH_INTERVAL
+        )
+
+    def flush(self, final: bool = False) -> None:
+        """Publish the buffered text; the final flush is sent even when empty."""
+        if not self._buffer and not final:
+            return
+        text = "".join(self._buffer)
+        self._buffer = []
+        self._buffered = 0
+        self._last_flush = time.monotonic()
+
+        conversation_logger = self.conversation_logger
+        message = {
+            "type": "token",
+            "user_id": conversation_logger.user_id,
+            "run_id": conversation_logger.run_id,
+            "agent_name": conversation_logger.agent_name,
+            "text": text,
+            "timestamp": time.time(),
+            "message_id": conversation_logger.message_id,
+            "stream_id": self.stream_id,
+            "seq": self.seq,
+            "final": final,
+            "metadata": {
+                "workflow_name": conversation_logger.workflow_name,
+                "agent_name": conversation_logger.agent_name,
+                "llm_name": conversation_logger.llm_name,
+                "llm_provider": conversation_logger.llm_provider,
+            },
+        }
+        self.seq += 1
+        try:
+            channel = f"agent_thoughts:{conversation_logger.user_id}:{conversation_logger.run_id}"
+            conversation_logger.r.publish(channel, json.dumps(message))
+        except Exception as e:
+            print(f"Error publishing token stream to Redis: {e}")
+
+
+def bind_agent_loggers(*agents: Any) -> None:
+    """
+    Bind the LLMs of agents to the conversation logger set as their step_callback.
+
+    The logger accounts the token usage of the agent's calls and streams its
+    tokens, unless CREW_TOKEN_STREAMING=false. Crews share LLM instances
+    between agents, so each agent gets its own copy bound to its logger.
+    """
+    streaming = os.getenv("CREW_TOKEN_STREAMING", "true").lower() == "true"
+    for agent in agents:
+        conversation_logger = getattr(agent, "step_callback", None)
+        if not isinstance(conversation_logger, RedisConversationLogger):
+            continue
+        if hasattr(agent.llm, "with_callbacks"):
+            agent.llm = agent.llm.with_callbacks(conversation_logger)
+        if streaming and hasattr(agent.llm, "with_token_stream"):
+            agent.llm = agent.llm.with_token_stream(conversation_logger)
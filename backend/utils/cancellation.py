@@ -0,0 +1,160 @@
+import contextvars
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+
+class OperationCancelledError(Exception):
+    """Raised when work is abandoned because its cancellation token fired."""
+
+
+class CancellationToken:
+    """
+    Thread-safe cooperative cancellation token.
+
+    Long-running work checks the token between steps, and blocking calls can be
+    wrapped with run_cancellable so the calling thread is released as soon as
+    the token fires instead of when the underlying request finishes.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], Any]] = []
+        self.reason: Optional[str] = None
+
+    @property
+    def is_cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        """Fire the token and run registered callbacks once."""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+
+    def add_callback(self, callback: Callable[[], Any]) -> None:
+        """Register a callback to run on cancellation, or run it now if already cancelled."""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def remove_callback(self, callback: Callable[[], Any]) -> None:
+        """Unregister a callback whose work finished, so the token stops referencing it."""
+        with self._lock:
+            try:
+                self._callbacks.remove(callback)
+            except ValueError:
+                pass
+
+    def raise_if_cancelled(self) -> None:
+        if self._event.is_set():
+            raise OperationCancelledError(f"Operation cancelled: {self.reason}")
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._event.wait(timeout)
+
+    def run_cancellable(self, func: Callable[..., Any], *args: Any, timeout: Optional[float] = None, **kwargs: Any) -> Any:
+        """
+        Run a blocking call on a helper thread and return its result.
+
+        The caller is released immediately when the token fires; the abandoned
+        call keeps running on its daemon thread and its result is discarded.
+
+        Raises:
+            OperationCancelledError: If the token fires before the call returns.
+            TimeoutError: If timeout elapses before the call returns.
+        """
+        self.raise_if_cancelled()
+        done = threading.Event()
+        result: List[Any] = []
+        error: List[BaseException] = []
+        context = contextvars.copy_context()
+
+        def target():
+            try:
+                result.append(context.run(func, *args, **kwargs))
+            except BaseException as e:
+                error.append(e)
+            finally:
+                done.set()
+
+        release = done.set
+        self.add_callback(release)
+        try:
+            threading.Thread(target=target, daemon=True).start()
+            if not done.wait(timeout):
+                raise TimeoutError(f"Call did not complete within {timeout} seconds")
+        finally:
+            self.remove_callback(release)
+        if error:
+            raise error[0]
+        if not result:
+            self.raise_if_cancelled()
+        return result[0]
+
+
+# Token of the request currently being processed; propagated into worker
+# threads by asyncio.to_thread and the workload scheduler.
+current_cancellation_token: contextvars.ContextVar[Optional[CancellationToken]] = contextvars.ContextVar(
+    "current_cancellation_token", default=None
+)
+
+
+def check_cancelled(token: Optional[CancellationToken] = None) -> None:
+    """Raise OperationCancelledError if the given or current token has fired."""
+    token = token or current_cancellation_token.get()
+    if token is not None:
+        token.raise_if_cancelled()
+
+
+class CancellationRegistry:
+    """
+    Tracks the tokens of in-flight requests per user_id:conversation_id session.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tokens: Dict[str, Dict[str, CancellationToken]] = {}
+
+    def create(self, session_key: str, message_id: str) -> CancellationToken:
+        """Create and register a token for a message of a session."""
+        token = CancellationToken()
+        with self._lock:
+            self._tokens.setdefault(session_key, {})[message_id] = token
+        return token
+
+    def release(self, session_key: str, message_id: str) -> None:
+        """Forget a finished message's token."""
+        with self._lock:
+            tokens = self._tokens.get(session_key)
+            if tokens is None:
+                return
+            tokens.pop(message_id, None)
+            if not tokens:
+                del self._tokens[session_key]
+
+    def cancel_session(self, session_key: str, reason: str = "cancelled") -> int:
+        """
+        Cancel every in-flight message of a session.
+
+        Returns:
+            int: The number of cancelled tokens.
+        """
+        with self._lock:
+            tokens = self._tokens.pop(session_key, {})
+        for token in tokens.values():
+            token.cancel(reason)
+        return len(tokens)
+
+
+cancellation_registry = CancellationRegistry()
@@ -2,10 +2,110 @@ import json
 import re
 from typing import Optional, Union, Dict, Any
 
+# One token of a JSON-like text; strings are matched separately from their opening quote
+_JSON_TOKEN_PATTERN = re.compile(r"""
+    (?P<quote>["'])
+  | (?P<comment>//[^\n]*|/\*.*?\*/)
+  | (?P<open>[{\[])
+  | (?P<close>[}\]])
+  | (?P<comma>,)
+  | (?P<space>\s+)
+  | (?P<number>-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)
+  | (?P<word>[A-Za-z_$][\w$]*)
+  | (?P<other>[^"'/{}\[\],\sA-Za-z_$\d-]+|.)
+""", re.VERBOSE | re.DOTALL)
+
+_STRING_PATTERNS = {
+    '"': re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL),
+    "'": re.compile(r"'[^'\\]*(?:\\.[^'\\]*)*'", re.DOTALL),
+}
+
+_SINGLE_QUOTED_ESCAPE_PATTERN = re.compile(r'\\(.)|"', re.DOTALL)
+
+# Accepts raw control characters, e.g. newlines, inside strings
+_LENIENT_DECODER = json.JSONDecoder(strict=False)
+
+# Bare words with a JSON meaning; any other bare word is quoted
+_BARE_WORDS = {
+    "true": "true", "false": "false", "null": "null",
+    "True": "true", "False": "false", "None": "null",
+    "NaN": "NaN", "Infinity": "Infinity",
+}
+
+
+def _requote(single_quoted: str) -> str:
+    """Turn a single-quoted string into a double-quoted JSON string."""
+    inner = _SINGLE_QUOTED_ESCAPE_PATTERN.sub(
+        lambda m: '\\"' if m.group(1) is None else ("'" if m.group(1) == "'" else m.group(0)),
+        single_quoted[1:-1],
+    )
+    return '"' + inner + '"'
+
+
+def _repair_object(content: str, start: int, dead_quotes: set) -> tuple:
+    """
+    Scan the object opening at start, repairing it on the way.
+
+    Returns:
+        tuple: The repaired object text, or None if it is malformed or never
+            closes, and the position scanning stopped at.
+    """
+    out = []
+    closers = []
+    # Index in out of a comma that is dropped if a closing bracket follows it
+    pending_comma = None
+    pos = start
+    while pos < len(content):
+        match = _JSON_TOKEN_PATTERN.match(content, pos)
+        kind, token = match.lastgroup, match.group()
+        pos = match.end()
+
+        if kind in ("space", "comment"):
+            if kind == "space":
+                out.append(token)
+            continue
+        if kind == "comma":
+            out.append(token)
+            pending_comma = len(out) - 1
+            continue
+
+        if kind == "quote":
+            string = None if token in dead_quotes else _STRING_PATTERNS[token].match(content, match.start())
+            if string is None:
+                # No closing quote anywhere after this one, so none after later ones either
+                dead_quotes.add(token)
+                out.append(token)
+            else:
+                pos = string.end()
+                out.append(string.group() if token == '"' else _requote(string.group()))
+        elif kind == "open":
+            closers.append("}" if token == "{" else "]")
+            out.append(token)
+        elif kind == "close":
+            if not closers or closers.pop() != token:
+                return None, pos
+            if pending_comma is not None:
+                out[pending_comma] = ""
+            out.append(token)
+            if not closers:
+                return "".join(out), pos
+        elif kind == "word":
+            out.append(_BARE_WORDS.get(token, '"' + token + '"'))
+        else:
+            out.append(token)
+        pending_comma = None
+    return None, pos
+
+
 def extract_json_from_string(content: str) -> Optional[Dict[str, Any]]:
     """
     Attempts to extract and parse a JSON object from a string that may contain markdown,
     explanatory text, or code blocks.
+
+    The text is scanned once, in linear time, for the first top-level {...} that
+    parses. Candidates that are not valid JSON are repaired while they are scanned:
+    single-quoted strings, trailing commas, comments, bare words and Python literals
+    are converted to JSON, and raw control characters are accepted inside strings.
     
     Args:
         content (str): The input string that may contain a JSON object
@@ -16,59 +116,131 @@ def extract_json_from_string(content: str) -> Optional[Dict[str, Any]]:
     """
     if not isinstance(content, str):
         return None
-        
-    # Clean the input string
-    content = content.strip()
-    
-    # Try to find JSON in code blocks first
-    code_block_pattern = r"```(?:json)?\s*({[\s\S]*?})\s*```"
-    code_blocks = re.findall(code_block_pattern, content)
-    
-    # If found in code blocks, try the first one
-    if code_blocks:
-        try:
-            return json.loads(code_blocks[0])
-        except json.JSONDecodeError:
-            pass
-    
-    # If no valid JSON in code blocks, try to find any {...} pattern
-    # Using a more precise pattern that matches balanced braces
-    def find_json_objects(s: str) -> list[str]:
-        objects = []
-        stack = []
-        start = -1
-        
-        for i, char in enumerate(s):
-            if char == '{':
-                if not stack:
-                    start = i
-                stack.append(char)
-            elif char == '}':
-                if stack:
-                    stack.pop()
-                    if not stack and start != -1:
-                        objects.append(s[start:i+1])
-                        start = -1
-        
-        return objects
-    
-    # Find all potential JSON objects with balanced braces
-    matches = find_json_objects(content)
-    
-    # Try each potential JSON match
-    for match in matches:
-        try:
-            # Clean the match by removing markdown code block syntax
-            cleaned = match.replace("```json", "").replace("```", "").strip()
-            return json.loads(cleaned)
-        except json.JSONDecodeError:
-            continue
-            
-    # If the entire content looks like a JSON object, try that
-    if content.startswith("{") and content.endswith("}"):
+
+    dead_quotes = set()
+    start = content.find("{")
+    while start != -1:
+        # Valid JSON is decoded in C; only malformed candidates take the repairing scan
         try:
-            return json.loads(content)
+            result, _ = _LENIENT_DECODER.raw_decode(content, start)
         except json.JSONDecodeError:
-            pass
-            
-    return None 
\ No newline at end of file
+            result = None
+        if isinstance(result, dict):
+            return result
+
+        candidate, end = _repair_object(content, start, dead_quotes)
+        if candidate is not None:
+            try:
+                result = json.loads(candidate, strict=False)
+            except json.JSONDecodeError:
+                result = None
+            if isinstance(result, dict):
+                return result
+        # Candidates never overlap, so every character is scanned once
+        start = content.find("{", end)
+    return None
+
+
+class IncrementalJsonParser:
+    """
+    Parses a JSON object incrementally as it streams in.
+
+    Text before the first '{' (prose, markdown fences) is skipped. Every
+    scalar value (string, number, true, false, null) is reported as soon as it
+    is complete, keyed by its dotted path, e.g. "type" or "parameters.ticker";
+    array items use their index as the path segment. Parsing stops once the
+    top-level object closes. The parser only surfaces values early, the full
+    response should still be parsed with extract_json_from_string.
+    """
+
+    _DELIMITERS = frozenset(",}] \t\r\n")
+
+    def __init__(self):
+        self.fields: Dict[str, Any] = {}
+        self.done = False
+        # One frame per open container: [is_object, current key, array index]
+        self._stack: list = []
+        self._token: Optional[list] = None
+        self._in_string = False
+        self._escape = False
+        self._expect_key = False
+
+    def feed(self, chunk: str) -> list[tuple[str, Any]]:
+        """
+        Feed the next chunk of the stream.
+
+        Args:
+            chunk (str): The streamed text.
+
+        Returns:
+            list[tuple[str, Any]]: (path, value) pairs of the values completed by this chunk.
+        """
+        completed = []
+        for char in chunk:
+            if self.done:
+                break
+            if self._in_string:
+                self._token.append(char)
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    try:
+                        text = json.loads("".join(self._token))
+                    except json.JSONDecodeError:
+                        text = "".join(self._token[1:-1])
+                    self._token = None
+                    if self._expect_key:
+                        self._stack[-1][1] = text
+                        self._expect_key = False
+                    else:
+                        self._complete(text, completed)
+                continue
+
+            if not self._stack:
+                if char == "{":
+                    self._stack.append([True, None, 0])
+                    self._expect_key = True
+                continue
+
+            if self._token is not None:
+                if char not in self._DELIMITERS:
+                    self._token.append(char)
+                    continue
+                try:
+                    self._complete(json.loads("".join(self._token)), completed)
+                except json.JSONDecodeError:
+                    pass
+                self._token = None
+
+            if char == '"':
+                self._token = [char]
+                self._in_string = True
+            elif char == "{":
+                self._stack.append([True, None, 0])
+                self._expect_key = True
+            elif char == "[":
+                self._stack.append([False, None, 0])
+            elif char in "}]":
+                self._stack.pop()
+                self._expect_key = False
+                if not self._stack:
+                    self.done = True
+            elif char == ",":
+                if self._stack[-1][0]:
+                    self._expect_key = True
+                else:
+                    self._stack[-1][2] += 1
+            elif char not in self._DELIMITERS and char != ":":
+                self._token = [char]
+        return completed
+
+    def _complete(self, value: Any, completed: list[tuple[str, Any]]) -> None:
+        path = ".".join(
+            str(key) if is_object else str(index)
+            for is_object, key, index in self._stack
+        )
+        self.fields[path] = value
+        completed.append((path, value))
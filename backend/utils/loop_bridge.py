@@ -0,0 +1,106 @@
+import asyncio
+import concurrent.futures
+import contextvars
+from typing import Any, Awaitable, Callable, Optional
+
+from utils.cancellation import CancellationToken, OperationCancelledError
+
+
+class LoopBridge:
+    """
+    Runs coroutines on the application's event loop from synchronous worker threads.
+
+    Crews and their tools are synchronous and run on executor threads. Through
+    the bridge their I/O, such as LLM calls, is awaited on the shared event loop
+    and its connection pools instead of occupying a helper thread per call. The
+    calling thread only waits for the result, and a fired cancellation token
+    cancels the coroutine itself rather than abandoning it.
+    """
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def set_loop(self, loop: Optional[asyncio.AbstractEventLoop]) -> None:
+        self._loop = loop
+
+    def available(self) -> bool:
+        """Whether the caller can block on the bridge, i.e. a loop is running elsewhere."""
+        loop = self._loop
+        if loop is None or loop.is_closed() or not loop.is_running():
+            return False
+        try:
+            # Blocking the loop's own thread on it would deadlock
+            return asyncio.get_running_loop() is not loop
+        except RuntimeError:
+            return True
+
+    def run(
+        self,
+        coro_fn: Callable[..., Awaitable[Any]],
+        *args: Any,
+        cancellation_token: Optional[CancellationToken] = None,
+        timeout: Optional[float] = None,
+        **kwargs: Any,
+    ) -> Any:
+        """
+        Run coro_fn(*args, **kwargs) on the loop and block until it returns.
+
+        The caller's context variables are visible to the coroutine.
+
+        Raises:
+            RuntimeError: If no loop is available to this thread.
+            OperationCancelledError: If the token fires before the coroutine returns.
+            TimeoutError: If timeout elapses before the coroutine returns.
+        """
+        if not self.available():
+            raise RuntimeError("No event loop is available to the calling thread")
+        if cancellation_token is not None:
+            cancellation_token.raise_if_cancelled()
+
+        loop = self._loop
+        context = contextvars.copy_context()
+        future: concurrent.futures.Future = concurrent.futures.Future()
+        task_holder = []
+
+        def transfer(task: asyncio.Task) -> None:
+            if task.cancelled():
+                future.cancel()
+            elif task.exception() is not None:
+                future.set_exception(task.exception())
+            else:
+                future.set_result(task.result())
+
+        def start() -> None:
+            try:
+                # The task copies the current context, i.e. the caller's
+                task = context.run(lambda: asyncio.ensure_future(coro_fn(*args, **kwargs)))
+            except BaseException as e:
+                future.set_exception(e)
+                return
+            task.add_done_callback(transfer)
+            task_holder.append(task)
+
+        def cancel() -> None:
+            def cancel_task():
+                if task_holder:
+                    task_holder[0].cancel()
+            loop.call_soon_threadsafe(cancel_task)
+
+        loop.call_soon_threadsafe(start)
+        if cancellation_token is not None:
+            cancellation_token.add_callback(cancel)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.CancelledError:
+            if cancellation_token is not None and cancellation_token.is_cancelled:
+                raise OperationCancelledError(f"Operation cancelled: {cancellation_token.reason}")
+            raise
+        except concurrent.futures.TimeoutError:
+            cancel()
+            raise TimeoutError(f"Call did not complete within {timeout} seconds")
+        finally:
+            if cancellation_token is not None:
+                cancellation_token.remove_callback(cancel)
+
+
+loop_bridge = LoopBridge()
@@ -0,0 +1,139 @@
+import copy
+import math
+from typing import Any, List, Optional, Sequence
+
+# Llama tokenizers average about 4 characters per token on English prose; 3 leaves room for code and other languages
+CHARS_PER_TOKEN = 3.0
+
+# Role markers and separators the chat template adds around every message
+MESSAGE_OVERHEAD_TOKENS = 8
+
+# Slack for estimation error and the provider's template tokens
+SAFETY_MARGIN_TOKENS = 256
+
+TRUNCATION_MARKER = "\n\n[... truncated to fit the model's context window ...]\n\n"
+
+# Contents are never truncated below this many characters
+_MIN_TRUNCATED_CHARS = 200
+
+_ROLE_ALIASES = {
+    "human": "user",
+    "ai": "assistant",
+    "function": "tool",
+    "SystemMessage": "system",
+    "UserMessage": "user",
+    "AssistantMessage": "assistant",
+    "FunctionExecutionResultMessage": "tool",
+}
+
+
+def estimate_tokens(text: Any) -> int:
+    """Conservative token count of a text, or of the string form of structured content."""
+    if text is None:
+        return 0
+    if not isinstance(text, str):
+        text = str(text)
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def message_role(message: Any) -> str:
+    """Role of a chat message given as a dict, a LangChain message or an autogen message."""
+    if isinstance(message, dict):
+        role = message.get("role", "user")
+    else:
+        role = getattr(message, "role", None) or getattr(message, "type", None) or type(message).__name__
+    return _ROLE_ALIASES.get(role, role)
+
+
+def message_content(message: Any) -> Any:
+    if isinstance(message, dict):
+        return message.get("content")
+    return getattr(message, "content", message)
+
+
+def estimate_message_tokens(message: Any) -> int:
+    tokens = MESSAGE_OVERHEAD_TOKENS + estimate_tokens(message_content(message))
+    if isinstance(message, dict) and message.get("tool_calls"):
+        tokens += estimate_tokens(message["tool_calls"])
+    return tokens
+
+
+def estimate_messages_tokens(messages: Sequence[Any]) -> int:
+    return sum(estimate_message_tokens(message) for message in messages)
+
+
+def prompt_budget(context_window: int, max_output_tokens: Optional[int] = None) -> int:
+    """Tokens a prompt may use so the reply still fits the context window."""
+    return max(0, context_window - (max_output_tokens or 0) - SAFETY_MARGIN_TOKENS)
+
+
+def _with_content(message: Any, content: str) -> Any:
+    if isinstance(message, dict):
+        return {**message, "content": content}
+    if hasattr(message, "model_copy"):
+        return message.model_copy(update={"content": content})
+    message = copy.copy(message)
+    message.content = content
+    return message
+
+
+def _truncate(content: str, max_chars: int) -> str:
+    keep = max(0, max_chars - len(TRUNCATION_MARKER))
+    head = keep * 2 // 3
+    return content[:head] + TRUNCATION_MARKER + content[len(content) - (keep - head):]
+
+
+def fit_messages(messages: Sequence[Any], budget: int) -> List[Any]:
+    """
+    Fit a chat message list into a prompt token budget.
+
+    The oldest turns are dropped first; system messages and the last message
+    are always kept, and tool results are dropped together with the call that
+    requested them. If the remaining messages still exceed the budget, the
+    longest text contents are cut in the middle, keeping their head and tail.
+
+    Args:
+        messages: Messages as dicts, LangChain messages or autogen messages.
+        budget (int): Token budget, see prompt_budget.
+
+    Returns:
+        List: The messages unchanged when they fit, otherwise a trimmed copy;
+            the input is never modified.
+    """
+    messages = list(messages)
+    total = estimate_messages_tokens(messages)
+    if total <= budget or len(messages) == 0:
+        return messages
+
+    # Drop the oldest conversation turns
+    droppable = [i for i, message in enumerate(messages[:-1]) if message_role(message) != "system"]
+    dropped = set()
+    for position, index in enumerate(droppable):
+        if total <= budget:
+            break
+        dropped.add(index)
+        total -= estimate_message_tokens(messages[index])
+        # A tool result without its call is rejected by the providers
+        for following in droppable[position + 1:]:
+            if message_role(messages[following]) != "tool":
+                break
+            if following not in dropped:
+                dropped.add(following)
+                total -= estimate_message_tokens(messages[following])
+    messages = [message for i, message in enumerate(messages) if i not in dropped]
+
+    # Cut the longest contents until the rest fits
+    while total > budget:
+        candidates = [
+            (len(message_content(message)), i) for i, message in enumerate(messages)
+            if isinstance(message_content(message), str) and len(message_content(message)) > _MIN_TRUNCATED_CHARS
+        ]
+        if not candidates:
+            break
+        length, index = max(candidates)
+        excess_chars = math.ceil((total - budget) * CHARS_PER_TOKEN) + len(TRUNCATION_MARKER)
+        max_chars = max(_MIN_TRUNCATED_CHARS, length - excess_chars)
+        before = estimate_message_tokens(messages[index])
+        messages[index] = _with_content(messages[index], _truncate(message_content(messages[index]), max_chars))
+        total += estimate_message_tokens(messages[index]) - before
+    return messages